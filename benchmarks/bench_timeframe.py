@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the construction of a TimeFrame (including its warm-up TimeFrame) for simulation periods from 1 to 100
+years and time gaps from 5 minutes to 1 day. For each case, the time taken (best of several repeats) and the peak of
+memory allocated during the construction are reported.
+
+Usage: python benchmarks/bench_timeframe.py [number_of_repeats]
+"""
+
+from __future__ import print_function
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+from torrentpy import TimeFrame
+
+
+def build_timeframe(years, gap):
+    # data available for one more year than needed by the simulation (to allow for a warm-up)
+    save_start = datetime(1900, 1, 2)
+    save_end = save_start + timedelta(days=365 * years)
+    return TimeFrame(
+        dt_data_start=save_start - timedelta(days=366),
+        dt_data_end=save_end,
+        dt_save_start=save_start,
+        dt_save_end=save_end,
+        data_increment_in_minutes=gap,
+        save_increment_in_minutes=gap,
+        simu_increment_in_minutes=gap,
+        expected_simu_slice_length=max(1, 525600 // gap),  # one year per slice
+        warm_up_in_days=365
+    )
+
+
+def main(repeats):
+    print('{:>6} {:>8} {:>14} {:>12} {:>10}'.format('years', 'gap_min', 'simu_steps', 'time_ms', 'peak_kB'))
+    for years in [1, 10, 30, 100]:
+        for gap in [5, 15, 60, 1440]:
+            my_time = min(timeit.repeat(lambda: build_timeframe(years, gap), number=1, repeat=repeats))
+            tracemalloc.start()
+            tf = build_timeframe(years, gap)
+            my_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('{:>6} {:>8} {:>14} {:>12.3f} {:>10.1f}'.format(
+                years, gap, len(tf.simu_range), my_time * 1e3, my_peak / 1024.0))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
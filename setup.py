@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
 # Copyright (C) 2018  Thibault Hallouin
 from setuptools import setup
+import re
 
 
 with open("README.md", "r") as fh:
     long_desc = fh.read()
 
+# read the version from the package (without importing it, its dependencies may not be installed yet)
+with open("torrentpy/__init__.py", "r") as fh:
+    version = re.search(r"^__version__ = '([^']+)'", fh.read(), re.MULTILINE).group(1)
+
 setup(
     name='torrentpy',
 
-    version='0.2.0',
+    version=version,
 
     description='TORRENTpy: a tool for TranspORt thRough the catchmEnt NeTwork',
     long_description=long_desc,
@@ -51,7 +56,8 @@ setup(
 
     install_requires=[
         'numpy',
-        'future'
+        'future',
+        'futures; python_version < "3"'
     ],
 
     extras_require={
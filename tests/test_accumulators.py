@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime
+import numpy as np
+import torrentpy
+
+
+class TestAccumulators(unittest.TestCase):
+
+    def setUp(self):
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2000 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2016 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('31/12/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=360,
+            expected_simu_slice_length=100,
+            warm_up_in_days=0
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        self.nw = torrentpy.Network(
+            catchment='CatchmentLumpedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentLumpedName_OutletName/',
+            out_fld=None,
+            variable_h='q_h2o',
+            verbose=False
+        )
+
+        self.db = torrentpy.DataBase(
+            self.nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit']
+        )
+
+        self.nw.set_links_models(
+            self.kb,
+            catchment_h='SMART', river_h='SMART'
+        )
+
+    def test_accumulators_against_series(self):
+        my_accumulators = [
+            torrentpy.Peak('0000', 'q_h2o'),
+            torrentpy.Mean('0000', 'q_h2o'),
+            torrentpy.Percentiles('0000', 'q_h2o', percentiles=(10.0, 50.0, 90.0)),
+            torrentpy.ExceedanceCount('0000', 'q_h2o', threshold=1.0),
+            torrentpy.Mean('OutletName', 'c_in_rain')
+        ]
+        my_results = self.nw.simulate(self.db, self.tf, out_format='memory', accumulators=my_accumulators)
+
+        my_flows = my_results.get('0000', 'q_h2o')
+        self.assertEqual(my_accumulators[0].value, my_flows.max())
+        self.assertEqual(my_accumulators[0].datetime, my_results.datetimes[int(my_flows.argmax())])
+        self.assertAlmostEqual(my_accumulators[1].value, my_flows.mean())
+        for percentile in [10.0, 50.0, 90.0]:  # estimates only (from a short and autocorrelated series)
+            self.assertGreater(my_accumulators[2].value[percentile], np.percentile(my_flows, percentile - 5.0))
+            self.assertLess(my_accumulators[2].value[percentile], np.percentile(my_flows, percentile + 5.0))
+        self.assertEqual(my_accumulators[3].value, np.count_nonzero(my_flows > 1.0))
+        self.assertAlmostEqual(my_accumulators[4].value, my_results.get('OutletName', 'c_in_rain').mean())
+
+    def test_reuse_accumulators(self):
+        # the accumulators are reset at each simulation, so reusing them gives the values of the last one only
+        my_accumulators = [torrentpy.Peak('0000', 'q_h2o'), torrentpy.Mean('0000', 'q_h2o'),
+                           torrentpy.Percentiles('0000', 'q_h2o'), torrentpy.ExceedanceCount('0000', 'q_h2o', 1.0)]
+        self.nw.simulate(self.db, self.tf, out_format=None, accumulators=my_accumulators)
+        my_values = [(accumulator.count, accumulator.value) for accumulator in my_accumulators]
+        self.nw.simulate(self.db, self.tf, out_format=None, accumulators=my_accumulators)
+        self.assertListEqual([(accumulator.count, accumulator.value) for accumulator in my_accumulators], my_values)
+        self.assertEqual(my_accumulators[0].count, len(self.tf.save_series) - 1)
+
+    def test_percentiles_estimates(self):
+        my_values = np.random.RandomState(0).lognormal(size=20000)
+        my_accumulator = torrentpy.Percentiles('0000', 'q_h2o', percentiles=(10.0, 50.0, 90.0))
+        my_accumulator.update(list(range(len(my_values))), my_values)
+        for percentile in [10.0, 50.0, 90.0]:
+            self.assertAlmostEqual(my_accumulator.value[percentile] / np.percentile(my_values, percentile), 1.0,
+                                   delta=0.01)
+
+    def test_no_output_format(self):
+        my_accumulator = torrentpy.Peak('0000', 'q_h2o')
+        self.assertIsNone(self.nw.simulate(self.db, self.tf, out_format=None, accumulators=[my_accumulator]))
+        self.assertEqual(my_accumulator.count, len(self.tf.save_series) - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import unittest
+import json
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep, path
+import os
+import torrentpy
+from torrentpy import batch, inout
+from torrentpy.models.catchment.smart import SMARTc
+
+
+class CrashingModel(SMARTc):
+    # stands for a model terminating its process abruptly (e.g. a crash in compiled code, or killed by the system)
+    def initialise(self, link):
+        os._exit(1)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = mkdtemp() + sep
+
+        with open(self.out_dir + 'batch.csv', 'w') as my_file:
+            my_file.write('catchment,outlet,dt_data_start,dt_data_end,dt_save_start,dt_save_end\n')
+            for catchment in ['CatchmentLumpedName', 'CatchmentSemiDistributedName', 'CatchmentMissingName']:
+                my_file.write('{},OutletName,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                              '01/01/2009 09:00:00,31/03/2009 09:00:00\n'.format(catchment))
+
+        self.batch = torrentpy.Batch(
+            torrentpy.KnowledgeBase(), self.out_dir + 'batch.csv', 'examples/in/', self.out_dir,
+            variable_h='q_h2o', data_increment_in_minutes=1440, save_increment_in_minutes=1440,
+            simu_increment_in_minutes=1440, expected_simu_slice_length=100,
+            meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'],
+            catchment_h='SMART', river_h='SMART'
+        )
+
+    def tearDown(self):
+        rmtree(self.out_dir)
+
+    def test_batch_report(self):
+        my_report = self.batch.launch(workers=1)
+
+        self.assertListEqual([job['status'] for job in my_report], ['success', 'success', 'failure'])
+        self.assertIsNone(my_report[0]['exception'])
+        self.assertIn('No link-node network file', my_report[2]['exception'])
+        for job in my_report:
+            self.assertGreater(job['wall_time'], 0.0)
+            self.assertIn(job['peak_memory_scope'], ['job', 'worker'])
+
+        # the records of the workers are written by the batch session, in the batch log and in the job logs
+        with open(self.out_dir + 'simu.batch.log') as my_file:
+            self.assertIn('No link-node network file', my_file.read())
+        with open(self.out_dir + 'CatchmentLumpedName_OutletName/CatchmentLumpedName_OutletName.simu.log') as my_file:
+            my_log = my_file.read()
+        self.assertIn('Starting TORRENTpy session for CatchmentLumpedName at OutletName.', my_log)
+        self.assertIn('INFO', my_log)
+
+        with open(self.out_dir + 'simu.batch.json') as my_file:
+            my_saved_report = json.load(my_file)
+        self.assertEqual(my_saved_report['successes'], 2)
+        self.assertEqual(my_saved_report['failures'], 1)
+        self.assertListEqual(my_saved_report['jobs'], my_report)
+
+    def test_job_costs(self):
+        # without runtimes, the costs are proportional to the number of links (same period for all jobs)
+        my_costs = self.batch.estimate_costs()
+        self.assertAlmostEqual(my_costs[1] / my_costs[0], 9.0)
+        self.assertEqual(my_costs[2], 0.0)
+
+        # with runtimes, the costs are the expected wall times
+        self.batch.launch(workers=1)
+        my_costs = self.batch.estimate_costs()
+        for cost, job in zip(my_costs[:2], self.batch.report[:2]):
+            self.assertAlmostEqual(cost, job['wall_time'])
+
+        # the runtimes are scaled by the cost of the job, and are not shared by jobs simulated with other models
+        my_job = dict(self.batch.jobs[0])
+        my_key = batch.get_job_runtime_key(my_job)
+        my_job['warm_up_in_days'] += (my_job['dt_save_end'] - my_job['dt_save_start']).days
+        self.assertEqual(batch.get_job_runtime_key(my_job), my_key)
+        self.batch.jobs[0] = my_job
+        self.assertAlmostEqual(self.batch.estimate_costs()[0], my_costs[0] * 2.0)
+        my_job['water_quality'] = True
+        self.assertNotEqual(batch.get_job_runtime_key(my_job), my_key)
+
+    def test_batch_resume(self):
+        self.batch.launch(workers=1)
+        with open(self.out_dir + 'simu.batch.manifest.json') as my_file:
+            self.assertEqual(len(json.load(my_file)), 2)
+
+        # only the job that failed is run again
+        my_report = self.batch.launch(workers=1)
+        self.assertListEqual([job['status'] for job in my_report], ['skipped', 'skipped', 'failure'])
+
+        my_report = self.batch.launch(workers=1, resume=False)
+        self.assertListEqual([job['status'] for job in my_report], ['success', 'success', 'failure'])
+
+    def test_shared_inputs(self):
+        with open(self.out_dir + 'batch.shared.csv', 'w') as my_file:
+            my_file.write('catchment,outlet,dt_data_start,dt_data_end,dt_save_start,dt_save_end,out_fld\n')
+            for share in ['shared', 'parsed']:
+                for period in ['01/01/2009 09:00:00,31/03/2009 09:00:00', '01/04/2009 09:00:00,30/06/2009 09:00:00']:
+                    my_file.write('CatchmentSemiDistributedName,OutletName,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                                  '{},{}{}_{}/\n'.format(period, self.out_dir, share, period[3:5]))
+        my_batch = torrentpy.Batch(
+            torrentpy.KnowledgeBase(), self.out_dir + 'batch.shared.csv', 'examples/in/', self.out_dir,
+            variable_h='q_h2o', data_increment_in_minutes=1440, save_increment_in_minutes=1440,
+            simu_increment_in_minutes=1440, expected_simu_slice_length=100,
+            meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'],
+            catchment_h='SMART', river_h='SMART'
+        )
+        self.assertEqual(len(batch.get_shared_input_files(my_batch.jobs)), 9 * 4)
+
+        # jobs run with the shared inputs give the same results as jobs parsing the inputs themselves
+        my_shared, my_parsed = torrentpy.Batch.__new__(torrentpy.Batch), torrentpy.Batch.__new__(torrentpy.Batch)
+        for my_part, jobs, share_inputs in [(my_shared, my_batch.jobs[:2], True),
+                                            (my_parsed, my_batch.jobs[2:], False)]:
+            my_part.__dict__.update(my_batch.__dict__)
+            my_part.jobs, my_part.size = jobs, len(jobs)
+            self.assertListEqual([job['status'] for job in my_part.launch(workers=2, share_inputs=share_inputs)],
+                                 ['success', 'success'])
+        for period in ['01', '04']:
+            for name in ['CatchmentSemiDistributedName_0000.node', 'CatchmentSemiDistributedName_RiverReachH.outputs']:
+                with open('{}shared_{}/{}'.format(self.out_dir, period, name)) as my_file:
+                    my_shared_output = my_file.read()
+                with open('{}parsed_{}/{}'.format(self.out_dir, period, name)) as my_file:
+                    self.assertEqual(my_shared_output, my_file.read())
+
+    def test_csv_rows_cache(self):
+        my_file = self.out_dir + 'batch.csv'
+        my_fields, my_rows = inout.read_csv_rows(my_file)
+        self.assertEqual(len(my_rows), 3)
+        # the rows are reused as long as the file is not modified
+        my_fields.remove('catchment')
+        self.assertIn('catchment', inout.read_csv_rows(my_file)[0])
+        self.assertIs(inout.read_csv_rows(my_file)[1], my_rows)
+        with open(my_file, 'a') as f:
+            f.write('CatchmentOtherName,OutletName,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                    '01/01/2009 09:00:00,31/03/2009 09:00:00\n')
+        self.assertEqual(len(inout.read_csv_rows(my_file)[1]), 4)
+
+    def test_core_budget(self):
+        # the semi-distributed catchment has nine links, the lumped catchment has one
+        self.assertListEqual(batch.allocate_cores(self.batch.jobs, 4), [1, 1, 1])
+        self.assertListEqual(batch.allocate_cores(self.batch.jobs, 4, max_job_cores=None), [1, 4, 1])
+        self.assertListEqual(batch.allocate_cores(self.batch.jobs, 4, max_job_cores=2), [1, 2, 1])
+        self.assertListEqual(batch.allocate_cores(self.batch.jobs, 16, max_job_cores=None), [1, 9, 1])
+
+        # the jobs that fit in the cores free start before a job waiting for more cores, so that no core is idle
+        my_cores, my_durations = {0: 1, 1: 4, 2: 1}, {0: 10.0, 1: 50.0, 2: 10.0}
+        self.assertListEqual(batch.get_jobs_to_start([1, 0, 2], my_cores, 4, my_durations, []), [1])
+        self.assertListEqual(batch.get_jobs_to_start([1, 0, 2], my_cores, 3, my_durations, [(20.0, 1)]), [0, 2])
+        self.assertListEqual(batch.get_jobs_to_start([1, 0, 2], {0: 1, 1: 1, 2: 1}, 4, my_durations, []), [1, 0, 2])
+        # but only if they do not delay it: here, it can start in 5 seconds, so the jobs of 10 seconds wait
+        self.assertListEqual(batch.get_jobs_to_start([1, 0, 2], my_cores, 3, my_durations, [(5.0, 1)]), [])
+        self.assertListEqual(batch.get_jobs_to_start([1, 0, 2], my_cores, 3, {0: 1.0, 1: 50.0, 2: 10.0},
+                                                     [(5.0, 1)]), [0])
+        # unless they use cores that it will not need when it starts
+        self.assertListEqual(batch.get_jobs_to_start([1, 0, 2], my_cores, 3, my_durations, [(5.0, 2)]), [0])
+
+        # with one core per job, all the jobs run at the same time as with one job per worker
+        my_report = self.batch.launch(workers=4)
+        self.assertListEqual([job['cores'] for job in my_report], [1, 1, 1])
+        self.assertListEqual([job['status'] for job in my_report], ['success', 'success', 'failure'])
+
+    def test_broken_pool(self):
+        self.batch.kb.add_catchment_model('CRASH', CrashingModel)
+        self.batch.jobs[0]['catchment_h'] = 'CRASH'
+
+        # the job terminating its worker fails, the job running next to it and the jobs pending run on a new pool
+        my_report = self.batch.launch(workers=2)
+        self.assertListEqual([job['status'] for job in my_report], ['failure', 'success', 'failure'])
+        self.assertIn('terminated abruptly', my_report[0]['exception'])
+        self.assertIn('No link-node network file', my_report[2]['exception'])
+
+    def test_result_cache(self):
+        my_cache = self.out_dir + 'cache'
+        my_outputs = self.out_dir + 'CatchmentLumpedName_OutletName/CatchmentLumpedName_OutletName.outputs'
+        my_report = self.batch.launch(workers=1, cache_dir=my_cache)
+        self.assertListEqual([job['cached'] for job in my_report], [False, False, False])
+        with open(my_outputs) as my_file:
+            my_first_outputs = my_file.read()
+
+        # the same jobs run again reuse the outputs in the cache
+        my_report = self.batch.launch(workers=1, resume=False, cache_dir=my_cache)
+        self.assertListEqual([job['status'] for job in my_report], ['success', 'success', 'failure'])
+        self.assertListEqual([job['cached'] for job in my_report], [True, True, False])
+        with open(my_outputs) as my_file:
+            self.assertEqual(my_file.read(), my_first_outputs)
+
+        # a different simulation period gives a different fingerprint
+        my_job = dict(self.batch.jobs[0])
+        my_fingerprint = batch.get_job_fingerprint(self.batch.kb, my_job)
+        my_job['dt_save_end'] = my_job['dt_save_start']
+        self.assertNotEqual(batch.get_job_fingerprint(self.batch.kb, my_job), my_fingerprint)
+
+        # only the files read by the simulation are part of the fingerprint
+        my_names = [path.basename(job_file) for job_file in batch.get_job_files(self.batch.jobs[0])]
+        self.assertListEqual(my_names, ['CatchmentLumpedName_OutletName.descriptors',
+                                        'CatchmentLumpedName_OutletName.network',
+                                        'CatchmentLumpedName_OutletName.waterbodies',
+                                        'CatchmentLumpedName_OutletName_20000101_20161231.airt',
+                                        'CatchmentLumpedName_OutletName_20000101_20161231.peva',
+                                        'CatchmentLumpedName_OutletName_20000101_20161231.rain',
+                                        'CatchmentLumpedName_OutletName_20000101_20161231.soit',
+                                        'INCA.constants'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from datetime import datetime
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep
+import numpy as np
+from netCDF4 import Dataset
+import torrentpy
+from torrentpy import inout
+
+
+class TestBinaryOutput(unittest.TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.out_fld_binary = mkdtemp() + sep
+        self.out_fld_netcdf = mkdtemp() + sep
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2000 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2016 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('30/06/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=360,
+            expected_simu_slice_length=100,
+            warm_up_in_days=0
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        for out_fld, out_format in [(self.out_fld_binary, 'binary'), (self.out_fld_netcdf, 'netcdf')]:
+            nw = torrentpy.Network(
+                catchment='CatchmentLumpedName',
+                outlet='OutletName',
+                in_fld='examples/in/CatchmentLumpedName_OutletName/',
+                out_fld=out_fld,
+                variable_h='q_h2o',
+                verbose=False
+            )
+
+            db = torrentpy.DataBase(
+                nw, self.tf, self.kb,
+                in_format='csv',
+                meteo_cumulative=['rain', 'peva'],
+                meteo_average=['airt', 'soit']
+            )
+
+            nw.set_links_models(
+                self.kb,
+                catchment_h='SMART', river_h='SMART'
+            )
+
+            nw.simulate(db, self.tf, out_format=out_format)
+
+    def tearDown(self):
+        rmtree(self.out_fld_binary)
+        rmtree(self.out_fld_netcdf)
+
+    def test_outlet_node(self):
+        read_nd = inout.read_binary_timeseries(
+            '{}CatchmentLumpedName_0000.node.bin'.format(self.out_fld_binary))
+
+        with Dataset('{}CatchmentLumpedName_0000.node.nc'.format(self.out_fld_netcdf), 'r') as my_file:
+            # compare datetimes
+            self.assertListEqual(
+                [datetime(1970, 1, 1) + (dt - np.datetime64('1970-01-01T00:00')).item()
+                 for dt in read_nd['DateTime']],
+                self.tf.save_series[1:]
+            )
+            # compare values
+            np.testing.assert_array_equal(
+                read_nd['q_h2o'],
+                my_file.variables['q_h2o'][:]
+            )
+
+    def test_link_states(self):
+        read_nd = inout.read_binary_timeseries(
+            '{}CatchmentLumpedName_OutletName.states.bin'.format(self.out_fld_binary))
+
+        with Dataset('{}CatchmentLumpedName_OutletName.states.nc'.format(self.out_fld_netcdf), 'r') as my_file:
+            for variable in my_file.variables:
+                if not variable == 'DateTime':
+                    np.testing.assert_array_equal(
+                        read_nd[variable],
+                        my_file.variables[variable][:]
+                    )
+
+
+if __name__ == '__main__':
+    unittest.main()
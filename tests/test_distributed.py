@@ -0,0 +1,74 @@
+import unittest
+import socket
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep
+from time import sleep
+from threading import Thread
+from multiprocessing import Process
+import torrentpy
+from torrentpy.distributed import JobManager
+
+
+class TestDistributed(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = mkdtemp() + sep
+
+        with open(self.out_dir + 'batch.csv', 'w') as my_file:
+            my_file.write('catchment,outlet,dt_data_start,dt_data_end,dt_save_start,dt_save_end\n')
+            for catchment in ['CatchmentLumpedName', 'CatchmentSemiDistributedName', 'CatchmentMissingName']:
+                my_file.write('{},OutletName,01/01/2008 09:00:00,31/12/2012 09:00:00,'
+                              '01/01/2009 09:00:00,31/03/2009 09:00:00\n'.format(catchment))
+
+        self.batch = torrentpy.Batch(
+            torrentpy.KnowledgeBase(), self.out_dir + 'batch.csv', 'examples/in/', self.out_dir,
+            variable_h='q_h2o', data_increment_in_minutes=1440, save_increment_in_minutes=1440,
+            simu_increment_in_minutes=1440, expected_simu_slice_length=100,
+            meteo_cumulative=['rain', 'peva'], meteo_average=['airt', 'soit'],
+            catchment_h='SMART', river_h='SMART'
+        )
+
+        # find a free port on localhost
+        my_socket = socket.socket()
+        my_socket.bind(('localhost', 0))
+        self.address = my_socket.getsockname()
+        my_socket.close()
+
+    def tearDown(self):
+        rmtree(self.out_dir)
+
+    def test_coordinator_and_workers(self):
+        my_reports = list()
+        my_coordinator = torrentpy.Coordinator(self.address, 'secret', heartbeat_timeout=1.0, poll_interval=0.1)
+        my_session = Thread(target=lambda: my_reports.append(self.batch.launch(coordinator=my_coordinator)))
+        my_session.start()
+
+        # a worker takes the first job (the longest) and disappears without sending any heartbeat
+        my_manager = JobManager(address=self.address, authkey=b'secret')
+        for attempt in range(50):
+            try:
+                my_manager.connect()
+                break
+            except (IOError, OSError):
+                sleep(0.1)
+        index, args = my_manager.get_job_queue().get_job('lost')
+        self.assertEqual(args['catchment'], 'CatchmentSemiDistributedName')
+
+        # two workers run all the jobs, including the one lost
+        my_workers = [Process(target=torrentpy.run_worker, args=(self.address, 'secret'),
+                              kwargs={'heartbeat_interval': 0.2, 'poll_interval': 0.1}) for _ in range(2)]
+        for my_worker in my_workers:
+            my_worker.start()
+        my_session.join()
+        for my_worker in my_workers:
+            my_worker.join()
+
+        my_report = my_reports[0]
+        self.assertListEqual([job['status'] for job in my_report], ['success', 'success', 'failure'])
+        self.assertEqual(my_report[1]['attempts'], 2)
+        self.assertEqual(my_report[0]['attempts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
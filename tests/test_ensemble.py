@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep
+import numpy as np
+from netCDF4 import Dataset
+import torrentpy
+
+
+class TestEnsemble(unittest.TestCase):
+
+    def setUp(self):
+        self.out_fld = mkdtemp() + sep
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2012 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('30/06/2009 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=360,
+            expected_simu_slice_length=100,
+            warm_up_in_days=30
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        # three members scaling the soil depth of all the catchments and the routing of one river reach
+        self.factors = [0.5, 1.0, 2.0]
+
+    def tearDown(self):
+        rmtree(self.out_fld)
+
+    def get_network(self, out_fld):
+        nw = torrentpy.Network(
+            catchment='CatchmentSemiDistributedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentSemiDistributedName_OutletName/',
+            out_fld=out_fld,
+            variable_h='q_h2o',
+            verbose=False
+        )
+        db = torrentpy.DataBase(
+            nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit']
+        )
+        nw.set_links_models(
+            self.kb,
+            catchment_h='SMART', river_h='SMART'
+        )
+        return nw, db
+
+    def test_ensemble_against_members(self):
+        nw, db = self.get_network(self.out_fld)
+        my_parameters = {link.name: {'c_p_z': [link.c_models[0].parameters['c_p_z'] * f for f in self.factors]}
+                         for link in nw.links}
+        my_parameters['RiverReachA']['r_p_rk'] = [nw.links_mapping['RiverReachA'].r_models[0].parameters['r_p_rk'] * f
+                                                  for f in self.factors]
+        self.assertEqual(nw.set_ensemble_parameters(my_parameters), 3)
+        my_ensemble = nw.simulate(db, self.tf, out_format='memory')
+        self.assertTupleEqual(my_ensemble.get('0000', 'q_h2o').shape, (len(self.tf.save_series) - 1, 3))
+
+        # each member gives the same results as a simulation of its own parameter set
+        for member, factor in enumerate(self.factors):
+            nw, db = self.get_network(None)
+            for link in nw.links:
+                link.c_models[0].parameters['c_p_z'] *= factor
+            nw.links_mapping['RiverReachA'].r_models[0].parameters['r_p_rk'] *= factor
+            my_results = nw.simulate(db, self.tf, out_format='memory')
+            for entity, variable in [('0000', 'q_h2o'), ('RiverReachA', 'r_s_v_h2o'), ('RiverReachA', 'r_in_q_h2o'),
+                                     ('RiverReachH', 'c_s_v_h2o_ly1'), ('RiverReachH', 'c_in_rain')]:
+                np.testing.assert_allclose(my_ensemble.get(entity, variable)[:, member],
+                                           my_results.get(entity, variable), rtol=1e-12)
+
+        # the members are written along a second dimension in the NetCDF files
+        nw, db = self.get_network(self.out_fld)
+        nw.set_ensemble_parameters(my_parameters)
+        nw.simulate(db, self.tf, out_format='netcdf')
+        with Dataset('{}CatchmentSemiDistributedName_0000.node.nc'.format(self.out_fld)) as my_file:
+            np.testing.assert_allclose(my_file.variables['q_h2o'][:], my_ensemble.get('0000', 'q_h2o'), rtol=1e-12)
+
+    def test_ensemble_checks(self):
+        nw, db = self.get_network(None)
+        with self.assertRaises(Exception):
+            nw.set_ensemble_parameters({'RiverReachA': {'c_p_z': [1.0, 2.0], 'c_p_h': [0.1]}})
+        with self.assertRaises(Exception):
+            nw.set_ensemble_parameters({'RiverReachA': {'unknown': [1.0, 2.0]}})
+        nw.set_ensemble_parameters({'RiverReachA': {'c_p_z': [100.0, 200.0]}})
+        with self.assertRaises(Exception):
+            nw.simulate(db, self.tf, out_format='csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
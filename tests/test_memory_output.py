@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep
+import numpy as np
+import torrentpy
+from torrentpy import inout
+
+
+class TestMemoryOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.out_fld = mkdtemp() + sep
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2000 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2016 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('30/06/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=360,
+            expected_simu_slice_length=100,
+            warm_up_in_days=0
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        self.results = dict()
+        for out_fld, out_format in [(self.out_fld, 'binary'), (None, 'memory')]:
+            nw = torrentpy.Network(
+                catchment='CatchmentLumpedName',
+                outlet='OutletName',
+                in_fld='examples/in/CatchmentLumpedName_OutletName/',
+                out_fld=out_fld,
+                variable_h='q_h2o',
+                verbose=False
+            )
+
+            db = torrentpy.DataBase(
+                nw, self.tf, self.kb,
+                in_format='csv',
+                meteo_cumulative=['rain', 'peva'],
+                meteo_average=['airt', 'soit']
+            )
+
+            nw.set_links_models(
+                self.kb,
+                catchment_h='SMART', river_h='SMART'
+            )
+
+            self.results[out_format] = nw.simulate(db, self.tf, out_format=out_format,
+                                                   out_entities=['OutletName', '0000'],
+                                                   out_variables=['c_in_rain', 'r_s_v_h2o', 'q_h2o'])
+
+    def tearDown(self):
+        rmtree(self.out_fld)
+
+    def test_memory_results(self):
+        self.assertIsNone(self.results['binary'])
+        my_results = self.results['memory']
+
+        self.assertListEqual(my_results.entities, ['OutletName', '0000'])
+        self.assertListEqual(my_results.variables['OutletName'], ['c_in_rain', 'r_s_v_h2o'])
+        self.assertListEqual(my_results.variables['0000'], ['q_h2o'])
+        self.assertListEqual(list(my_results.datetimes), list(self.tf.save_series[1:]))
+
+        read_nd = inout.read_binary_timeseries(
+            '{}CatchmentLumpedName_0000.node.bin'.format(self.out_fld))
+        np.testing.assert_array_equal(my_results.get('0000', 'q_h2o'), read_nd['q_h2o'])
+
+        read_nd = inout.read_binary_timeseries(
+            '{}CatchmentLumpedName_OutletName.inputs.bin'.format(self.out_fld))
+        np.testing.assert_array_equal(my_results.get('OutletName', 'c_in_rain'), read_nd['c_in_rain'])
+
+        read_nd = inout.read_binary_timeseries(
+            '{}CatchmentLumpedName_OutletName.states.bin'.format(self.out_fld))
+        np.testing.assert_array_equal(my_results.get('OutletName', 'r_s_v_h2o'), read_nd['r_s_v_h2o'])
+
+
+if __name__ == '__main__':
+    unittest.main()
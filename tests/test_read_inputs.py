@@ -1,7 +1,7 @@
 import unittest
 from datetime import datetime
 import torrentpy
-from torrentpy import inout
+from torrentpy import inout, sharedinputs
 
 
 class TestReadInputs(unittest.TestCase):
@@ -81,6 +81,23 @@ class TestReadInputs(unittest.TestCase):
             my_nd
         )
 
+    @unittest.skipIf(sharedinputs.shared_memory is None, "shared memory only available from Python 3.8")
+    def test_read_shared_csv(self):
+        # the time series of a file in shared memory are indexed in place, with the same checks and values
+        my_blocks, my_descriptors = sharedinputs.share_input_files([self.input_file_csv])
+        my_attached = sharedinputs.attach_input_files(my_descriptors)
+        try:
+            read_nd = inout.read_csv_timeseries_with_data_checks(self.input_file_csv, self.tf)
+            self.assertIsInstance(read_nd['rain'], inout.SharedTimeSeries)
+            for var in self.expected_outcome:
+                for dt in self.expected_outcome[var]:
+                    self.assertEqual(self.expected_outcome[var][dt], read_nd[var][dt])
+            self.assertNotIn(datetime(2000, 1, 1, 10), read_nd['rain'])
+            self.assertEqual(next(iter(read_nd['rain'])), datetime(2000, 1, 1, 9))
+        finally:
+            sharedinputs.detach_input_files(my_attached)
+            sharedinputs.release_input_files(my_blocks)
+
     def test_netcdf_csv(self):
         # test the targeted read function on the example file
         read_nd = inout.read_netcdf_timeseries_with_data_checks(self.input_file_netcdf, self.tf)
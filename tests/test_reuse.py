@@ -0,0 +1,79 @@
+import unittest
+from datetime import datetime
+import numpy as np
+import torrentpy
+
+
+class TestReuse(unittest.TestCase):
+
+    def setUp(self):
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2006 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=360,
+            expected_simu_slice_length=100,
+            warm_up_in_days=90
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+    def get_network(self, c_p_z=None):
+        nw = torrentpy.Network(
+            catchment='CatchmentLumpedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentLumpedName_OutletName/',
+            out_fld=None,
+            variable_h='q_h2o',
+            verbose=False
+        )
+        db = torrentpy.DataBase(
+            nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit']
+        )
+        nw.set_links_models(
+            self.kb,
+            catchment_h='SMART', river_h='SMART'
+        )
+        if c_p_z is not None:
+            nw.links_mapping['OutletName'].c_models[0].parameters['c_p_z'] = c_p_z
+        return nw, db
+
+    def simulate(self, nw, db):
+        return nw.simulate(db, self.tf, out_format='memory', out_entities=['0000'], out_variables=['q_h2o'])
+
+    def test_repeated_simulations(self):
+        nw, db = self.get_network()
+        my_first = self.simulate(nw, db).get('0000', 'q_h2o')
+        c_p_z = nw.links_mapping['OutletName'].models_parameters['c_p_z']
+
+        # new parameters give the same results as a Network set up with them
+        nw.set_parameters({'OutletName': {'c_p_z': c_p_z * 0.5}})
+        self.assertEqual(nw.links_mapping['OutletName'].models_parameters['c_p_z'], c_p_z * 0.5)
+        my_second = self.simulate(nw, db).get('0000', 'q_h2o')
+        self.assertFalse(np.allclose(my_first, my_second))
+        np.testing.assert_array_equal(my_second, self.simulate(*self.get_network(c_p_z * 0.5)).get('0000', 'q_h2o'))
+
+        # an ensemble is replaced by the single parameter set
+        nw.set_ensemble_parameters({'OutletName': {'c_p_z': [c_p_z, c_p_z * 2.0]}})
+        nw.set_parameters({'OutletName': {'c_p_z': c_p_z}})
+        self.assertIsNone(nw.ensemble_size)
+        np.testing.assert_array_equal(self.simulate(nw, db).get('0000', 'q_h2o'), my_first)
+
+        # the Models can be assigned again, and the inputs of the DataBase are kept
+        nw.set_parameters({'OutletName': {'c_p_z': c_p_z * 0.5}})
+        nw.unset_links_models()
+        nw.set_links_models(self.kb, catchment_h='SMART', river_h='SMART')
+        np.testing.assert_array_equal(self.simulate(nw, db).get('0000', 'q_h2o'), my_first)
+
+        with self.assertRaises(Exception):
+            nw.set_parameters({'OutletName': {'r_p_unknown': 1.0}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from datetime import datetime
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep
+import numpy as np
+import torrentpy
+from torrentpy.sampling import draw_unit_samples, get_sobol_points, get_nse, get_kge, get_rmse, _context
+from torrentpy.inout import read_csv_rows
+
+
+class TestSampling(unittest.TestCase):
+
+    def setUp(self):
+        self.out_fld = mkdtemp() + sep
+
+        self.sampling = torrentpy.Sampling(
+            torrentpy.KnowledgeBase(),
+            catchment='CatchmentLumpedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentLumpedName_OutletName/',
+            bounds={'c_p_z': (500.0, 1500.0), 'c_p_gk': (100.0, 800.0)},
+            objective='nse',
+            dt_data_start=datetime.strptime('01/01/2006 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/07/2006 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=1440,
+            expected_simu_slice_length=200,
+            variable_h='q_h2o',
+            catchment_h='SMART',
+            river_h='SMART',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit']
+        )
+
+    def tearDown(self):
+        rmtree(self.out_fld)
+
+    def test_unit_samples(self):
+        # one point in each stratum of each dimension for a Latin hypercube
+        my_points = draw_unit_samples(50, 3, 'lhs', seed=7)
+        for dimension in range(3):
+            self.assertListEqual(sorted(np.floor(my_points[:, dimension] * 50).astype(int)), list(range(50)))
+        np.testing.assert_array_equal(my_points, draw_unit_samples(50, 3, 'lhs', seed=7))
+        np.testing.assert_array_equal(get_sobol_points(3, 2), [[0.5, 0.5], [0.75, 0.25], [0.25, 0.75]])
+
+    def test_objectives(self):
+        my_observed = np.array([1.0, 2.0, np.nan, 4.0])
+        my_simulated = np.array([[1.0, 2.0], [2.0, 3.0], [9.0, 9.0], [4.0, 5.0]])
+        np.testing.assert_allclose(get_nse(my_simulated, my_observed), [1.0, 1.0 - 9.0 / 14.0])
+        np.testing.assert_allclose(get_kge(my_simulated[:, 0], my_observed), 1.0)
+        np.testing.assert_allclose(get_rmse(my_simulated, my_observed), [0.0, 1.0])
+
+    def test_serial_ensemble_and_parallel_evaluations(self):
+        my_samples = self.sampling.draw(6, 'sobol')
+        my_table = '{}sampling.csv'.format(self.out_fld)
+        my_serial = self.sampling.evaluate(my_samples, table_file=my_table)
+        self.assertTrue(np.all(np.isfinite(my_serial)))
+        self.assertGreater(np.ptp(my_serial), 0.0)
+        np.testing.assert_allclose(self.sampling.evaluate(my_samples, ensemble_size=4), my_serial, rtol=1e-10)
+        np.testing.assert_allclose(self.sampling.evaluate(my_samples, workers=2), my_serial, rtol=1e-10)
+
+        my_fields, my_rows = read_csv_rows(my_table)
+        self.assertListEqual(my_fields, ['Sample', 'c_p_gk', 'c_p_z', 'nse'])
+        self.assertEqual(len(my_rows), 6)
+        self.assertAlmostEqual(float(my_rows[5]['nse']), my_serial[5], places=6)
+
+    def test_early_stop(self):
+        my_samples = self.sampling.draw(6, 'sobol')
+        my_scores = self.sampling.evaluate(my_samples)
+        # the runs able to beat the threshold are run to the end
+        np.testing.assert_array_equal(self.sampling.evaluate(my_samples, stop_threshold=my_scores.min() - 0.1),
+                                      my_scores)
+        # the others are stopped early, and given the best score they could still reach
+        threshold = my_scores.max() + 0.1
+        my_stopped = self.sampling.evaluate(my_samples, stop_threshold=threshold)
+        self.assertTrue(np.all(my_stopped < threshold))
+        self.assertTrue(np.all(my_stopped >= my_scores))
+        self.assertTrue(np.any(my_stopped > my_scores))
+
+        # a simulation stopped by the callback only fills in the slices simulated
+        nw, tf = _context['nw'], _context['tf']
+        my_results = nw.simulate(_context['db'], tf, out_format='memory', out_entities=[_context['gauge']],
+                                 on_slice=lambda db, tf, save_slice, results: True)
+        self.assertTrue(my_results.stopped)
+        self.assertEqual(my_results.filled, len(tf.save_slices[0]) - 1)
+        self.assertFalse(np.any(my_results.get(_context['gauge'], 'q_h2o')[my_results.filled:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from datetime import datetime
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep
+import io
+import numpy as np
+import torrentpy
+from torrentpy.sensitivity import get_sobol_indices, get_morris_indices
+
+
+class TestSensitivity(unittest.TestCase):
+
+    def setUp(self):
+        self.out_fld = mkdtemp() + sep
+
+        self.sensitivity = torrentpy.Sensitivity(
+            torrentpy.KnowledgeBase(),
+            catchment='CatchmentLumpedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentLumpedName_OutletName/',
+            bounds={'c_p_z': (500.0, 1500.0), 'c_p_gk': (100.0, 800.0)},
+            objective='kge',
+            dt_data_start=datetime.strptime('01/01/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/03/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=1440,
+            expected_simu_slice_length=400,
+            variable_h='q_h2o',
+            catchment_h='SMART',
+            river_h='SMART',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit']
+        )
+
+    def tearDown(self):
+        rmtree(self.out_fld)
+
+    def test_indices_of_linear_function(self):
+        # for y = x1 + 2 * x2 on the unit square, S1 = ST = 1/5 and 4/5, and the elementary effects are 1 and 2
+        my_design = self.sensitivity.get_saltelli_design(1024)
+        my_indices = get_sobol_indices(my_design, my_design[:, 0] + 2.0 * my_design[:, 1], 2)
+        for i, expected in enumerate([0.2, 0.8]):
+            self.assertAlmostEqual(my_indices[i]['S1'], expected, delta=0.02)
+            self.assertAlmostEqual(my_indices[i]['ST'], expected, delta=0.02)
+
+        my_design = self.sensitivity.get_morris_design(20, levels=4, seed=3)
+        self.assertTrue(np.all((my_design >= 0.0) & (my_design <= 1.0)))
+        my_indices = get_morris_indices(my_design, my_design[:, 0] + 2.0 * my_design[:, 1], 2)
+        for i, expected in enumerate([1.0, 2.0]):
+            self.assertAlmostEqual(my_indices[i]['mu'], expected)
+            self.assertAlmostEqual(my_indices[i]['mu_star'], expected)
+            self.assertAlmostEqual(my_indices[i]['sigma'], 0.0)
+
+    def test_checkpoint_and_resume(self):
+        my_checkpoint = '{}morris.csv'.format(self.out_fld)
+        my_indices = self.sensitivity.run_morris(3, seed=1, block_size=1, checkpoint_file=my_checkpoint)
+        self.assertListEqual(sorted(my_indices), ['c_p_gk', 'c_p_z'])
+        self.assertGreater(my_indices['c_p_z']['mu_star'], 0.0)
+
+        # keep the first 4 of the 9 simulations only, as if the analysis had been interrupted
+        with io.open(my_checkpoint, 'r') as my_file:
+            my_lines = my_file.readlines()
+        self.assertEqual(len(my_lines), 10)
+        with io.open(my_checkpoint, 'w') as my_file:
+            my_file.writelines(my_lines[:5])
+
+        my_evaluated = list()
+        my_evaluate = self.sensitivity.evaluate
+
+        def evaluate(samples, *args):
+            my_evaluated.append(len(samples))
+            return my_evaluate(samples, *args)
+
+        self.sensitivity.evaluate = evaluate
+        my_resumed = self.sensitivity.run_morris(3, seed=1, block_size=1, checkpoint_file=my_checkpoint)
+        self.assertListEqual(my_evaluated, [2, 3])
+        for name in my_indices:
+            for statistic in ['mu', 'mu_star', 'sigma']:
+                self.assertAlmostEqual(my_resumed[name][statistic], my_indices[name][statistic], places=6)
+
+        # a different design cannot be resumed from the checkpoint
+        with self.assertRaises(Exception):
+            self.sensitivity.run_morris(3, seed=2, block_size=1, checkpoint_file=my_checkpoint)
+
+
+if __name__ == '__main__':
+    unittest.main()
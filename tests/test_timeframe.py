@@ -0,0 +1,97 @@
+import unittest
+from datetime import datetime, timedelta
+from math import sin, pi
+import numpy as np
+import torrentpy
+
+
+class TestTimeFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2000 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2016 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('31/12/2008 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=60,
+            expected_simu_slice_length=1000,
+            warm_up_in_days=0
+        )
+
+    def test_series_as_lists(self):
+        # build the series step by step to compare with
+        my_simu_list = list()
+        my_dt = datetime(2007, 1, 1, 9) - timedelta(minutes=1440)
+        while my_dt <= datetime(2008, 12, 31, 9):
+            my_simu_list.append(my_dt)
+            my_dt += timedelta(minutes=60)
+
+        self.assertEqual(len(self.tf.simu_range), len(my_simu_list))
+        self.assertListEqual(list(self.tf.simu_range), my_simu_list)
+        self.assertListEqual(list(self.tf.simu_range[5:-3]), my_simu_list[5:-3])
+        self.assertListEqual(list(self.tf.simu_range[::24]), my_simu_list[::24])
+        self.assertEqual(self.tf.simu_range[-1], my_simu_list[-1])
+        self.assertEqual(self.tf.simu_range, my_simu_list)
+        self.assertListEqual([list(my_slice) for my_slice in self.tf.simu_slice_ranges],
+                             [my_simu_list[i:i + 1000 // 24 * 24 + 1]
+                              for i in range(0, len(my_simu_list) - 1, 1000 // 24 * 24)])
+        self.assertEqual(len(self.tf.simu_slice_ranges), len(self.tf.save_slice_ranges))
+        self.assertEqual(self.tf.simu_slice_ranges[-1][-1], self.tf.simu_range[-1])
+        self.assertEqual(self.tf.save_slice_ranges[-1][-1], self.tf.save_range[-1])
+
+        # the former list attributes are still plain lists (built when requested, and rebuilt after reslicing)
+        self.assertIsInstance(self.tf.simu_series, list)
+        self.assertListEqual(self.tf.simu_series, my_simu_list)
+        self.assertListEqual(self.tf.save_series + [], list(self.tf.save_range))
+        self.assertIsInstance(self.tf.simu_slices[0], list)
+        self.assertListEqual(self.tf.simu_slices, [list(my_slice) for my_slice in self.tf.simu_slice_ranges])
+        self.tf.set_slice_length(0)
+        self.assertListEqual(self.tf.simu_slices, [my_simu_list])
+
+    def test_series_index(self):
+        my_series = self.tf.simu_range
+        for my_position in [0, 1, 1000, len(my_series) - 1]:
+            self.assertEqual(my_series.index(my_series[my_position]), my_position)
+        self.assertEqual(my_series[10:].index(my_series[25]), 15)
+        self.assertNotIn(my_series[0] - timedelta(minutes=60), my_series)
+        self.assertNotIn(my_series[0] + timedelta(minutes=30), my_series)
+        self.assertNotIn(my_series[-1] + timedelta(minutes=60), my_series)
+        with self.assertRaises(ValueError):
+            my_series.index(my_series[0] + timedelta(minutes=30))
+        np.testing.assert_array_equal(
+            my_series.datetime64,
+            np.array([np.datetime64(my_dt, 'm') for my_dt in my_series])
+        )
+
+    def test_slice_length_from_memory_budget(self):
+        my_step_size = 10000  # bytes
+        self.tf.set_slice_length_from_memory_budget(1.0, my_step_size)
+        my_slice_length = len(self.tf.simu_slices[0])
+        # slices fitting in the budget, covering whole saving/reporting steps, and as long as possible
+        self.assertLessEqual(my_slice_length * my_step_size, 1024 * 1024)
+        self.assertEqual((my_slice_length - 1) % 24, 0)
+        self.assertGreater((my_slice_length + 24) * my_step_size, 1024 * 1024)
+        self.assertEqual(len(self.tf.save_slices[0]), (my_slice_length - 1) // 24 + 1)
+        with self.assertRaises(Exception):
+            self.tf.set_slice_length_from_memory_budget(0.1, my_step_size)
+
+    def test_calendar_table(self):
+        my_slice = list(torrentpy.TimeFrame(
+            dt_data_start=datetime(2007, 12, 1, 9), dt_data_end=datetime(2009, 1, 31, 9),
+            dt_save_start=datetime(2007, 12, 30, 9), dt_save_end=datetime(2009, 1, 2, 9),
+            data_increment_in_minutes=1440, save_increment_in_minutes=1440, simu_increment_in_minutes=360
+        ).simu_slices[0])
+        my_calendar = torrentpy.timeframe.CalendarTable(my_slice)
+        for my_dt in my_slice:
+            i = my_calendar.index(my_dt)
+            self.assertEqual(my_calendar.day_of_year[i], my_dt.timetuple().tm_yday)
+            self.assertEqual(my_calendar.days_in_year[i], 366.0 if my_dt.year == 2008 else 365.0)
+            self.assertEqual(my_calendar.hour[i], my_dt.hour)
+            self.assertEqual(my_calendar.get_seasonal_sine(i, 32.0),
+                             sin(2.0 * pi * (my_dt.timetuple().tm_yday - 32.0) / my_calendar.days_in_year[i]))
+
+
+if __name__ == '__main__':
+    unittest.main()
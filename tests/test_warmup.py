@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime
+from tempfile import mkdtemp
+from shutil import rmtree
+from os import sep, listdir
+import numpy as np
+import torrentpy
+
+
+class TestWarmUpCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = mkdtemp() + sep
+
+        self.tf = torrentpy.TimeFrame(
+            dt_data_start=datetime.strptime('01/01/2005 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_data_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_start=datetime.strptime('01/01/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            dt_save_end=datetime.strptime('31/12/2007 09:00:00', '%d/%m/%Y %H:%M:%S'),
+            data_increment_in_minutes=1440,
+            save_increment_in_minutes=1440,
+            simu_increment_in_minutes=360,
+            expected_simu_slice_length=200,
+            warm_up_in_days=365
+        )
+
+        self.kb = torrentpy.KnowledgeBase()
+
+        self.nw = torrentpy.Network(
+            catchment='CatchmentLumpedName',
+            outlet='OutletName',
+            in_fld='examples/in/CatchmentLumpedName_OutletName/',
+            out_fld=None,
+            variable_h='q_h2o',
+            verbose=False
+        )
+
+        self.db = torrentpy.DataBase(
+            self.nw, self.tf, self.kb,
+            in_format='csv',
+            meteo_cumulative=['rain', 'peva'],
+            meteo_average=['airt', 'soit']
+        )
+
+        self.nw.set_links_models(
+            self.kb,
+            catchment_h='SMART', river_h='SMART'
+        )
+
+        # count the slices simulated (warm-up included)
+        self.slices = list()
+        my_set_db = self.db.set_db_for_links_and_nodes
+
+        def set_db_for_links_and_nodes(my_simu_slice):
+            self.slices.append(my_simu_slice[-1])
+            my_set_db(my_simu_slice)
+
+        self.db.set_db_for_links_and_nodes = set_db_for_links_and_nodes
+
+    def tearDown(self):
+        rmtree(self.cache_dir)
+
+    def simulate(self, warm_up_cache):
+        del self.slices[:]
+        return self.nw.simulate(self.db, self.tf, out_format='memory', out_entities=['0000', 'OutletName'],
+                                warm_up_cache=warm_up_cache).values
+
+    def test_warm_up_cache(self):
+        my_reference = self.simulate(None)
+        nb_slices = len(self.slices)
+
+        # the first run stores the initial conditions, the next ones skip the warm-up run
+        for i in range(2):
+            my_values = self.simulate(self.cache_dir)
+            for entity in my_reference:
+                np.testing.assert_array_equal(my_values[entity], my_reference[entity])
+            self.assertEqual(len(listdir(self.cache_dir)), 1)
+        self.assertEqual(len(self.slices), len(self.tf.simu_slices))
+        self.assertLess(len(self.slices), nb_slices)
+
+        # other parameters give other initial conditions
+        c_p_z = self.nw.links_mapping['OutletName'].models_parameters['c_p_z']
+        self.nw.set_parameters({'OutletName': {'c_p_z': c_p_z * 0.5}})
+        self.simulate(self.cache_dir)
+        self.assertEqual(len(self.slices), nb_slices)
+        self.assertEqual(len(listdir(self.cache_dir)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,10 +18,17 @@
 # You should have received a copy of the GNU General Public License
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
+__version__ = '0.2.0'
+
 from .network import Network
 from .knowledgebase import KnowledgeBase
 from .database import DataBase
 from .timeframe import TimeFrame
 from .batch import Batch
+from .distributed import Coordinator, run_worker
+from .sampling import Sampling, EarlyStop
+from .sensitivity import Sensitivity
+from .results import Results
+from .accumulators import Peak, Mean, Percentiles, ExceedanceCount
 
 from .utils import connectivity
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from builtins import range
+from logging import getLogger
+import numpy as np
+
+from .inout import get_simulation_array
+
+
+class Accumulator(object):
+    """
+    This class defines a statistic on one variable of one link or node that is updated slice by slice during the
+    simulation, using the same values as the ones that would be written in the output files (i.e. summed up for the
+    inputs and averaged for the rest across the simulation steps of each reporting step). The statistic only needs a
+    constant amount of memory, whatever the length of the simulation period.
+    """
+    def __init__(self, entity, variable):
+        # name of the link or node
+        self.entity = entity
+        # name of the variable
+        self.variable = variable
+        # number of reporting steps accumulated so far
+        self.count = 0
+        # value of the statistic (None until some values are accumulated)
+        self.value = None
+
+    def reset(self):
+        """
+        This method discards the values accumulated so far, so that the accumulator can be used for another
+        simulation (the simulate method of a Network resets its accumulators before the first slice).
+        """
+        self.count = 0
+        self.value = None
+
+    def update(self, datetimes, values):
+        """
+        :param datetimes: list of datetime of the reporting steps
+        :type datetimes: list()
+        :param values: array of the values of the variable for the reporting steps
+        :type values: numpy.ndarray
+        """
+        self.count += len(values)
+
+
+class Peak(Accumulator):
+    """
+    This class keeps the maximum value of the variable and the datetime when it occurred.
+    """
+    def __init__(self, entity, variable):
+        Accumulator.__init__(self, entity, variable)
+        # datetime of the maximum value
+        self.datetime = None
+
+    def reset(self):
+        Accumulator.reset(self)
+        self.datetime = None
+
+    def update(self, datetimes, values):
+        Accumulator.update(self, datetimes, values)
+        if len(values) > 0:
+            position = int(np.argmax(values))
+            if (self.value is None) or (values[position] > self.value):
+                self.value = float(values[position])
+                self.datetime = datetimes[position]
+
+
+class Mean(Accumulator):
+    """
+    This class keeps the mean value of the variable.
+    """
+    def __init__(self, entity, variable):
+        Accumulator.__init__(self, entity, variable)
+        # sum of all the values
+        self.total = 0.0
+
+    def reset(self):
+        Accumulator.reset(self)
+        self.total = 0.0
+
+    def update(self, datetimes, values):
+        Accumulator.update(self, datetimes, values)
+        self.total += float(np.sum(values))
+        if self.count > 0:
+            self.value = self.total / self.count
+
+
+class ExceedanceCount(Accumulator):
+    """
+    This class counts the number of reporting steps when the variable is strictly above a threshold.
+    """
+    def __init__(self, entity, variable, threshold):
+        Accumulator.__init__(self, entity, variable)
+        # value above which the variable is in exceedance
+        self.threshold = threshold
+        self.value = 0
+
+    def reset(self):
+        Accumulator.reset(self)
+        self.value = 0
+
+    def update(self, datetimes, values):
+        Accumulator.update(self, datetimes, values)
+        self.value += int(np.count_nonzero(np.asarray(values) > self.threshold))
+
+
+class Percentiles(Accumulator):
+    """
+    This class estimates percentiles of the variable using the P-square algorithm (Jain and Chlamtac, 1985), which
+    only keeps five markers per percentile instead of all the values. The estimates are exact until five values are
+    accumulated.
+    """
+    def __init__(self, entity, variable, percentiles=(5.0, 50.0, 95.0)):
+        Accumulator.__init__(self, entity, variable)
+        logger = getLogger('TORRENTpy.ac')
+        for percentile in percentiles:
+            if not 0.0 < percentile < 100.0:
+                logger.error("Percentile {} is not strictly between 0 and 100.".format(percentile))
+                raise Exception("Percentile {} is not strictly between 0 and 100.".format(percentile))
+        # percentiles to estimate (in %)
+        self.percentiles = list(percentiles)
+        # one estimator for each percentile
+        self._estimators = [_PSquare(percentile / 100.0) for percentile in self.percentiles]
+
+    def reset(self):
+        Accumulator.reset(self)
+        self._estimators = [_PSquare(percentile / 100.0) for percentile in self.percentiles]
+
+    def update(self, datetimes, values):
+        Accumulator.update(self, datetimes, values)
+        for value in np.asarray(values, dtype=np.float64).tolist():
+            for estimator in self._estimators:
+                estimator.add(value)
+        if self.count > 0:
+            self.value = {percentile: estimator.get()
+                          for percentile, estimator in zip(self.percentiles, self._estimators)}
+
+
+class _PSquare(object):
+    def __init__(self, p):
+        # probability of the quantile to estimate
+        self.p = p
+        # heights, actual positions, desired positions, and increments of desired positions of the five markers
+        self.q = list()
+        self.n = [0, 1, 2, 3, 4]
+        self.n_desired = [0.0, 2.0 * p, 4.0 * p, 2.0 + 2.0 * p, 4.0]
+        self.dn = [0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0]
+
+    def add(self, x):
+        q, n = self.q, self.n
+        # store the first five values as they are
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        # find the cell k such as q[k] <= x < q[k+1] (adjusting the extreme markers if required)
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        # increment the positions of the markers above the cell
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.n_desired[i] += self.dn[i]
+        # adjust the heights of the three middle markers if they are off their desired positions
+        for i in range(1, 4):
+            d = self.n_desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # piecewise-parabolic prediction
+                q_new = q[i] + float(d) / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < q_new < q[i + 1]:
+                    # linear prediction
+                    q_new = q[i] + float(d) * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = q_new
+                n[i] += d
+
+    def get(self):
+        if len(self.q) < 5:
+            return float(np.percentile(self.q, self.p * 100.0)) if self.q else None
+        return self.q[2]
+
+
+def group_accumulators(network, accumulators):
+    """
+    This function checks that the accumulators refer to variables of links or nodes of the network, and groups them
+    by link/node and by variable so that the values are only gathered once for each slice. The accumulators are
+    reset, so that the values accumulated during a previous simulation are not mixed with the new ones.
+
+    :param network: Network object for the simulated catchment
+    :type network: Network
+    :param accumulators: list of Accumulator objects
+    :type accumulators: list()
+    :return: nested dictionary { key = link/node: value = dict(key = variable: value = (operation, list(Accumulator))) }
+    :rtype: dict()
+    """
+    logger = getLogger('TORRENTpy.ac')
+
+    my_groups = dict()
+    for accumulator in accumulators:
+        if accumulator.entity in network.links_mapping:
+            my_inputs = list()
+            my_others = list()
+            for model in network.links_mapping[accumulator.entity].all_models:
+                my_inputs += model.inputs_names
+                my_others += model.states_names + model.outputs_names
+        elif accumulator.entity in network.nodes_mapping:
+            my_inputs = list()
+            my_others = list(network.variables)
+        else:
+            logger.error("Link/node {} for accumulator is not part of the Network.".format(accumulator.entity))
+            raise Exception("Link/node {} for accumulator is not part of the Network.".format(accumulator.entity))
+
+        # for inputs, the values are summed up because they are cumulative values, otherwise they are averaged
+        if accumulator.variable in my_inputs:
+            operation = 'sum'
+        elif accumulator.variable in my_others:
+            operation = 'mean'
+        else:
+            logger.error("Variable {} for accumulator is not simulated for link/node {}.".format(
+                accumulator.variable, accumulator.entity))
+            raise Exception("Variable {} for accumulator is not simulated for link/node {}.".format(
+                accumulator.variable, accumulator.entity))
+
+        accumulator.reset()
+        my_groups.setdefault(accumulator.entity, dict()).setdefault(
+            accumulator.variable, (operation, list()))[1].append(accumulator)
+
+    return my_groups
+
+
+def update_accumulators(tf, timeslice, db, groups):
+    """
+    This function updates the accumulators with the values of the reporting steps of the time slice.
+
+    :param tf: TimeFrame object for the simulation period
+    :type tf: TimeFrame
+    :param timeslice: list of datetime that need to be reported on
+    :type timeslice: list()
+    :param db: DataBase object containing the nested dictionaries for the nodes and the links for variables
+    :type db: DataBase
+    :param groups: accumulators grouped by link/node and by variable (as returned by group_accumulators)
+    :type groups: dict()
+    :return: NOTHING, only updates the accumulators
+    """
+    my_datetimes = timeslice[1:]
+    for entity in groups:
+        for variable in groups[entity]:
+            operation, my_accumulators = groups[entity][variable]
+            my_values = get_simulation_array(db.simulation[entity], tf, timeslice, [variable], operation)[:, 0]
+            for accumulator in my_accumulators:
+                accumulator.update(my_datetimes, my_values)
@@ -18,13 +18,51 @@
 # You should have received a copy of the GNU General Public License
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
-from multiprocessing import Pool, cpu_count, log_to_stderr
+from multiprocessing import cpu_count
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+try:
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:  # Python 2 (backport of concurrent.futures)
+    BrokenProcessPool = RuntimeError
 from csv import DictReader
 from datetime import datetime
-from os import path, remove, sep
+from os import path, remove, sep, listdir, fsync, getpid, environ
+from socket import gethostname
+from hashlib import sha1, sha256
+from shutil import copy2, rmtree
+from glob import glob
+import os
+from timeit import default_timer
+from traceback import format_exc
+from collections import OrderedDict
+import multiprocessing
+import sys
+import json
 import logging
+from logging.handlers import MemoryHandler
+try:
+    from logging.handlers import QueueHandler
+except ImportError:  # only available from Python 3.2
+    QueueHandler = None
+try:
+    from queue import Empty
+except ImportError:  # Python 2
+    from Queue import Empty
+try:
+    from os import replace
+except ImportError:  # Python 2 (atomic on POSIX only)
+    from os import rename as replace
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 from torrentpy import *
+from . import __version__
+from .sharedinputs import share_input_files, attach_input_files, detach_input_files, release_input_files
+
+# objects kept by a worker process for all the jobs it runs (set by init_worker)
+_worker = dict()
 
 
 class Batch(object):
@@ -32,10 +70,12 @@ class Batch(object):
         self.size = 0
         self.kb = kb
         self.jobs = None
+        self.report = None
         self.in_dir = in_dir
         self.out_dir = out_dir
         # Logger to output in console and in log file
         self.log_file = None
+        self._log_handlers = None
         self._set_logger()
         # Write the first logging message to inform of the start of the batch session
         logger = logging.getLogger('TORRENTpy.bh')
@@ -53,6 +93,9 @@ class Batch(object):
             remove(log_file)
         f_handler = logging.FileHandler(log_file)
         f_handler.setLevel(logging.WARNING)
+        # Buffer the records to write them by batches (straight away for errors)
+        m_handler = MemoryHandler(capacity=256, flushLevel=logging.ERROR, target=f_handler)
+        m_handler.setLevel(logging.WARNING)
         # Create StreamHandler
         s_handler = logging.StreamHandler()
         s_handler.setLevel(logging.WARNING)
@@ -62,10 +105,11 @@ class Batch(object):
         # Apply Formatter and Handler
         f_handler.setFormatter(formatter)
         s_handler.setFormatter(formatter)
-        logger.addHandler(f_handler)
+        logger.addHandler(m_handler)
         logger.addHandler(s_handler)
 
         self.log_file = log_file
+        self._log_handlers = [m_handler, s_handler]
 
     def _set_jobs(self, batch_file, kwargs):
 
@@ -96,33 +140,7 @@ class Batch(object):
         self.jobs = my_jobs
 
     def _check_all_args(self, dict_args):
-        logger = logging.getLogger('TORRENTpy.bh')
-
-        mandatory_args = [
-            'catchment', 'outlet', 'dt_data_start', 'dt_data_end', 'dt_save_start', 'dt_save_end',
-            'variable_h', 'data_increment_in_minutes', 'save_increment_in_minutes',
-            'simu_increment_in_minutes'
-        ]
-
-        optional_args = {
-            'in_format': 'csv', 'out_format': 'csv', 'expected_simu_slice_length': 0, 'verbose': False,
-            'catchment_h': None, 'river_h': None, 'lake_h': None, 'variables_q': None,
-            'catchment_q': None, 'river_q': None, 'lake_q': None,
-            'meteo_cumulative': [], 'meteo_average': [], 'contamination_cumulative': [],
-            'contamination_average': [], 'warm_up_in_days': 0, 'water_quality': False
-        }
-
-        # check if mandatory arguments are all defined, if not, raise Exception
-        for mandatory_arg in mandatory_args:
-            if mandatory_arg not in dict_args:
-                logger.error("The batch session cannot proceed, "
-                             "it is missing the mandatory argument: {}.".format(mandatory_arg))
-                raise Exception("The batch session cannot proceed, "
-                                "it is missing the mandatory argument: {}.".format(mandatory_arg))
-        # check if optional arguments are defined, if not, give them their default value
-        for optional_arg in optional_args:
-            if optional_arg not in dict_args:
-                dict_args[optional_arg] = optional_args[optional_arg]
+        check_job_args(dict_args)
 
         # special case for inferring folders from directories
         if 'in_fld' not in dict_args:
@@ -132,26 +150,568 @@ class Batch(object):
             dict_args['out_fld'] = \
                 ''.join([self.out_dir, '{}_{}'.format(dict_args['catchment'], dict_args['outlet']), sep])
 
-    def launch(self):
+    def estimate_costs(self, runtimes_file=None):
+        """
+        This method estimates the cost of each job as the product of its number of links (rows in the .network file),
+        of its number of simulation steps (including the warm-up), and of its number of variables simulated (water
+        quantity and water quality). If the runtimes file exists (i.e. it was saved by a previous batch session), the
+        costs are converted into wall times in seconds using the runtime per unit of cost measured for the same
+        catchment and outlet simulated with the same models (see get_job_runtime_key), or using the average runtime
+        per unit of cost of all the jobs measured otherwise. The runtime per unit of cost is scaled by the cost of
+        the job, so that a job simulating another period or with another simulation gap is estimated accordingly.
+
+        :param runtimes_file: path of the JSON file for the runtimes ('simu.batch.runtimes.json' in out_dir if None)
+        :type runtimes_file: str
+        :return: estimated cost of each job (in the order of the batch file)
+        :rtype: list()
+        """
+        runtimes = load_json(runtimes_file if runtimes_file else self.out_dir + 'simu.batch.runtimes.json')
+
+        my_costs = [get_job_cost(job) for job in self.jobs]
+
+        # runtime per unit of cost for the jobs without previous runtimes (cost only if no runtimes at all)
+        my_total_cost = sum([runtimes[key]['cost'] for key in runtimes])
+        my_default_rate = sum([runtimes[key]['wall_time'] for key in runtimes]) / my_total_cost \
+            if my_total_cost > 0 else 1.0
+
+        my_estimates = list()
+        for job, cost in zip(self.jobs, my_costs):
+            my_history = runtimes.get(get_job_runtime_key(job))
+            if my_history and my_history['cost'] > 0:
+                my_estimates.append(cost * my_history['wall_time'] / my_history['cost'])
+            else:
+                my_estimates.append(cost * my_default_rate)
+
+        return my_estimates
+
+    def launch(self, workers=None, report_file=None, runtimes_file=None, manifest_file=None, resume=True,
+               share_inputs=True, coordinator=None, max_job_cores=1, cache_dir=None):
+        """
+        This method runs all the jobs of the batch on a pool of worker processes, each worker running several jobs in
+        turn. The jobs are dispatched from the longest to the shortest (as estimated by estimate_costs) so that a long
+        job does not start last while the other workers are idle. The jobs do not stop the batch session when they
+        fail, instead, the status, the wall time, the peak memory, and the exception (if any) of each job are
+        collected in a batch report, which is returned and saved as a JSON file (the peak memory is the peak of the
+        job on Linux, but the peak of its worker since it started on the other systems, as given by the scope of the
+        peak memory in the report). The runtimes of the successful jobs
+        are saved in the runtimes file to refine the estimates of the next batch sessions. Each job completed
+        successfully is recorded in the manifest as soon as it is completed, so that a batch session that is
+        interrupted can be launched again and only run the jobs that failed or that did not run. A job is only
+        considered completed if its arguments and the modification times of its input files have not changed since.
+        When several jobs use the same CSV input files (i.e. same catchment and outlet), the files are parsed only once
+        and their time series are shared with the worker processes (read-only) through shared memory (Python 3.8+).
+
+        :param workers: number of cores available for all the jobs running at the same time (number of processors
+        available if None), each job being allocated one or more cores depending on its estimated cost
+        :type workers: int
+        :param report_file: path of the JSON file for the batch report ('simu.batch.json' in out_dir if None)
+        :type report_file: str
+        :param runtimes_file: path of the JSON file for the runtimes ('simu.batch.runtimes.json' in out_dir if None)
+        :type runtimes_file: str
+        :param manifest_file: path of the JSON file for the completed jobs ('simu.batch.manifest.json' in out_dir if
+        None)
+        :type manifest_file: str
+        :param resume: whether to skip the jobs recorded as completed in the manifest or to run all the jobs again
+        :type resume: bool
+        :param share_inputs: whether to parse the input files used by several jobs only once and share them
+        :type share_inputs: bool
+        :param coordinator: backend serving the jobs to workers on other hosts instead of running them in a pool of
+        local processes (the workers and share_inputs arguments are then ignored)
+        :type coordinator: Coordinator
+        :param max_job_cores: maximum number of cores allocated to one job (workers if None, one by default because
+        the simulation of a job only uses one core for the moment)
+        :type max_job_cores: int
+        :param cache_dir: path of the folder where to store the outputs of the jobs in order to reuse them for the jobs
+        with the same fingerprint (see get_job_fingerprint) instead of running them again (no cache if None, for a
+        coordinator, the cache is set for each worker in run_worker)
+        :type cache_dir: str
+        :return: batch report (one dictionary per job, in the order of the batch file)
+        :rtype: list()
+        """
         logger = logging.getLogger('TORRENTpy.bh')
 
-        cores = cpu_count()
-        pool = Pool(processes=cores, maxtasksperchild=1)
-        # 'processes' is the number of simultaneous runs (children) allowed (maximum = number of processors available)
-        # 'maxtasksperchild' is set to 1 to kill each child after task completion to make sure to clean memory properly
+        workers = workers if workers else cpu_count()
+        report_file = report_file if report_file else self.out_dir + 'simu.batch.json'
+        runtimes_file = runtimes_file if runtimes_file else self.out_dir + 'simu.batch.runtimes.json'
+        manifest_file = manifest_file if manifest_file else self.out_dir + 'simu.batch.manifest.json'
+
+        # skip the jobs already completed (if their output folder still exists)
+        my_manifest = load_json(manifest_file)
+        my_keys = [get_job_key(job) for job in self.jobs]
+        my_report = [None] * self.size
+        for index, job in enumerate(self.jobs):
+            if resume and (my_keys[index] in my_manifest) and path.isdir(job['out_fld']):
+                my_report[index] = get_job_report(job, 'skipped')
+        if any(my_report):
+            logger.warning("Skipping {} job(s) already completed.".format(sum([1 for job in my_report if job])))
+
+        # dispatch the jobs from the longest to the shortest (the executor starts them in the order of submission)
+        my_estimates = self.estimate_costs(runtimes_file)
+        my_order = sorted([i for i in range(self.size) if my_report[i] is None],
+                          key=lambda i: my_estimates[i], reverse=True)
 
-        arguments = [(self.kb, kwargs, self.log_file) for kwargs in self.jobs]
+        if coordinator is None:
+            my_results = self._run_on_pool(my_order, workers, share_inputs, max_job_cores, cache_dir, my_estimates)
+        else:
+            my_results = coordinator.run_jobs(self.jobs, my_order)
+        for index, job_report in my_results:
+            my_report[index] = job_report
+            if job_report['status'] == 'success':
+                my_manifest[my_keys[index]] = {
+                    'catchment': self.jobs[index]['catchment'], 'outlet': self.jobs[index]['outlet'],
+                    'completed': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+                }
+            else:
+                my_manifest.pop(my_keys[index], None)
+                logger.error("Job ({}, {}) failed: {}".format(
+                    job_report['catchment'], job_report['outlet'], job_report['exception']))
+            dump_json_atomically(my_manifest, manifest_file)
 
-        pool.imap_unordered(run_job_unpacked, iterable=arguments)
+        if coordinator is not None:  # number of workers that reported on the jobs
+            workers = len(set([job['worker'] for job in my_report if job['worker']]))
+        dump_json_atomically({'workers': workers,
+                              'successes': sum([1 for job in my_report if job['status'] == 'success']),
+                              'failures': sum([1 for job in my_report if job['status'] == 'failure']),
+                              'skipped': sum([1 for job in my_report if job['status'] == 'skipped']),
+                              'jobs': my_report}, report_file)
 
-        pool.close()
-        pool.join()
+        # store the runtimes of the successful jobs to refine the estimates of the costs in the future
+        runtimes = load_json(runtimes_file)
+        for job, job_report in zip(self.jobs, my_report):
+            if job_report['status'] == 'success' and not job_report['cached']:
+                runtimes[get_job_runtime_key(job)] = {
+                    'cost': get_job_cost(job), 'wall_time': job_report['wall_time']
+                }
+        dump_json_atomically(runtimes, runtimes_file)
+
+        self.report = my_report
 
         logger.warning("Ending TORRENTpy Batch Session.")
+        for handler in self._log_handlers:
+            handler.flush()
+
+        return my_report
+
+    def _run_on_pool(self, order, workers, share_inputs, max_job_cores=1, cache_dir=None, estimates=None):
+        """
+        This method runs the jobs on a pool of local worker processes, and yields their reports as they complete.
+        The workers are a budget of cores shared by the jobs running at the same time: each job is allocated one or
+        more cores (see allocate_cores) and it starts as soon as enough cores are free, the jobs that fit in the cores
+        left free by a job waiting for more cores starting first if they do not delay it (see get_jobs_to_start, the
+        durations of the jobs being their estimated costs). The parallel libraries (e.g. OpenMP, OpenBLAS) are limited
+        to one thread per worker (see _set_thread_variables), so that the number of threads never exceeds the number
+        of workers, the cores allocated to a job beyond the first one being for an internal parallel engine only.
+        If a worker process terminates abruptly (e.g. killed by the system), the pool cannot be used anymore: a new pool
+        is started, and the jobs that were running on the broken pool are run again, one at a time, so that the job
+        responsible is told apart from the others. A job is only reported as a failure if it breaks a pool again.
+
+        :return: generator of (index, report)
+        """
+        logger = logging.getLogger('TORRENTpy.bh')
+
+        # parse the input files once for the groups of jobs using the same input files
+        my_blocks, my_descriptors = list(), dict()
+        if share_inputs:
+            my_blocks, my_descriptors = share_input_files(get_shared_input_files([self.jobs[i] for i in order]))
+
+        my_cores = dict(zip(order, allocate_cores([self.jobs[i] for i in order], workers, max_job_cores)))
+        my_durations = {i: estimates[i] if estimates else get_job_cost(self.jobs[i]) for i in order}
+        my_started = dict()
+        my_environ = _set_thread_variables(1)
+
+        # send the KnowledgeBase only once to each worker (the initializer is only available from Python 3.7), and
+        # send the records logged by the workers through a queue to a single listener process writing them, a new
+        # queue being used for each pool because a worker terminated while writing in a queue leaves it locked
+        def start_pool():
+            if sys.version_info >= (3, 7):
+                my_log_queue, my_listener = start_log_listener(self.log_file, self._log_handlers[-1].formatter)
+                return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                           initargs=(self.kb, self.log_file, my_log_queue)), my_listener
+            return ProcessPoolExecutor(max_workers=workers), None
+
+        def stop_pool(pool):
+            pool[0].shutdown(wait=True)
+            if pool[1] is not None:
+                stop_log_listener(pool[1])
+
+        my_pool = start_pool()
+        executor = my_pool[0]
+        try:
+            my_pending = list(order)
+            my_running = dict()
+            my_free_cores = workers
+            my_broken = False
+            my_suspects = set()  # jobs running on a pool when it broke
+            while my_pending or my_running:
+                # replace the pool once the jobs that were running on the broken pool have all been reported
+                if my_broken and not my_running:
+                    logger.warning("A worker process terminated abruptly, starting a new pool of workers "
+                                   "for the {} job(s) pending.".format(len(my_pending)))
+                    stop_pool(my_pool)
+                    my_pool = start_pool()
+                    executor = my_pool[0]
+                    my_broken = False
+                # start the next jobs (in order) that fit in the cores free, unless the pool is broken, the jobs that
+                # were running on a broken pool starting first, each of them on its own
+                my_waiting_suspects = [index for index in my_pending if index in my_suspects]
+                if my_broken or my_suspects.intersection(my_running):
+                    my_jobs_to_start = list()
+                elif my_waiting_suspects:
+                    my_jobs_to_start = list() if my_running else my_waiting_suspects[:1]
+                else:
+                    my_now = default_timer()
+                    my_releases = [(max(my_durations[i] - (my_now - my_started[i]), 0.0), my_cores[i])
+                                   for i in my_running.values()]
+                    my_jobs_to_start = get_jobs_to_start(my_pending, my_cores, my_free_cores,
+                                                         my_durations, my_releases)
+                for index in my_jobs_to_start:
+                    my_job_descriptors = {input_file: my_descriptors[input_file]
+                                          for input_file in get_input_files(self.jobs[index])
+                                          if input_file in my_descriptors}
+                    try:
+                        if sys.version_info >= (3, 7):
+                            my_future = executor.submit(run_job_in_worker, self.jobs[index], my_job_descriptors,
+                                                        my_cores[index], cache_dir)
+                        else:
+                            my_future = executor.submit(run_job, self.kb, self.jobs[index], self.log_file,
+                                                        my_job_descriptors, my_cores[index], cache_dir)
+                    except BrokenProcessPool:  # the job is still pending, it will start on the new pool
+                        my_broken = True
+                        break
+                    my_pending.remove(index)
+                    my_running[my_future] = index
+                    my_started[index] = default_timer()
+                    my_free_cores -= my_cores[index]
+                if not my_running:
+                    continue
+                my_done = wait(list(my_running), return_when=FIRST_COMPLETED)[0]
+                for future in my_done:
+                    index = my_running.pop(future)
+                    my_free_cores += my_cores[index]
+                    try:
+                        yield index, future.result()
+                    except BrokenProcessPool as e:
+                        my_broken = True
+                        if index in my_suspects:  # it was running on its own, so it broke the pool
+                            yield index, get_job_report(
+                                self.jobs[index], 'failure',
+                                "A worker process terminated abruptly while the job was running: {!r}".format(e))
+                        else:  # run it again on the new pool to find out whether it broke the pool
+                            my_suspects.add(index)
+                            my_pending.insert(0, index)
+                    except Exception as e:  # the job could not be sent to or returned by the worker process
+                        yield index, get_job_report(self.jobs[index], 'failure', repr(e))
+        finally:
+            stop_pool(my_pool)
+            for variable in my_environ:
+                if my_environ[variable] is None:
+                    environ.pop(variable, None)
+                else:
+                    environ[variable] = my_environ[variable]
+            release_input_files(my_blocks)
+
+
+def check_job_args(dict_args):
+    """
+    This function checks that the mandatory arguments of a job are all given, and gives their default value to the
+    optional arguments that are not given.
+
+    :param dict_args: dictionary of the arguments of the job (updated in place)
+    :type dict_args: dict()
+    """
+    logger = logging.getLogger('TORRENTpy.bh')
+
+    mandatory_args = [
+        'catchment', 'outlet', 'dt_data_start', 'dt_data_end', 'dt_save_start', 'dt_save_end',
+        'variable_h', 'data_increment_in_minutes', 'save_increment_in_minutes',
+        'simu_increment_in_minutes'
+    ]
+
+    optional_args = {
+        'in_format': 'csv', 'out_format': 'csv', 'expected_simu_slice_length': 0, 'verbose': False,
+        'catchment_h': None, 'river_h': None, 'lake_h': None, 'variables_q': None,
+        'catchment_q': None, 'river_q': None, 'lake_q': None,
+        'meteo_cumulative': [], 'meteo_average': [], 'contamination_cumulative': [],
+        'contamination_average': [], 'warm_up_in_days': 0, 'water_quality': False,
+        'out_dtype': 'float64', 'out_complevel': 1, 'out_shuffle': True, 'out_chunksize': None, 'out_digits': 7,
+        'memory_budget': None, 'warm_up_cache': None
+    }
+
+    # check if mandatory arguments are all defined, if not, raise Exception
+    for mandatory_arg in mandatory_args:
+        if mandatory_arg not in dict_args:
+            logger.error("The batch session cannot proceed, "
+                         "it is missing the mandatory argument: {}.".format(mandatory_arg))
+            raise Exception("The batch session cannot proceed, "
+                            "it is missing the mandatory argument: {}.".format(mandatory_arg))
+    # check if optional arguments are defined, if not, give them their default value
+    for optional_arg in optional_args:
+        if optional_arg not in dict_args:
+            dict_args[optional_arg] = optional_args[optional_arg]
+
+
+def get_job_cost(dict_args):
+    """
+    This function returns the cost of a job as the product of its number of links, of its number of simulation steps
+    (including the warm-up), and of its number of variables simulated. The cost is zero if the .network file does
+    not exist (the job will fail straight away).
+    """
+    my_links = get_job_links(dict_args)
+    if my_links == 0:
+        return 0.0
+
+    my_period = dict_args['dt_save_end'] - dict_args['dt_save_start']
+    my_minutes = my_period.total_seconds() / 60.0 + dict_args['warm_up_in_days'] * 1440.0
+    my_steps = my_minutes / dict_args['simu_increment_in_minutes']
+
+    my_variables = 1
+    if dict_args['water_quality'] and dict_args['variables_q']:
+        my_variables += len(dict_args['variables_q'])
+
+    return float(my_links * my_steps * my_variables)
+
+
+def get_job_runtime_key(dict_args):
+    """
+    This function returns the key of the runtimes of a job, i.e. its catchment and outlet followed by a hash of the
+    arguments changing its runtime per unit of cost (the models simulated and the water quality variables), so that
+    the jobs of the same catchment simulated with different models do not share their runtimes. The arguments only
+    changing the cost itself (e.g. the period, the simulation gap) are not part of the key.
+    """
+    my_models = [dict_args[arg] for arg in ['catchment_h', 'river_h', 'lake_h', 'water_quality', 'variables_q',
+                                            'catchment_q', 'river_q', 'lake_q']]
+    return '{}_{}_{}'.format(dict_args['catchment'], dict_args['outlet'],
+                             sha1(json.dumps(my_models, default=str).encode('utf-8')).hexdigest()[:12])
+
+
+def get_job_links(dict_args):
+    """
+    This function returns the number of links of the network of a job (zero if the .network file does not exist).
+    """
+    my_network_file = '{}{}_{}.network'.format(dict_args['in_fld'], dict_args['catchment'], dict_args['outlet'])
+    try:
+        with open(my_network_file) as my_file:
+            return max(sum([1 for line in my_file if line.strip()]) - 1, 0)  # discard the header
+    except (IOError, OSError):
+        return 0
+
+
+def allocate_cores(jobs, workers, max_job_cores=1):
+    """
+    This function splits a budget of cores between jobs according to their estimated costs. A job gets one core
+    per multiple of the median cost of the jobs, without getting more cores than its number of links (i.e. the
+    maximum number of parts of a network that can be simulated at the same time) or than max_job_cores, so that
+    small catchments get one core and large networks get several cores for an internal parallel engine. Since the
+    simulation of a job only uses one core for the moment, max_job_cores is one by default.
+
+    :param jobs: list of the dictionaries of arguments of the jobs
+    :type jobs: list()
+    :param workers: total number of cores available (i.e. budget)
+    :type workers: int
+    :param max_job_cores: maximum number of cores for one job (workers if None)
+    :type max_job_cores: int
+    :return: number of cores allocated to each job
+    :rtype: list()
+    """
+    max_job_cores = min(max_job_cores, workers) if max_job_cores else workers
+    my_costs = [get_job_cost(job) for job in jobs]
+    my_sorted_costs = sorted([cost for cost in my_costs if cost > 0])
+    if not my_sorted_costs:
+        return [1] * len(jobs)
+    my_median = my_sorted_costs[(len(my_sorted_costs) - 1) // 2]
+    return [max(1, min(int(cost // my_median), get_job_links(job), max_job_cores))
+            for job, cost in zip(jobs, my_costs)]
+
+
+def get_jobs_to_start(pending, cores, free_cores, durations, releases):
+    """
+    This function returns the pending jobs to start given the number of cores free, taking the jobs in order but
+    letting the jobs that fit in the cores free start before the first job waiting for more cores (i.e.
+    backfilling), so that no core is left idle while a job could use it. The cores the waiting job needs are
+    reserved for the time when enough cores are released by the running jobs for it to start: a job only starts
+    before it if it completes before that time, or if it only uses cores that the waiting job will not need, so
+    that a stream of small jobs cannot keep delaying a large job.
+
+    :param pending: list of the indices of the jobs pending (in the order to start them)
+    :type pending: list()
+    :param cores: number of cores allocated to each job { key = index: value = int }
+    :type cores: dict()
+    :param free_cores: number of cores free
+    :type free_cores: int
+    :param durations: estimated duration of each job { key = index: value = float }
+    :type durations: dict()
+    :param releases: estimated remaining duration and number of cores of each job running
+    :type releases: list(tuple(float, int))
+    :return: list of the indices of the jobs to start
+    :rtype: list()
+    """
+    my_jobs = list()
+    my_waiting = None
+    for index in pending:
+        if my_waiting is None:
+            if cores[index] <= free_cores:
+                my_jobs.append(index)
+                free_cores -= cores[index]
+                releases = releases + [(durations[index], cores[index])]
+                continue
+            # reserve cores for the first job waiting: find when enough cores are released, and how many are spare
+            my_waiting = index
+            my_shadow, my_spare = 0.0, 0
+            my_released = free_cores
+            for remaining, job_cores in sorted(releases):
+                my_released += job_cores
+                if my_released >= cores[index]:
+                    my_shadow, my_spare = remaining, my_released - cores[index]
+                    break
+        elif cores[index] <= free_cores:
+            if durations[index] <= my_shadow:
+                my_jobs.append(index)
+                free_cores -= cores[index]
+            elif cores[index] <= min(my_spare, free_cores):
+                my_jobs.append(index)
+                free_cores -= cores[index]
+                my_spare -= cores[index]
+    return my_jobs
+
+
+def get_input_files(dict_args):
+    """
+    This function returns the absolute paths of the input files (meteorology and contamination) that a job may
+    read, i.e. the files in its input folder starting with the catchment name and with the extension of one of its
+    input variables, or with the extension of the input category if one of the variables has no file of its own
+    (followed by '.nc' for the netCDF input format).
+    """
+    if not path.isdir(dict_args['in_fld']):
+        return list()
+    my_categories = {'meteorology': dict_args['meteo_cumulative'] + dict_args['meteo_average']}
+    if dict_args['water_quality']:
+        my_categories['contamination'] = dict_args['contamination_cumulative'] + dict_args['contamination_average']
+
+    my_suffix = '.nc' if dict_args['in_format'] == 'netcdf' else ''
+    my_names = [name[:len(name) - len(my_suffix)] for name in sorted(listdir(dict_args['in_fld']))
+                if name.startswith('{}_'.format(dict_args['catchment'])) and name.endswith(my_suffix)]
+    my_input_files = list()
+    for name in my_names:
+        stem, extension = path.splitext(name)
+        extension = extension[1:]
+        if extension in my_categories:
+            if any(['{}.{}'.format(stem, data_type) not in my_names for data_type in my_categories[extension]]):
+                my_input_files.append(name)
+        elif any([extension in my_categories[category] for category in my_categories]):
+            my_input_files.append(name)
+
+    return [path.abspath(path.join(dict_args['in_fld'], name + my_suffix)) for name in my_input_files]
+
+
+def get_job_files(dict_args):
+    """
+    This function returns the absolute paths of the files of its input folder that the simulation of a job reads,
+    i.e. the network, waterbodies, and descriptors files, the parameters files of the catchment, the constants files,
+    and the input files (see get_input_files). The other files of the catchment (e.g. .gv, .pdf, .flow) are left out.
+    """
+    if not path.isdir(dict_args['in_fld']):
+        return list()
+    my_prefix = '{}_{}.'.format(dict_args['catchment'], dict_args['outlet'])
+    my_names = [name for name in listdir(dict_args['in_fld'])
+                if (name in [my_prefix + extension for extension in ['network', 'waterbodies', 'descriptors']]) or
+                (name.startswith(my_prefix) and name.endswith('.parameters')) or name.endswith('.constants')]
+    return sorted([path.abspath(path.join(dict_args['in_fld'], name)) for name in my_names] +
+                  get_input_files(dict_args))
+
+
+def get_shared_input_files(jobs):
+    """
+    This function returns the input files worth sharing, i.e. the CSV files used by at least two of the jobs.
+    """
+    my_counts = dict()
+    for job in jobs:
+        if job['in_format'] != 'csv':
+            continue
+        for input_file in get_input_files(job):
+            my_counts[input_file] = my_counts.get(input_file, 0) + 1
+    return sorted([input_file for input_file in my_counts if my_counts[input_file] > 1])
+
+
+def get_job_key(dict_args):
+    """
+    This function returns a key identifying a job from a hash of its arguments and of the names and the modification
+    times of the files in its input folder, so that a job is run again if any of them changes.
+    """
+    my_hash = sha1(json.dumps(dict_args, sort_keys=True, default=str).encode('utf-8'))
+    if path.isdir(dict_args['in_fld']):
+        for name in sorted(listdir(dict_args['in_fld'])):
+            my_hash.update('{}:{!r}'.format(name, path.getmtime(path.join(dict_args['in_fld'], name))).encode('utf-8'))
+    return my_hash.hexdigest()
+
+
+def load_json(json_file):
+    """
+    This function reads a JSON file saved by a previous batch session (e.g. runtimes, manifest).
+
+    :return: dictionary stored in the file (empty if there is no file)
+    :rtype: dict()
+    """
+    if not path.isfile(json_file):
+        return dict()
+    with open(json_file) as my_file:
+        return json.load(my_file)
+
+
+def dump_json_atomically(data, json_file):
+    """
+    This function saves a dictionary in a JSON file by writing a temporary file first and then replacing the file,
+    so that the file is never left partially written if the batch session is interrupted.
+    """
+    my_tmp_file = json_file + '.tmp'
+    with open(my_tmp_file, 'w') as my_file:
+        json.dump(data, my_file, indent=2, sort_keys=True)
+        my_file.flush()
+        fsync(my_file.fileno())
+    replace(my_tmp_file, json_file)
 
 
-def set_up_and_run_job(kb, dict_args):
+def set_up_and_run_job(kb, dict_args, cache_dir=None):
+    """
+    This function sets up and runs the simulation of a job. If a cache folder is given, the outputs are copied from
+    the cache if a simulation with the same fingerprint (see get_job_fingerprint) was already run, otherwise the
+    outputs of the simulation are stored in the cache once it is completed.
 
+    :return: whether the outputs were found in the cache
+    :rtype: bool
+    """
+    if cache_dir is not None:
+        my_fingerprint = get_job_fingerprint(kb, dict_args)
+        if restore_cached_outputs(cache_dir, my_fingerprint, dict_args):
+            return True
+
+    nw, tf, db = set_up_job(kb, dict_args)
+
+    nw.simulate(
+        db, tf,
+        out_format=dict_args['out_format'],
+        out_dtype=dict_args['out_dtype'],
+        out_complevel=dict_args['out_complevel'],
+        out_shuffle=dict_args['out_shuffle'],
+        out_chunksize=dict_args['out_chunksize'],
+        out_digits=dict_args['out_digits'],
+        memory_budget=dict_args['memory_budget'],
+        warm_up_cache=dict_args['warm_up_cache']
+    )
+
+    if cache_dir is not None:
+        store_cached_outputs(cache_dir, my_fingerprint, dict_args)
+
+    return False
+
+
+def set_up_job(kb, dict_args):
+    """
+    This function creates the Network (with its Models), the TimeFrame, and the DataBase (with the inputs loaded)
+    of a job, so that they can be used to run one or several simulations.
+
+    :return: Network, TimeFrame, and DataBase objects of the job
+    :rtype: tuple(Network, TimeFrame, DataBase)
+    """
     nw = Network(
         catchment=dict_args['catchment'],
         outlet=dict_args['outlet'],
@@ -202,31 +762,347 @@ def set_up_and_run_job(kb, dict_args):
         lake_q=dict_args['lake_q']
     )
 
-    nw.simulate(
-        db, tf,
-        out_format=dict_args['out_format']
-    )
+    return nw, tf, db
+
+
+def get_job_fingerprint(kb, dict_args):
+    """
+    This function returns a fingerprint of the simulation of a job, i.e. a hash of everything the outputs depend
+    on: the arguments of the job (except the locations of the folders and the verbosity), the contents of the
+    files read by the simulation (see get_job_files), the models available in the KnowledgeBase, and the version
+    of TORRENTpy.
+    """
+    my_hash = sha256()
+    my_args = {key: dict_args[key] for key in dict_args
+               if key not in ['in_fld', 'out_fld', 'verbose', 'warm_up_cache']}
+    my_hash.update(json.dumps(my_args, sort_keys=True, default=str).encode('utf-8'))
+    my_models = [(category, name, '{}.{}'.format(model.__module__, model.__name__))
+                 for category, models in [('c', kb._catchment_models), ('r', kb._river_models), ('l', kb._lake_models)]
+                 for name, model in models.items()]
+    my_hash.update(json.dumps(sorted(my_models)).encode('utf-8'))
+    my_hash.update(__version__.encode('utf-8'))
+    for job_file in get_job_files(dict_args):
+        my_hash.update(path.basename(job_file).encode('utf-8'))
+        with open(job_file, 'rb') as my_file:
+            for chunk in iter(lambda: my_file.read(1 << 20), b''):
+                my_hash.update(chunk)
+    return my_hash.hexdigest()
 
 
-def run_job(kb, args, log_file):
-    # set up all the loggers required (two required because it is difficult to catch the exception from multiple jobs)
-    mp_logger = log_to_stderr()
-    mp_logger.setLevel(logging.INFO)
-    handler = logging.FileHandler(log_file)
-    handler.setFormatter(logging.Formatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                                           datefmt="%d/%m/%Y - %H:%M:%S"))
+def restore_cached_outputs(cache_dir, fingerprint, dict_args):
+    """
+    This function puts the outputs stored in the cache for the fingerprint in the output folder of the job (as hard
+    links if possible, as copies otherwise). The files are never written again in place (a new simulation deletes
+    them first), so the hard links cannot alter the cache.
+
+    :return: whether the outputs were found in the cache
+    :rtype: bool
+    """
+    my_cached_fld = path.join(cache_dir, fingerprint)
+    if not path.isdir(my_cached_fld):
+        return False
+    if not path.isdir(dict_args['out_fld']):
+        os.makedirs(dict_args['out_fld'])
+    for my_file in glob('{}{}_*'.format(dict_args['out_fld'], dict_args['catchment'])):
+        if path.isfile(my_file):
+            os.remove(my_file)
+    for name in listdir(my_cached_fld):
+        try:
+            os.link(path.join(my_cached_fld, name), path.join(dict_args['out_fld'], name))
+        except (OSError, AttributeError):  # not on the same file system, or not supported
+            copy2(path.join(my_cached_fld, name), path.join(dict_args['out_fld'], name))
+    return True
+
+
+def store_cached_outputs(cache_dir, fingerprint, dict_args):
+    """
+    This function copies the outputs of the job in the cache under its fingerprint. The copy is made in a temporary
+    folder which is then renamed, so that the cache never contains incomplete outputs.
+    """
+    my_cached_fld = path.join(cache_dir, fingerprint)
+    if path.isdir(my_cached_fld):
+        return
+    my_tmp_fld = '{}.{}.tmp'.format(my_cached_fld, getpid())
+    os.makedirs(my_tmp_fld)
+    try:
+        for my_file in glob('{}{}_*'.format(dict_args['out_fld'], dict_args['catchment'])):
+            # the log is not stored because the log of the job reusing the outputs is appended to it
+            if path.isfile(my_file) and not my_file.endswith('.simu.log'):
+                copy2(my_file, my_tmp_fld)
+        os.rename(my_tmp_fld, my_cached_fld)
+    except OSError:  # another process stored the same outputs in the meantime
+        rmtree(my_tmp_fld, ignore_errors=True)
+
+
+def init_worker(kb, log_file, log_queue=None):
+    """
+    This function initialises a worker process of a batch session. It keeps the KnowledgeBase for all the jobs run
+    by the worker, so that it is not sent again with each job, and it sets up the logging. If a queue is given, all
+    the records are sent through the queue (to the listener process writing the log files) instead of
+    being written by the worker, otherwise the worker writes in the batch log file. The files describing the
+    catchments (network, waterbodies, descriptors, parameters, constants) read by the jobs are also kept by the
+    worker (see inout.read_csv_rows), so that the following jobs on the same catchments do not read them again.
+    """
+    _worker['kb'] = kb
+    _worker['log_file'] = log_file
+    if log_queue is not None:
+        # replace the handlers (possibly inherited from the process of the batch session) by the queue
+        logger = logging.getLogger('TORRENTpy')
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        handler = QueueHandler(log_queue)
+        handler.addFilter(_JobLogFilter())
+        logger.addHandler(handler)
+        logger.propagate = False
+        _worker['log_file'] = None
+    else:
+        _set_worker_logger(log_file)
+
+
+def run_job_in_worker(args, shared_inputs=None, cores=None, cache_dir=None):
+    # run a job using the KnowledgeBase and the log file given to the worker when it was initialised
+    return run_job(_worker['kb'], args, _worker['log_file'], shared_inputs, cores, cache_dir)
+
+
+def run_job(kb, args, log_file, shared_inputs=None, cores=None, cache_dir=None):
+    """
+    This function runs one job and reports on it rather than raising its exception, because the worker processes
+    are reused from one job to the next. The input files shared by the batch session (if any) are used instead of
+    parsing them again. The number of cores allocated to the job (if any) is recorded in its report (the parallel
+    libraries using one thread per worker, see _set_thread_variables). The outputs are reused from the cache folder
+    (if any) when the same simulation was already run.
+
+    :return: dictionary with the status ('success' or 'failure'), the wall time (in seconds), the peak resident memory
+    of the worker process (in bytes, None if not available) and its scope ('job' if the peak could be reset before
+    the job, i.e. on Linux only, or 'worker' for the peak since the worker started, i.e. including the previous jobs
+    of the worker), and the exception and its traceback (None if success)
+    :rtype: dict()
+    """
     logger = logging.getLogger('TORRENTpy.bh')
-    logger.addHandler(handler)
-    # set up and run for the job passes, and catch and raise exceptions when they show up
+    _set_worker_logger(log_file)
+
+    my_report = get_job_report(args, 'success')
+    my_report['worker'] = '{}:{}'.format(gethostname(), getpid())
+    _worker['job_log_file'] = '{}{}_{}.simu.log'.format(args['out_fld'], args['catchment'], args['outlet'])
+    if cores:
+        my_report['cores'] = cores
+    my_peak_reset = _reset_peak_memory()
+    start = default_timer()
+    # set up and run for the job passes, and catch the exceptions when they show up
+    my_blocks = list()
     try:
-        set_up_and_run_job(kb, args)
+        my_blocks = attach_input_files(shared_inputs if shared_inputs else dict())
+        my_report['cached'] = set_up_and_run_job(kb, args, cache_dir)
     except Exception as e:
-        mp_logger.error("Exception for arguments ({}, {})".format(args['catchment'], args['outlet']))
         logger.error("Exception for arguments ({}, {})".format(args['catchment'], args['outlet']))
         logger.exception(e)
-        raise e
+        my_report['status'] = 'failure'
+        my_report['exception'] = repr(e)
+        my_report['traceback'] = format_exc()
+    finally:
+        detach_input_files(my_blocks)
+    my_report['wall_time'] = default_timer() - start
+    my_report['peak_memory'] = _get_peak_memory()
+    if my_report['peak_memory'] is not None:
+        my_report['peak_memory_scope'] = 'job' if my_peak_reset else 'worker'
+    _worker['job_log_file'] = None
+
+    return my_report
+
 
+def get_job_report(args, status, exception=None):
+    """
+    This function returns the report of a job (as found in the batch report) with the given status, before its
+    worker, its wall time, and its peak memory are known.
+    """
+    return {'catchment': args['catchment'], 'outlet': args['outlet'], 'status': status,
+            'worker': None, 'cores': None, 'cached': False,
+            'wall_time': None, 'peak_memory': None, 'peak_memory_scope': None,
+            'exception': exception, 'traceback': None}
 
-def run_job_unpacked(args):
-    # simple function that unpacks the arguments given as a tuple
-    return run_job(*args)
+
+class JobLogHandler(logging.Handler):
+    """
+    This handler writes the records sent by the workers of a batch session in the log files of the jobs they come
+    from (i.e. the .simu.log files in the output folders of the jobs). The most recently used files are kept open
+    so that the records are written by batches.
+    """
+    def __init__(self, max_open_files=16):
+        logging.Handler.__init__(self)
+        self.max_open_files = max_open_files
+        # files open { key = path: value = file object }
+        self._files = OrderedDict()
+
+    def emit(self, record):
+        log_file = getattr(record, 'job_log_file', None)
+        if log_file is None:
+            return
+        try:
+            my_file = self._files.pop(log_file, None)
+            if my_file is None:
+                my_file = open(log_file, 'a')
+            self._files[log_file] = my_file  # now the most recently used
+            while len(self._files) > self.max_open_files:
+                self._files.popitem(last=False)[1].close()
+            my_file.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        for my_file in self._files.values():
+            my_file.flush()
+
+    def close(self):
+        for my_file in self._files.values():
+            my_file.close()
+        self._files.clear()
+        logging.Handler.close(self)
+
+
+def start_log_listener(log_file, formatter):
+    """
+    This function starts the process writing the records sent by the workers of a batch session through the queue
+    it returns: in the batch log file (by batches, straight away for errors) and on the console for the warnings and
+    errors, and in the log files of the jobs for all the records (see JobLogHandler). The workers only put their
+    records in the queue (see init_worker), the records being sent to the listener by a background thread.
+
+    :param log_file: path of the batch log file (the records are appended to it)
+    :type log_file: str
+    :param formatter: formatter of the records
+    :type formatter: logging.Formatter
+    :return: queue for the workers, and listener to give to stop_log_listener
+    :rtype: tuple(multiprocessing.Queue, tuple())
+    """
+    my_log_queue = multiprocessing.Queue()
+    my_stop = multiprocessing.Event()
+    my_process = multiprocessing.Process(target=_run_log_listener, args=(my_log_queue, my_stop, log_file, formatter))
+    my_process.daemon = True
+    my_process.start()
+    return my_log_queue, (my_process, my_stop)
+
+
+def stop_log_listener(listener, timeout=10.0):
+    """
+    This function stops the listener process once it has written all the records sent through its queue (i.e. once
+    the workers using the queue have exited).
+    """
+    my_process, my_stop = listener
+    my_stop.set()
+    my_process.join(timeout)
+    if my_process.is_alive():  # waiting for the end of a record cut short by a worker terminated abruptly
+        my_process.terminate()
+        my_process.join()
+
+
+def _run_log_listener(log_queue, stop, log_file, formatter):
+    # write the records until asked to stop and all the records sent are written (the files are flushed when idle)
+    my_file_handler = logging.FileHandler(log_file)
+    my_file_handler.setFormatter(formatter)
+    my_handlers = [MemoryHandler(capacity=256, flushLevel=logging.ERROR, target=my_file_handler),
+                   logging.StreamHandler(), JobLogHandler()]
+    for handler, level in zip(my_handlers, [logging.WARNING, logging.WARNING, logging.INFO]):
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+    try:
+        while not (stop.is_set() and log_queue.empty()):
+            try:
+                record = log_queue.get(timeout=0.1)
+            except Empty:
+                for handler in my_handlers:
+                    handler.flush()
+                continue
+            for handler in my_handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+    finally:
+        for handler in my_handlers:
+            handler.close()
+        my_file_handler.close()
+
+
+class _JobLogFilter(logging.Filter):
+    # attach the log file of the job being run by the worker to the records
+    def filter(self, record):
+        record.job_log_file = _worker.get('job_log_file')
+        return True
+
+
+def _set_worker_logger(log_file):
+    # set up the batch log file only once per worker process, not for each of the jobs it runs
+    logger = logging.getLogger('TORRENTpy.bh')
+    if not log_file:
+        return
+    if not any([getattr(handler, 'baseFilename', None) == path.abspath(log_file) for handler in logger.handlers]):
+        handler = logging.FileHandler(log_file)
+        handler.setFormatter(logging.Formatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                               datefmt="%d/%m/%Y - %H:%M:%S"))
+        logger.addHandler(handler)
+
+
+def _set_thread_variables(threads):
+    # set the number of threads of the parallel libraries in the environment the worker processes are started with
+    # (these libraries read it when they are imported, i.e. before any job runs, so it cannot be set for each job
+    # run by a worker), and return the previous values
+    my_previous = dict()
+    for variable in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS']:
+        my_previous[variable] = environ.get(variable)
+        environ[variable] = str(threads)
+    return my_previous
+
+
+def _reset_peak_memory():
+    # on Linux, the peak resident memory of the process can be reset so that it is the peak of the current job only
+    # (the other systems only give the peak since the process started), return whether it was reset
+    if _worker.get('peak_memory_reset') is False:  # not supported, do not try again for each job
+        return False
+    try:
+        with open('/proc/self/clear_refs', 'w') as my_file:
+            my_file.write('5')
+        _worker['peak_memory_reset'] = True
+    except (IOError, OSError):
+        _worker['peak_memory_reset'] = False
+    return _worker['peak_memory_reset']
+
+
+def _get_peak_memory():
+    # on Linux, read the peak resident memory since the last reset, otherwise, use the peak since the process started
+    try:
+        with open('/proc/self/status') as my_file:
+            for line in my_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in bytes on macOS, and in kilobytes on the other systems
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    if sys.platform == 'win32':
+        return _get_windows_peak_memory()
+    return None
+
+
+def _get_windows_peak_memory():
+    # on Windows, the peak working set of the process is given by GetProcessMemoryInfo
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    try:
+        my_counters = ProcessMemoryCounters()
+        my_counters.cb = ctypes.sizeof(my_counters)
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = wintypes.HANDLE
+        get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_process_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        get_process_memory_info.restype = wintypes.BOOL
+        if get_process_memory_info(get_current_process(), ctypes.byref(my_counters), my_counters.cb):
+            return int(my_counters.PeakWorkingSetSize)
+    except (AttributeError, OSError):
+        pass
+    return None
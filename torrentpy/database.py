@@ -26,7 +26,7 @@ from .inout import read_csv_timeseries_with_data_checks, \
     read_netcdf_timeseries_with_data_checks
 from .timeframe import get_required_resolution, \
     rescale_time_resolution_of_regular_cumulative_data, \
-    rescale_time_resolution_of_regular_mean_data
+    rescale_time_resolution_of_regular_mean_data, CalendarTable
 
 
 class DataBase(object):
@@ -46,6 +46,8 @@ class DataBase(object):
         self.contamination_average = contamination_average
         # for simulation
         self.simulation = None
+        # for calendar information of the simulation slice
+        self.calendar = None
 
         # set the input database as required
         self._set_db_for_meteo_links(in_format)
@@ -99,6 +101,10 @@ class DataBase(object):
         """
         logger = getLogger('TORRENTpy.db')
         logger.info("> Generating data structures.")
+        # generate the DateTime of the slice only once so that they are shared by all the nodes and links
+        my_simu_slice = list(my_simu_slice)
+        # compute the calendar information once for all the nodes and links
+        self.calendar = CalendarTable(my_simu_slice)
         dict__nd_data = dict()  # key: waterbody, value: data frame (x: time step, y: data type)
         # Create NestedDicts for the nodes
         for node in self._nw.nodes:
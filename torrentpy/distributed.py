@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from multiprocessing.managers import BaseManager
+from collections import deque
+from threading import Lock, Thread, Event
+from time import time, sleep
+import socket
+import os
+import logging
+
+from .knowledgebase import KnowledgeBase
+from .batch import run_job, get_job_report
+
+
+class JobQueue(object):
+    """
+    This class holds the jobs of a batch session in the coordinator, and is used by the workers (through a proxy)
+    to get jobs, to send heartbeats while running them, and to send their reports back.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        # jobs waiting for a worker [ (index, arguments) ]
+        self._pending = deque()
+        # jobs being run { key = index: value = [arguments, worker, time of the last heartbeat] }
+        self._running = dict()
+        # number of times each job was given to a worker { key = index: value = int }
+        self._attempts = dict()
+        # reports of the jobs completed not yet collected by the coordinator [ (index, report) ]
+        self._results = deque()
+        # indices of the jobs completed
+        self._completed = set()
+        # total number of jobs
+        self._size = 0
+
+    def put_jobs(self, jobs):
+        with self._lock:
+            for index, args in jobs:
+                self._pending.append((index, args))
+                self._attempts[index] = 0
+                self._size += 1
+
+    def get_job(self, worker):
+        # return the next job to run as (index, arguments), or None if there is none pending for the moment
+        with self._lock:
+            if not self._pending:
+                return None
+            index, args = self._pending.popleft()
+            self._running[index] = [args, worker, time()]
+            self._attempts[index] += 1
+            return index, args
+
+    def heartbeat(self, worker, index):
+        # return whether the job is still assigned to the worker (it is not if the worker was considered lost)
+        with self._lock:
+            if (index in self._running) and (self._running[index][1] == worker):
+                self._running[index][2] = time()
+                return True
+            return False
+
+    def put_result(self, worker, index, report):
+        with self._lock:
+            if index in self._completed:  # the job was given again to another worker, which completed it first
+                return
+            self._running.pop(index, None)
+            self._pending = deque([(i, args) for i, args in self._pending if i != index])
+            self._completed.add(index)
+            report['attempts'] = self._attempts[index]
+            self._results.append((index, report))
+
+    def get_results(self):
+        with self._lock:
+            my_results = list(self._results)
+            self._results.clear()
+            return my_results
+
+    def requeue_lost(self, timeout, max_attempts):
+        # put the jobs without heartbeat for longer than timeout back at the front of the queue, unless they were
+        # already given max_attempts times, in which case they are reported as failures
+        with self._lock:
+            my_lost = list()
+            for index in [i for i in self._running if time() - self._running[i][2] > timeout]:
+                args, worker = self._running.pop(index)[:2]
+                my_lost.append((index, worker))
+                if self._attempts[index] < max_attempts:
+                    self._pending.appendleft((index, args))
+                else:
+                    self._completed.add(index)
+                    report = get_job_report(args, 'failure', "Job lost {} time(s), last by worker {}.".format(
+                        self._attempts[index], worker))
+                    report['attempts'] = self._attempts[index]
+                    self._results.append((index, report))
+            return my_lost
+
+    def is_finished(self):
+        with self._lock:
+            return len(self._completed) == self._size
+
+
+# queue of the coordinator (created in the process of the server of the manager)
+_job_queue = None
+
+
+def _get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+
+class JobManager(BaseManager):
+    pass
+
+
+JobManager.register('get_job_queue', callable=_get_job_queue)
+
+
+class Coordinator(object):
+    """
+    This class is a Batch backend serving the jobs over the network to workers started on other hosts (using
+    run_worker), instead of running them in a pool of local processes. The workers must see the input and output
+    folders of the jobs with the same paths as the coordinator (e.g. on a shared file system). A job whose worker
+    does not send any heartbeat for longer than heartbeat_timeout (e.g. the host went down) is given to another
+    worker, up to max_attempts times.
+    """
+    def __init__(self, address, authkey, heartbeat_timeout=60.0, max_attempts=3, poll_interval=1.0):
+        """
+        :param address: host name (or IP address) and port number the coordinator listens on
+        :type address: tuple(str, int)
+        :param authkey: secret shared by the coordinator and the workers to authenticate the connections
+        :type authkey: str
+        :param heartbeat_timeout: time without heartbeat (in seconds) after which a job is considered lost
+        :type heartbeat_timeout: float
+        :param max_attempts: number of times a job can be given to a worker before being reported as a failure
+        :type max_attempts: int
+        :param poll_interval: time (in seconds) between two collections of the results
+        :type poll_interval: float
+        """
+        self.address = tuple(address)
+        self.authkey = authkey.encode('utf-8') if not isinstance(authkey, bytes) else authkey
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+    def run_jobs(self, jobs, order):
+        """
+        This method serves the jobs in the given order and yields their reports as they are sent back by the
+        workers, until all the jobs are completed.
+
+        :param jobs: list of the dictionaries of arguments of the jobs of the batch
+        :type jobs: list()
+        :param order: list of the indices of the jobs to run (in the order to serve them)
+        :type order: list()
+        :return: generator of (index, report)
+        """
+        logger = logging.getLogger('TORRENTpy.dt')
+
+        manager = JobManager(address=self.address, authkey=self.authkey)
+        manager.start()
+        try:
+            queue = manager.get_job_queue()
+            queue.put_jobs([(index, jobs[index]) for index in order])
+            logger.warning("Serving {} job(s) at {}:{}.".format(len(order), *self.address))
+
+            remaining = len(order)
+            while remaining > 0:
+                for index, report in queue.get_results():
+                    remaining -= 1
+                    yield index, report
+                for index, worker in queue.requeue_lost(self.heartbeat_timeout, self.max_attempts):
+                    logger.warning("Job ({}, {}) lost by worker {}.".format(
+                        jobs[index]['catchment'], jobs[index]['outlet'], worker))
+                if remaining > 0:
+                    sleep(self.poll_interval)
+        finally:
+            manager.shutdown()
+
+
+def run_worker(address, authkey, kb=None, log_file=None, heartbeat_interval=10.0, poll_interval=1.0,
+               connect_timeout=60.0, cache_dir=None):
+    """
+    This function connects to a Coordinator and runs the jobs it serves, one at a time, until all the jobs of the
+    batch session are completed (or the coordinator stops). Several workers can be started on the same host.
+
+    :param address: host name (or IP address) and port number of the coordinator
+    :type address: tuple(str, int)
+    :param authkey: secret shared by the coordinator and the workers to authenticate the connections
+    :type authkey: str
+    :param kb: KnowledgeBase containing the models used by the jobs (default KnowledgeBase if None)
+    :type kb: KnowledgeBase
+    :param log_file: path of the log file where to report the exceptions of the jobs (no log file if None)
+    :type log_file: str
+    :param heartbeat_interval: time (in seconds) between two heartbeats sent while a job is running
+    :type heartbeat_interval: float
+    :param poll_interval: time (in seconds) to wait before asking again for a job when none is pending
+    :type poll_interval: float
+    :param connect_timeout: time (in seconds) during which to try to connect to the coordinator (e.g. if the worker
+    is started before the coordinator)
+    :type connect_timeout: float
+    :param cache_dir: path of the folder where to store and to reuse the outputs of the jobs (no cache if None)
+    :type cache_dir: str
+    :return: number of jobs run by the worker
+    :rtype: int
+    """
+    logger = logging.getLogger('TORRENTpy.dt')
+
+    kb = kb if kb else KnowledgeBase()
+    authkey = authkey.encode('utf-8') if not isinstance(authkey, bytes) else authkey
+    worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+
+    manager = JobManager(address=tuple(address), authkey=authkey)
+    start = time()
+    while True:
+        try:
+            manager.connect()
+            break
+        except (IOError, OSError):
+            if time() - start > connect_timeout:
+                logger.error("Coordinator at {}:{} could not be reached.".format(*address))
+                raise Exception("Coordinator at {}:{} could not be reached.".format(*address))
+            sleep(poll_interval)
+    queue = manager.get_job_queue()
+
+    nb_jobs = 0
+    try:
+        while not queue.is_finished():
+            my_job = queue.get_job(worker)
+            if my_job is None:
+                sleep(poll_interval)
+                continue
+            index, args = my_job
+            # send heartbeats from another thread while the job is running (proxies use one connection per thread)
+            stop = Event()
+            heartbeats = Thread(target=_send_heartbeats, args=(queue, worker, index, heartbeat_interval, stop))
+            heartbeats.daemon = True
+            heartbeats.start()
+            try:
+                report = run_job(kb, args, log_file, cache_dir=cache_dir)
+            finally:
+                stop.set()
+                heartbeats.join()
+            queue.put_result(worker, index, report)
+            nb_jobs += 1
+    except (EOFError, IOError, OSError):  # the coordinator stopped (i.e. all the jobs are completed)
+        pass
+
+    return nb_jobs
+
+
+def _send_heartbeats(queue, worker, index, interval, stop):
+    try:
+        while not stop.wait(interval):
+            queue.heartbeat(worker, index)
+    except (EOFError, IOError, OSError):
+        pass
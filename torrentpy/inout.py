@@ -19,18 +19,37 @@
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
 from builtins import range
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from logging import getLogger
 import sys
 import io
+import os
 import csv
+import json
+import struct
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
 import numpy as np
 try:
     from netCDF4 import Dataset
 except ImportError:
     Dataset = None
 
-from .timeframe import check_interval_in_list
+from .timeframe import check_interval_in_list, check_interval_in_array, get_microseconds, EPOCH
+
+# time series of input files parsed once and shared by several simulations (e.g. in a Batch session)
+# { key = absolute path of the input file:
+#   value = (numpy.ndarray(microseconds since EPOCH), dict(key = field: value = numpy.ndarray)) }
+shared_timeseries = dict()
+
+# rows of the CSV files describing the catchments (network, waterbodies, descriptors, parameters, constants) kept in
+# memory to be reused by the following simulations of the same process, the least recently used being discarded first
+# { key = (absolute path, modification time, size): value = (list(field), list(dict(key = field: value = str))) }
+csv_rows_cache = OrderedDict()
+csv_rows_cache_size = 32
 
 
 def open_csv_rb(my_file):
@@ -40,6 +59,40 @@ def open_csv_rb(my_file):
         return io.open(my_file, 'r', encoding='utf8')
 
 
+def read_csv_rows(csv_file):
+    """
+    This function reads all the rows of a CSV file, or returns them from the cache if the file has already been read
+    and has not been modified since. The rows returned must not be modified.
+
+    :param csv_file: path of the CSV file
+    :type csv_file: str
+    :return: list of the field names (a copy), and list of the rows as dictionaries { key = field: value = str }
+    :rtype: tuple(list(), list())
+    """
+    try:
+        my_stat = os.stat(csv_file)
+        my_key = (os.path.abspath(csv_file), my_stat.st_mtime, my_stat.st_size)
+    except OSError:  # let the opening of the file raise the IOError
+        my_key = None
+
+    if my_key in csv_rows_cache:
+        csv_rows_cache[my_key] = csv_rows_cache.pop(my_key)  # now the most recently used
+        my_fields, my_rows = csv_rows_cache[my_key]
+        return my_fields[:], my_rows
+
+    with open_csv_rb(csv_file) as my_file:
+        my_reader = csv.DictReader(my_file)
+        my_rows = list(my_reader)
+        my_fields = my_reader.fieldnames[:] if my_reader.fieldnames else list()
+
+    if csv_rows_cache_size > 0:
+        csv_rows_cache[my_key] = (my_fields, my_rows)
+        while len(csv_rows_cache) > csv_rows_cache_size:
+            csv_rows_cache.popitem(last=False)
+
+    return my_fields[:], my_rows
+
+
 def open_csv_wb(my_file):
     if sys.version_info[0] < 3:
         return io.open(my_file, 'wb')
@@ -56,43 +109,78 @@ def open_csv_ab(my_file):
 
 def read_csv_timeseries_with_data_checks(csv_file, tf, data_check=True):
     logger = getLogger('TORRENTpy.io')
-    try:
-        with open_csv_rb(csv_file) as my_file:
-            my_nd_variables = dict()
-            my_list_dt = list()
-            my_reader = csv.DictReader(my_file)
-            fields = my_reader.fieldnames[:]
-            try:
-                fields.remove('DateTime')
-            except KeyError:
-                logger.error("Field {} does not exist in {}.".format('DateTime', csv_file))
-                raise Exception("Field {} does not exist in {}.".format('DateTime', csv_file))
-
-            for field in fields:
-                my_nd_variables[field] = dict()
+    my_shared = shared_timeseries.get(os.path.abspath(csv_file))
+    if my_shared is not None:  # the file was already parsed, index the shared arrays instead of copying them
+        my_datetimes, my_arrays = my_shared
+        my_nd_variables = {field: SharedTimeSeries(my_datetimes, my_arrays[field]) for field in my_arrays}
+    else:
+        try:
+            with open_csv_rb(csv_file) as my_file:
+                my_nd_variables = dict()
+                my_list_dt = list()
+                my_reader = csv.DictReader(my_file)
+                fields = my_reader.fieldnames[:]
+                try:
+                    fields.remove('DateTime')
+                except KeyError:
+                    logger.error("Field {} does not exist in {}.".format('DateTime', csv_file))
+                    raise Exception("Field {} does not exist in {}.".format('DateTime', csv_file))
 
-            for row in my_reader:
-                my_dt = datetime.strptime(row['DateTime'], '%Y-%m-%d %H:%M:%S')
                 for field in fields:
-                    my_nd_variables[field][my_dt] = float(row[field])
-                my_list_dt.append(my_dt)
+                    my_nd_variables[field] = dict()
 
-            if data_check:
-                start_data, end_data, interval = check_interval_in_list(my_list_dt, csv_file)
-                if not start_data <= tf.needed_data_series[0]:
-                    logger.error("Data Start in {} is not sufficient for required TimeFrame.".format(csv_file))
-                    raise Exception("Data Start in {} is not sufficient for required TimeFrame.".format(csv_file))
-                if not tf.needed_data_series[-1] <= end_data:
-                    logger.error("Data End in {} is not sufficient for required TimeFrame.".format(csv_file))
-                    raise Exception("Data End in {} is not sufficient for required TimeFrame.".format(csv_file))
-                if not timedelta(minutes=tf.data_gap) == interval:
-                    logger.error("Data Gap in {} does not comply with required TimeFrame.".format(csv_file))
-                    raise Exception("Data Gap in {} does not comply with required TimeFrame.".format(csv_file))
+                for row in my_reader:
+                    my_dt = datetime.strptime(row['DateTime'], '%Y-%m-%d %H:%M:%S')
+                    for field in fields:
+                        my_nd_variables[field][my_dt] = float(row[field])
+                    my_list_dt.append(my_dt)
 
-        return my_nd_variables
+        except IOError:
+            raise Exception("File {} could not be found.".format(csv_file))
 
-    except IOError:
-        raise Exception("File {} could not be found.".format(csv_file))
+    if data_check:
+        if my_shared is not None:
+            start_data, end_data, interval = check_interval_in_array(my_shared[0], csv_file)
+        else:
+            start_data, end_data, interval = check_interval_in_list(my_list_dt, csv_file)
+        if not start_data <= tf.needed_data_range[0]:
+            logger.error("Data Start in {} is not sufficient for required TimeFrame.".format(csv_file))
+            raise Exception("Data Start in {} is not sufficient for required TimeFrame.".format(csv_file))
+        if not tf.needed_data_range[-1] <= end_data:
+            logger.error("Data End in {} is not sufficient for required TimeFrame.".format(csv_file))
+            raise Exception("Data End in {} is not sufficient for required TimeFrame.".format(csv_file))
+        if not timedelta(minutes=tf.data_gap) == interval:
+            logger.error("Data Gap in {} does not comply with required TimeFrame.".format(csv_file))
+            raise Exception("Data Gap in {} does not comply with required TimeFrame.".format(csv_file))
+
+    return my_nd_variables
+
+
+class SharedTimeSeries(Mapping):
+    """
+    This class gives a read-only view of the time series of one field of an input file kept in shared memory. It
+    behaves like the dictionary { key = datetime: value = float } built when parsing the file, but the values are
+    read from the shared arrays when they are used, and the datetimes are only converted when iterated over.
+    """
+    def __init__(self, datetimes, values):
+        # datetimes of the time series (sorted, in microseconds since EPOCH)
+        self.datetimes = datetimes  # numpy.ndarray(int64)
+        # values of the field for each datetime
+        self.values = values  # numpy.ndarray(float64)
+
+    def __getitem__(self, dt):
+        my_us = get_microseconds(dt - EPOCH)
+        my_position = int(np.searchsorted(self.datetimes, my_us))
+        if (my_position == len(self.datetimes)) or (self.datetimes[my_position] != my_us):
+            raise KeyError(dt)
+        return float(self.values[my_position])
+
+    def __iter__(self):
+        for us in self.datetimes.tolist():
+            yield EPOCH + timedelta(microseconds=us)
+
+    def __len__(self):
+        return len(self.datetimes)
 
 
 def read_netcdf_timeseries_with_data_checks(netcdf_file, tf, data_check=True):
@@ -135,10 +223,10 @@ def read_netcdf_timeseries_with_data_checks(netcdf_file, tf, data_check=True):
 
             if data_check:
                 start_data, end_data, interval = check_interval_in_list(list_dt, netcdf_file)
-                if not start_data <= tf.needed_data_series[0]:
+                if not start_data <= tf.needed_data_range[0]:
                     logger.error("Data Start in {} is not sufficient for required TimeFrame.".format(netcdf_file))
                     raise Exception("Data Start in {} is not sufficient for required TimeFrame.".format(netcdf_file))
-                if not tf.needed_data_series[-1] <= end_data:
+                if not tf.needed_data_range[-1] <= end_data:
                     logger.error("Data End in {} is not sufficient for required TimeFrame.".format(netcdf_file))
                     raise Exception("Data End in {} is not sufficient for required TimeFrame.".format(netcdf_file))
                 if not timedelta(minutes=tf.data_gap) == interval:
@@ -151,11 +239,65 @@ def read_netcdf_timeseries_with_data_checks(netcdf_file, tf, data_check=True):
         raise Exception("File {} could not be found.".format(netcdf_file))
 
 
-def create_simulation_files(network, out_file_format):
+def read_csv_flows(csv_file, field='flow'):
+    """
+    This function reads the series of flows observed at a gauge in a CSV file with the fields 'DateTime' and 'flow'
+    (e.g. the .flow files of the catchments). The datetimes can be written as 'YYYY-MM-DD HH:MM:SS' or as
+    'DD/MM/YYYY HH:MM' (with or without seconds). The missing or negative flows are given as NaN.
+
+    :param csv_file: path of the CSV file
+    :type csv_file: str
+    :param field: name of the field of the flows
+    :type field: str
+    :return: list of datetime, and array of the flows
+    :rtype: tuple(list(), numpy.ndarray)
+    """
+    logger = getLogger('TORRENTpy.io')
+
+    my_list_dt = list()
+    my_flows = list()
+    my_format = None
+    try:
+        with open_csv_rb(csv_file) as my_file:
+            my_reader = csv.DictReader(my_file)
+            for name in ['DateTime', field]:
+                if name not in my_reader.fieldnames:
+                    logger.error("Field {} does not exist in {}.".format(name, csv_file))
+                    raise Exception("Field {} does not exist in {}.".format(name, csv_file))
+            for row in my_reader:
+                if my_format is None:
+                    for candidate in ['%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M']:
+                        try:
+                            datetime.strptime(row['DateTime'], candidate)
+                            my_format = candidate
+                            break
+                        except ValueError:
+                            pass
+                    else:
+                        logger.error("DateTime {} in {} is not in a supported format.".format(
+                            row['DateTime'], csv_file))
+                        raise Exception("DateTime {} in {} is not in a supported format.".format(
+                            row['DateTime'], csv_file))
+                my_list_dt.append(datetime.strptime(row['DateTime'], my_format))
+                try:
+                    my_flow = float(row[field])
+                except ValueError:
+                    my_flow = float('nan')
+                my_flows.append(my_flow if my_flow >= 0.0 else float('nan'))
+    except IOError:
+        logger.error("File {} could not be found.".format(csv_file))
+        raise Exception("File {} could not be found.".format(csv_file))
+
+    return my_list_dt, np.array(my_flows, dtype=np.float64)
+
+
+def create_simulation_files(network, timeframe, out_file_format,
+                            dtype='float64', complevel=1, shuffle=True, chunksize=None):
     logger = getLogger('TORRENTpy.io')
     if out_file_format == 'netcdf':
         if Dataset:
-            create_simulation_files_netcdf(network)
+            create_simulation_files_netcdf(network, dtype=dtype, complevel=complevel,
+                                           shuffle=shuffle, chunksize=chunksize)
         else:
             logger.error("The use of 'netcdf' as the output file format requires the package 'netCDF4', "
                          "please install it and retry, or choose another file format.")
@@ -163,11 +305,31 @@ def create_simulation_files(network, out_file_format):
                             "please install it and retry, or choose another file format.")
     elif out_file_format == 'csv':
         create_simulation_files_csv(network)
+    elif out_file_format == 'binary':
+        create_simulation_files_binary(network, timeframe, dtype=dtype)
     else:
         logger.error("The output format type \'{}\' cannot be read by TORRENTpy, "
-                     "choose from: \'csv\', \'netcdf\'.".format(out_file_format))
+                     "choose from: \'csv\', \'netcdf\', \'binary\'.".format(out_file_format))
         raise Exception("The output format type \'{}\' cannot be read by TORRENTpy, "
-                        "choose from: \'csv\', \'netcdf\'.".format(out_file_format))
+                        "choose from: \'csv\', \'netcdf\', \'binary\'.".format(out_file_format))
+
+
+def check_output_settings(dtype, complevel, chunksize, digits=7):
+    logger = getLogger('TORRENTpy.io')
+    if dtype not in ['float32', 'float64']:
+        logger.error("The output data type \'{}\' is not supported by TORRENTpy, "
+                     "choose from: \'float32\', \'float64\'.".format(dtype))
+        raise Exception("The output data type \'{}\' is not supported by TORRENTpy, "
+                        "choose from: \'float32\', \'float64\'.".format(dtype))
+    if complevel not in range(0, 10):
+        logger.error("The NetCDF compression level must be an integer between 0 and 9.")
+        raise Exception("The NetCDF compression level must be an integer between 0 and 9.")
+    if chunksize is not None and not chunksize > 0:
+        logger.error("The NetCDF chunk size must be a positive integer.")
+        raise Exception("The NetCDF chunk size must be a positive integer.")
+    if digits not in range(1, 18):
+        logger.error("The number of significant digits for CSV files must be an integer between 1 and 17.")
+        raise Exception("The number of significant digits for CSV files must be an integer between 1 and 17.")
 
 
 def create_simulation_files_csv(network):
@@ -210,16 +372,30 @@ def create_simulation_files_csv(network):
             my_writer.writerow(['DateTime'] + network.variables)
 
 
-def create_simulation_files_netcdf(network):
+def create_simulation_files_netcdf(network, dtype='float64', complevel=1, shuffle=True, chunksize=None):
     """
     This function creates a NetCDF4 file for each node and for each link and it adds the relevant headers for the
-    inputs, the states, and the outputs.
+    inputs, the states, and the outputs. If the Network simulates an ensemble of parameter sets, the variables have
+    a second dimension 'Member' with one value per member of the ensemble.
 
     :param network: Network object for the simulated catchment
     :type network: Network
+    :param dtype: data type used to store the variables ('float32' or 'float64')
+    :type dtype: str
+    :param complevel: level of the zlib compression (from 0 for no compression to 9 for maximum compression)
+    :type complevel: int
+    :param shuffle: whether to apply the HDF5 shuffle filter before compression
+    :type shuffle: bool
+    :param chunksize: number of time steps in each chunk (left to the NetCDF library if None)
+    :type chunksize: int
     """
     logger = getLogger('TORRENTpy.io')
     logger.info("Creating files for results.")
+    # dimensions of the variables, and their chunks
+    my_dimensions = ('DateTime',) if not network.ensemble_size else ('DateTime', 'Member')
+    my_chunks = None
+    if chunksize:
+        my_chunks = (chunksize,) if not network.ensemble_size else (chunksize, network.ensemble_size)
     # Create the NetCDF4 files with headers for the nodes (separating inputs, states, and outputs)
     for link in network.links:
         my_inputs = list()
@@ -233,51 +409,134 @@ def create_simulation_files_netcdf(network):
 
         with Dataset('{}{}_{}.inputs.nc'.format(network.out_fld, network.catchment, link.name), 'w') as my_file:
             my_file.createDimension('DateTime', None)
+            if network.ensemble_size:
+                my_file.createDimension('Member', network.ensemble_size)
             t = my_file.createVariable("DateTime", np.float64, ('DateTime',), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_input in my_inputs:
-                my_file.createVariable(my_input, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_input, dtype, my_dimensions, zlib=complevel > 0, complevel=complevel,
+                                       shuffle=shuffle, chunksizes=my_chunks)
 
         with Dataset('{}{}_{}.states.nc'.format(network.out_fld, network.catchment, link.name), 'w') as my_file:
             my_file.createDimension('DateTime', None)
+            if network.ensemble_size:
+                my_file.createDimension('Member', network.ensemble_size)
             t = my_file.createVariable('DateTime', np.float64, ('DateTime',), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_state in my_states:
-                my_file.createVariable(my_state, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_state, dtype, my_dimensions, zlib=complevel > 0, complevel=complevel,
+                                       shuffle=shuffle, chunksizes=my_chunks)
 
         with Dataset('{}{}_{}.outputs.nc'.format(network.out_fld, network.catchment, link.name), 'w') as my_file:
             my_file.createDimension('DateTime', None)
+            if network.ensemble_size:
+                my_file.createDimension('Member', network.ensemble_size)
             t = my_file.createVariable('DateTime', np.float64, ('DateTime',), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_output in my_outputs:
-                my_file.createVariable(my_output, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_output, dtype, my_dimensions, zlib=complevel > 0, complevel=complevel,
+                                       shuffle=shuffle, chunksizes=my_chunks)
 
     # Create the NetCDF4 files with headers for the nodes
     for node in network.nodes:
         with Dataset('{}{}_{}.node.nc'.format(network.out_fld, network.catchment, node.name), 'w') as my_file:
             my_file.createDimension('DateTime', None)
+            if network.ensemble_size:
+                my_file.createDimension('Member', network.ensemble_size)
             t = my_file.createVariable('DateTime', np.float64, ("DateTime",), zlib=True)
             t.units = 'seconds since 1970-01-01 00:00:00.0'
             for my_variable in network.variables:
-                my_file.createVariable(my_variable, np.float64, ('DateTime',), zlib=True, complevel=1)
+                my_file.createVariable(my_variable, dtype, my_dimensions, zlib=complevel > 0, complevel=complevel,
+                                       shuffle=shuffle, chunksizes=my_chunks)
 
 
-def update_simulation_files(network, timeframe, timeslice, database, out_file_format, method='raw'):
+def create_simulation_files_binary(network, timeframe, dtype='float64'):
+    """
+    This function creates a binary file for each node and for each link and it writes the header describing the
+    inputs, the states, and the outputs that will be appended to it.
+
+    :param network: Network object for the simulated catchment
+    :type network: Network
+    :param timeframe: TimeFrame object for the simulation period
+    :type timeframe: TimeFrame
+    :param dtype: data type used to store the variables ('float32' or 'float64')
+    :type dtype: str
+    """
+    logger = getLogger('TORRENTpy.io')
+    logger.info("Creating files for results.")
+    # Create the binary files with headers for the links (separating inputs, states, and outputs)
+    for link in network.links:
+        my_inputs = list()
+        my_states = list()
+        my_outputs = list()
+
+        for model in link.all_models:
+            my_inputs += model.inputs_names
+            my_states += model.states_names
+            my_outputs += model.outputs_names
+
+        write_binary_header('{}{}_{}.inputs.bin'.format(network.out_fld, network.catchment, link.name),
+                            my_inputs, timeframe, dtype)
+        write_binary_header('{}{}_{}.states.bin'.format(network.out_fld, network.catchment, link.name),
+                            my_states, timeframe, dtype)
+        write_binary_header('{}{}_{}.outputs.bin'.format(network.out_fld, network.catchment, link.name),
+                            my_outputs, timeframe, dtype)
+
+    # Create the binary files with headers for the nodes
+    for node in network.nodes:
+        write_binary_header('{}{}_{}.node.bin'.format(network.out_fld, network.catchment, node.name),
+                            network.variables, timeframe, dtype)
+
+
+def write_binary_header(binary_file, variables, timeframe, dtype='float64'):
+    """
+    This function creates a binary file starting with its header. The header is made of its own length stored as a
+    little-endian unsigned integer on four bytes, followed by a JSON object giving the names of the variables (i.e.
+    the columns of the array), the first datetime reported, the time gap between two rows in minutes, and the type
+    of the values. The JSON object is padded with spaces so that the values start on a multiple of eight bytes.
+
+    :param binary_file: path of the binary file to create
+    :type binary_file: str
+    :param variables: list of the names of the variables stored in the file
+    :type variables: list
+    :param timeframe: TimeFrame object for the simulation period
+    :type timeframe: TimeFrame
+    :param dtype: data type used to store the variables ('float32' or 'float64')
+    :type dtype: str
+    """
+    my_header = json.dumps({
+        'variables': variables,
+        'start': timeframe.save_start.strftime('%Y-%m-%d %H:%M:%S'),
+        'gap': timeframe.save_gap,
+        'dtype': np.dtype(dtype).newbyteorder('<').str
+    }).encode('utf8')
+    my_header += b' ' * (-(len(my_header) + 4) % 8)
+
+    with io.open(binary_file, 'wb') as my_file:
+        my_file.write(struct.pack('<I', len(my_header)))
+        my_file.write(my_header)
+
+
+def update_simulation_files(network, timeframe, timeslice, database, out_file_format, method='raw',
+                            dtype='float64', digits=7):
     logger = getLogger('TORRENTpy.io')
     if out_file_format == 'netcdf':  # it was already checked if netCDF4 was installed when creating the files
         update_simulation_files_netcdf(network, timeframe, timeslice,
                                        database, method=method)
     elif out_file_format == 'csv':
         update_simulation_files_csv(network, timeframe, timeslice,
-                                    database, method=method)
+                                    database, method=method, digits=digits)
+    elif out_file_format == 'binary':
+        update_simulation_files_binary(network, timeframe, timeslice,
+                                       database, method=method, dtype=dtype)
     else:
         logger.error("The output format type \'{}\' cannot be read by TORRENTpy, "
-                     "choose from: \'csv\', \'netcdf\'.".format(out_file_format))
+                     "choose from: \'csv\', \'netcdf\', \'binary\'.".format(out_file_format))
         raise Exception("The output format type \'{}\' cannot be read by TORRENTpy, "
-                        "choose from: \'csv\', \'netcdf\'.".format(out_file_format))
+                        "choose from: \'csv\', \'netcdf\', \'binary\'.".format(out_file_format))
 
 
-def update_simulation_files_csv(nw, tf, timeslice, db, method='raw'):
+def update_simulation_files_csv(nw, tf, timeslice, db, method='raw', digits=7):
     """
     This function saves the simulation variables into the CSV files for the nodes and the links.
     It features two arguments:
@@ -309,131 +568,75 @@ def update_simulation_files_csv(nw, tf, timeslice, db, method='raw'):
     :param method: choice on the technique to process simulation variables when reporting time gap > simu time gap :
      'summary' = sums for inputs and averages for the rest / 'raw' = last values only for all
     :type method: str()
+    :param digits: number of significant digits used to write the values in scientific notation
+    :type digits: int
     :return: NOTHING, only updates the files in the output folder
     """
     logger = getLogger('TORRENTpy.io')
 
     logger.info("> Updating results in files.")
 
-    # Determine number of simulation steps to consider for reporting
-    simu_steps_per_save_step = tf.save_gap // tf.simu_gap
-    
     if method == 'summary':
-        # Save the Nested Dicts for the links (separating inputs, states, and outputs)
-        for link in nw.links:
-            my_inputs = list()
-            my_states = list()
-            my_outputs = list()
-
-            for model in link.all_models:
-                my_inputs += model.inputs_names
-                my_states += model.states_names
-                my_outputs += model.outputs_names
-
-            with open_csv_ab('{}{}_{}.inputs'.format(nw.out_fld, nw.catchment, link.name)) as my_file:
-                # for inputs, 'raw' and 'summary report the same values because they are cumulative values
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_list = list()
-                    for my_input in my_inputs:
-                        my_values = list()
-                        for my_sub_step in range(0, -simu_steps_per_save_step, -1):
-                            my_values.append(
-                                db.simulation[link.name][
-                                    step + timedelta(minutes=my_sub_step * tf.simu_gap)][my_input])
-                        my_list.append('%e' % sum(my_values))
-                    my_writer.writerow([step] + my_list)
-
-            with open_csv_ab('{}{}_{}.states'.format(nw.out_fld, nw.catchment, link.name)) as my_file:
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_list = list()
-                    for my_state in my_states:
-                        my_values = list()
-                        for my_sub_step in range(0, -simu_steps_per_save_step, -1):
-                            my_values.append(
-                                db.simulation[link.name][
-                                    step + timedelta(minutes=my_sub_step * tf.simu_gap)][my_state])
-                        my_list.append('%e' % (sum(my_values) / len(my_values)))
-                    my_writer.writerow([step] + my_list)
-
-            with open_csv_ab('{}{}_{}.outputs'.format(nw.out_fld, nw.catchment, link.name)) as my_file:
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_list = list()
-                    for my_output in my_outputs:
-                        my_values = list()
-                        for my_sub_step in range(0, -simu_steps_per_save_step, -1):
-                            my_values.append(
-                                db.simulation[link.name][
-                                    step + timedelta(minutes=my_sub_step * tf.simu_gap)][my_output])
-                        my_list.append('%e' % (sum(my_values) / len(my_values)))
-                    my_writer.writerow([step] + my_list)
-
-        # Save the Nested Dicts for the nodes
-        for node in nw.nodes:
-            with open_csv_ab('{}{}_{}.node'.format(nw.out_fld, nw.catchment, node.name)) as my_file:
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_list = list()
-                    for my_variable in nw.variables:
-                        my_values = list()
-                        for my_sub_step in range(0, -simu_steps_per_save_step, -1):
-                            my_values.append(
-                                db.simulation[node.name][
-                                    step + timedelta(minutes=my_sub_step * tf.simu_gap)][my_variable])
-                        my_list.append('%e' % (sum(my_values) / len(my_values)))
-                    my_writer.writerow([step] + my_list)
-
+        operation = 'mean'
     elif method == 'raw':
-        # Save the Nested Dicts for the links (separating inputs, states, and outputs)
-        for link in nw.links:
-            my_inputs = list()
-            my_states = list()
-            my_outputs = list()
-
-            for model in link.all_models:
-                my_inputs += model.inputs_names
-                my_states += model.states_names
-                my_outputs += model.outputs_names
-
-            with open_csv_ab('{}{}_{}.inputs'.format(nw.out_fld, nw.catchment, link.name)) as my_file:
-                # for inputs, 'raw' and 'summary report the same values because they are cumulative values
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_list = list()
-                    for my_input in my_inputs:
-                        my_values = list()
-                        for my_sub_step in range(0, -simu_steps_per_save_step, -1):
-                            my_values.append(
-                                db.simulation[link.name][
-                                    step + timedelta(minutes=my_sub_step * tf.simu_gap)][my_input])
-                        my_list.append('%e' % sum(my_values))
-                    my_writer.writerow([step] + my_list)
+        operation = 'last'
+    else:
+        logger.error("Unknown method for updating simulations files.")
+        raise Exception("Unknown method for updating simulations files.")
 
-            with open_csv_ab('{}{}_{}.states'.format(nw.out_fld, nw.catchment, link.name)) as my_file:
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_writer.writerow([step] + ['%e' % db.simulation[link.name][step][my_state]
-                                                 for my_state in my_states])
+    # Save the Nested Dicts for the links (separating inputs, states, and outputs)
+    for link in nw.links:
+        my_inputs = list()
+        my_states = list()
+        my_outputs = list()
 
-            with open_csv_ab('{}{}_{}.outputs'.format(nw.out_fld, nw.catchment, link.name)) as my_file:
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_writer.writerow([step] + ['%e' % db.simulation[link.name][step][my_output]
-                                                 for my_output in my_outputs])
+        for model in link.all_models:
+            my_inputs += model.inputs_names
+            my_states += model.states_names
+            my_outputs += model.outputs_names
 
-        # Save the Nested Dicts for the nodes
-        for node in nw.nodes:
-            with open_csv_ab('{}{}_{}.node'.format(nw.out_fld, nw.catchment, node.name)) as my_file:
-                my_writer = csv.writer(my_file, delimiter=',')
-                for step in timeslice[1:]:
-                    my_writer.writerow([step] + ['%e' % db.simulation[node.name][step][my_variable]
-                                                 for my_variable in nw.variables])
+        # for inputs, 'raw' and 'summary report the same values because they are cumulative values
+        append_csv_block('{}{}_{}.inputs'.format(nw.out_fld, nw.catchment, link.name), timeslice,
+                         get_simulation_array(db.simulation[link.name], tf, timeslice, my_inputs, 'sum'),
+                         digits)
+        append_csv_block('{}{}_{}.states'.format(nw.out_fld, nw.catchment, link.name), timeslice,
+                         get_simulation_array(db.simulation[link.name], tf, timeslice, my_states, operation),
+                         digits)
+        append_csv_block('{}{}_{}.outputs'.format(nw.out_fld, nw.catchment, link.name), timeslice,
+                         get_simulation_array(db.simulation[link.name], tf, timeslice, my_outputs, operation),
+                         digits)
+
+    # Save the Nested Dicts for the nodes
+    for node in nw.nodes:
+        append_csv_block('{}{}_{}.node'.format(nw.out_fld, nw.catchment, node.name), timeslice,
+                         get_simulation_array(db.simulation[node.name], tf, timeslice, nw.variables, operation),
+                         digits)
+
+
+def append_csv_block(csv_file, timeslice, my_array, digits=7):
+    """
+    This function appends the rows for a whole time slice to a CSV file in one go, formatting all the values with a
+    single string interpolation. The rows are identical to the ones written by csv.writer with the values formatted
+    in scientific notation (i.e. datetime as str, comma-separated, and CRLF line terminator).
 
-    else:
-        logger.error("Unknown method for updating simulations files.")
-        raise Exception("Unknown method for updating simulations files.")
+    :param csv_file: path of the CSV file to append to
+    :type csv_file: str
+    :param timeslice: list of datetime that need to be reported on (the first one is ignored)
+    :type timeslice: list()
+    :param my_array: array of shape (number of reporting steps, number of variables)
+    :type my_array: numpy.ndarray
+    :param digits: number of significant digits used to write the values in scientific notation
+    :type digits: int
+    """
+    nb_rows, nb_columns = my_array.shape
+    # one format for a whole row, repeated for the whole block
+    my_row_format = ','.join(['%s'] + ['%.{}e'.format(digits - 1)] * nb_columns) + '\r\n'
+    # datetimes in the first column, values (as Python floats) in the others
+    my_block = np.empty((nb_rows, nb_columns + 1), dtype=object)
+    my_block[:, 0] = [str(step) for step in timeslice[1:]]
+    my_block[:, 1:] = my_array
+    with open_csv_ab(csv_file) as my_file:
+        my_file.write((my_row_format * nb_rows) % tuple(my_block.ravel().tolist()))
 
 
 def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
@@ -508,7 +711,8 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_input in my_inputs:
-                    my_file.variables[my_input][start_idx:end_idx] = my_values[my_input]
+                    my_file.variables[my_input][start_idx:end_idx] = \
+                        stack_values(my_values[my_input], nw.ensemble_size)
 
             with Dataset('{}{}_{}.states.nc'.format(nw.out_fld, nw.catchment, link.name), 'a') as my_file:
                 my_values = {my_state: list() for my_state in my_states}
@@ -524,7 +728,8 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_state in my_states:
-                    my_file.variables[my_state][start_idx:end_idx] = my_values[my_state]
+                    my_file.variables[my_state][start_idx:end_idx] = \
+                        stack_values(my_values[my_state], nw.ensemble_size)
 
             with Dataset('{}{}_{}.outputs.nc'.format(nw.out_fld, nw.catchment, link.name), 'a') as my_file:
                 my_values = {my_output: list() for my_output in my_outputs}
@@ -540,7 +745,8 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_output in my_outputs:
-                    my_file.variables[my_output][start_idx:end_idx] = my_values[my_output]
+                    my_file.variables[my_output][start_idx:end_idx] = \
+                        stack_values(my_values[my_output], nw.ensemble_size)
 
         # Save the Nested Dicts for the nodes
         for node in nw.nodes:
@@ -558,7 +764,8 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_variable in nw.variables:
-                    my_file.variables[my_variable][start_idx:end_idx] = my_values[my_variable]
+                    my_file.variables[my_variable][start_idx:end_idx] = \
+                        stack_values(my_values[my_variable], nw.ensemble_size)
 
     elif method == 'raw':
         # Save the Nested Dicts for the links (separating inputs, states, and outputs)
@@ -587,7 +794,8 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_input in my_inputs:
-                    my_file.variables[my_input][start_idx:end_idx] = my_values[my_input]
+                    my_file.variables[my_input][start_idx:end_idx] = \
+                        stack_values(my_values[my_input], nw.ensemble_size)
 
             with Dataset('{}{}_{}.states.nc'.format(nw.out_fld, nw.catchment, link.name), 'a') as my_file:
                 my_values = {my_state: list() for my_state in my_states}
@@ -598,7 +806,8 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_state in my_states:
-                    my_file.variables[my_state][start_idx:end_idx] = my_values[my_state]
+                    my_file.variables[my_state][start_idx:end_idx] = \
+                        stack_values(my_values[my_state], nw.ensemble_size)
 
             with Dataset('{}{}_{}.outputs.nc'.format(nw.out_fld, nw.catchment, link.name), 'a') as my_file:
                 my_values = {my_output: list() for my_output in my_outputs}
@@ -609,7 +818,8 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_output in my_outputs:
-                    my_file.variables[my_output][start_idx:end_idx] = my_values[my_output]
+                    my_file.variables[my_output][start_idx:end_idx] = \
+                        stack_values(my_values[my_output], nw.ensemble_size)
 
         # Save the Nested Dicts for the nodes
         for node in nw.nodes:
@@ -622,8 +832,195 @@ def update_simulation_files_netcdf(nw, tf, timeslice, db, method='raw'):
                     len(my_file.variables['DateTime']), len(my_file.variables['DateTime']) + len(my_stamps)
                 my_file.variables['DateTime'][start_idx:end_idx] = my_stamps
                 for my_variable in nw.variables:
-                    my_file.variables[my_variable][start_idx:end_idx] = my_values[my_variable]
+                    my_file.variables[my_variable][start_idx:end_idx] = \
+                        stack_values(my_values[my_variable], nw.ensemble_size)
+
+    else:
+        logger.error("Unknown method for updating simulations files.")
+        raise Exception("Unknown method for updating simulations files.")
+
+
+def update_simulation_files_binary(nw, tf, timeslice, db, method='raw', dtype='float64'):
+    """
+    This function appends the simulation variables to the binary files for the nodes and the links. The values are
+    appended as raw little-endian floats, one row per reporting step, without any formatting. The "method" argument
+    has the same meaning as for the CSV and NetCDF files.
+
+    :param nw: Network object for the simulated catchment
+    :type nw: Network
+    :param tf: TimeFrame object for the simulation period
+    :type tf: TimeFrame
+    :param timeslice: list of datetime that need to be reported on
+    :type timeslice: list()
+    :param db: dictionary containing the nested dictionaries for the nodes and the links for variables
+        { key = link/node: value = nested_dictionary(index=datetime,column=variable) }
+    :type db: dict()
+    :param method: choice on the technique to process simulation variables when reporting time gap > simu time gap :
+     'summary' = sums for inputs and averages for the rest / 'raw' = last values only for all
+    :type method: str()
+    :param dtype: data type used to store the variables ('float32' or 'float64')
+    :type dtype: str
+    :return: NOTHING, only updates the files in the output folder
+    """
+    logger = getLogger('TORRENTpy.io')
+
+    logger.info("> Updating results in files.")
 
+    if method == 'summary':
+        operation = 'mean'
+    elif method == 'raw':
+        operation = 'last'
     else:
         logger.error("Unknown method for updating simulations files.")
         raise Exception("Unknown method for updating simulations files.")
+
+    # Save the Nested Dicts for the links (separating inputs, states, and outputs)
+    for link in nw.links:
+        my_inputs = list()
+        my_states = list()
+        my_outputs = list()
+
+        for model in link.all_models:
+            my_inputs += model.inputs_names
+            my_states += model.states_names
+            my_outputs += model.outputs_names
+
+        # for inputs, 'raw' and 'summary report the same values because they are cumulative values
+        append_binary_values('{}{}_{}.inputs.bin'.format(nw.out_fld, nw.catchment, link.name),
+                             get_simulation_array(db.simulation[link.name], tf, timeslice, my_inputs, 'sum'),
+                             dtype)
+        append_binary_values('{}{}_{}.states.bin'.format(nw.out_fld, nw.catchment, link.name),
+                             get_simulation_array(db.simulation[link.name], tf, timeslice, my_states, operation),
+                             dtype)
+        append_binary_values('{}{}_{}.outputs.bin'.format(nw.out_fld, nw.catchment, link.name),
+                             get_simulation_array(db.simulation[link.name], tf, timeslice, my_outputs, operation),
+                             dtype)
+
+    # Save the Nested Dicts for the nodes
+    for node in nw.nodes:
+        append_binary_values('{}{}_{}.node.bin'.format(nw.out_fld, nw.catchment, node.name),
+                             get_simulation_array(db.simulation[node.name], tf, timeslice, nw.variables, operation),
+                             dtype)
+
+
+def append_binary_values(binary_file, my_array, dtype='float64'):
+    with io.open(binary_file, 'ab') as my_file:
+        my_file.write(np.ascontiguousarray(my_array, dtype=np.dtype(dtype).newbyteorder('<')).tobytes())
+
+
+def stack_values(values, members=None):
+    """
+    This function turns the values of a variable for several steps into an array with one row per step, and one
+    column per member of the ensemble if the Network simulates an ensemble of parameter sets. In this case, the
+    variables that are the same for all the members (e.g. the meteorological inputs) are stored as floats in the
+    data structures, so they are repeated for each member.
+
+    :param values: list of values (float, or numpy.ndarray with one value per member)
+    :type values: list()
+    :param members: number of members of the ensemble (None if simulating one parameter set)
+    :type members: int
+    :return: array of shape (number of steps,) or (number of steps, number of members)
+    :rtype: numpy.ndarray
+    """
+    if members is None:
+        return np.array(values, dtype=np.float64)
+    else:
+        return np.array([np.broadcast_to(value, (members,)) for value in values], dtype=np.float64)
+
+
+def get_simulation_array(nd_data, tf, timeslice, variables, operation, members=None):
+    """
+    This function gathers the simulation variables of one node or one link into a 2-D array with one row per
+    reporting step of the time slice and one column per variable. The simulation steps included in each reporting
+    gap are either summed up ('sum'), averaged ('mean'), or only the last one is kept ('last'). If the Network
+    simulates an ensemble of parameter sets, the array has a third dimension with one value per member.
+
+    :param nd_data: nested dictionary for the node or the link
+        { key = datetime: value = dictionary(key=variable,value=value) }
+    :type nd_data: dict()
+    :param tf: TimeFrame object for the simulation period
+    :type tf: TimeFrame
+    :param timeslice: list of datetime that need to be reported on
+    :type timeslice: list()
+    :param variables: list of the names of the variables to gather
+    :type variables: list()
+    :param operation: choice on the technique to summarise the simulation steps ('sum', 'mean', or 'last')
+    :type operation: str()
+    :param members: number of members of the ensemble (None if simulating one parameter set)
+    :type members: int
+    :return: array of shape (number of reporting steps, number of variables[, number of members])
+    :rtype: numpy.ndarray
+    """
+    logger = getLogger('TORRENTpy.io')
+
+    if operation == 'last':
+        my_deltas = [timedelta(minutes=0)]
+    elif operation in ['sum', 'mean']:
+        my_deltas = [timedelta(minutes=my_sub_step * tf.simu_gap)
+                     for my_sub_step in range(0, -(tf.save_gap // tf.simu_gap), -1)]
+    else:
+        logger.error("Unknown operation {} to summarise simulation steps.".format(operation))
+        raise Exception("Unknown operation {} to summarise simulation steps.".format(operation))
+
+    my_array = stack_values(
+        [nd_data[step + my_delta][variable]
+         for step in timeslice[1:] for my_delta in my_deltas for variable in variables],
+        members
+    )
+    my_array = my_array.reshape((len(timeslice) - 1, len(my_deltas), len(variables)) + my_array.shape[1:])
+
+    if operation == 'sum':
+        return my_array.sum(axis=1)
+    elif operation == 'mean':
+        return my_array.sum(axis=1) / len(my_deltas)
+    else:
+        return my_array[:, 0]
+
+
+def read_binary_timeseries(binary_file):
+    """
+    This function memory-maps a binary file written by TORRENTpy (i.e. with the 'binary' output format) and
+    returns its content as NumPy arrays, without reading the values into memory until they are used.
+
+    :param binary_file: path of the binary file to read
+    :type binary_file: str
+    :return: dictionary containing the datetimes and a read-only view on the values for each variable
+        { key = 'DateTime': value = numpy.ndarray(dtype=datetime64), key = variable: value = numpy.memmap }
+    :rtype: dict()
+    """
+    logger = getLogger('TORRENTpy.io')
+
+    try:
+        with io.open(binary_file, 'rb') as my_file:
+            header_length = struct.unpack('<I', my_file.read(4))[0]
+            my_header = json.loads(my_file.read(header_length).decode('utf8'))
+    except IOError:
+        raise Exception("File {} could not be found.".format(binary_file))
+
+    my_dtype = np.dtype(str(my_header['dtype']))
+    my_variables = [str(variable) for variable in my_header['variables']]
+    offset = 4 + header_length
+
+    row_size = my_dtype.itemsize * len(my_variables)
+    if row_size > 0:
+        nb_rows, remainder = divmod(os.path.getsize(binary_file) - offset, row_size)
+        if remainder != 0:
+            logger.error("File {} does not contain a whole number of rows.".format(binary_file))
+            raise Exception("File {} does not contain a whole number of rows.".format(binary_file))
+    else:
+        nb_rows = 0
+
+    if nb_rows > 0:
+        my_values = np.memmap(binary_file, dtype=my_dtype, mode='r', offset=offset,
+                              shape=(nb_rows, len(my_variables)))
+    else:
+        my_values = np.zeros((0, len(my_variables)), dtype=my_dtype)
+
+    my_nd_variables = {
+        'DateTime': np.datetime64(datetime.strptime(my_header['start'], '%Y-%m-%d %H:%M:%S'), 'm') +
+        np.arange(nb_rows) * np.timedelta64(int(my_header['gap']), 'm')
+    }
+    for idx, variable in enumerate(my_variables):
+        my_nd_variables[variable] = my_values[:, idx]
+
+    return my_nd_variables
@@ -19,9 +19,8 @@
 # You should have received a copy of the GNU General Public License
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
-from math import exp, log, sin, pi
+from math import exp, log
 from datetime import timedelta
-from calendar import isleap
 import os
 import csv
 
@@ -89,20 +88,22 @@ class INCAc(Model):
         my_dict = dict(dict_for_file)
         dict_for_file["WaterBody"] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ["WaterBody"] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ["WaterBody"] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        # write the inferred parameters in the output folder, unless running without any output folder
+        if output_folder is not None:
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ["WaterBody"] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ["WaterBody"] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -116,17 +117,17 @@ class INCAc(Model):
         self._simulate(link.name, link.descriptors,
                        step, tf.simu_gap,
                        link.models_parameters, self.constants,
-                       db.simulation, db.meteo, db.contamination,
+                       db.simulation, db.meteo, db.contamination, db.calendar,
                        logger)
 
     def _simulate(self, waterbody, dict_desc,
                   datetime_time_step, time_gap,
                   dict_param, dict_const,
-                  dict_data_frame, dict_meteo, dict_loads,
+                  dict_data_frame, dict_meteo, dict_loads, calendar,
                   logger):
 
         inca_in = self._get_in(waterbody, datetime_time_step, time_gap,
-                               dict_data_frame, dict_desc, dict_param, dict_meteo, dict_loads, dict_const)
+                               dict_data_frame, dict_desc, dict_param, dict_meteo, dict_loads, dict_const, calendar)
 
         inca_out = self._run(waterbody, datetime_time_step, logger, *inca_in)
 
@@ -166,7 +167,9 @@ class INCAc(Model):
              c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw,
              lvl_total_start, lvl_total_end,
              c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int,
-             c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw):
+             c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw,
+             # inheritance from calendar
+             c_seasonal_sine):
         """
         This function was written by Thibault Hallouin but is largely inspired by the work of Eva Mockler and
         Michael Bruen, namely for the work published in: Mockler, E., Bruen, M., Desta, M., Misstear, B., Environmental
@@ -312,6 +315,8 @@ class INCAc(Model):
         _____ c_cst_vol_tolerance               minimum volume to consider equal to empty [m3]
         _____ c_cst_flow_thr_mm_for_ero_ove     minimum overland flow required to trigger erosion [mm]
         _____ c_cst_flow_thr_mm_for_ero_dra     minimum drain flow required to trigger erosion [mm]
+        ___ Calendar
+        _____ c_seasonal_sine       sine of the position in the year relative to the start of the growing season [-]
         ___ Outputs * out_ *
         _____ c_out_c_no3_ove       nitrate concentration in overland flow [kg/m3]
         _____ c_out_c_nh4_ove       ammonia concentration in overland flow [kg/m3]
@@ -353,12 +358,6 @@ class INCAc(Model):
 
         sediment_threshold = c_cst_sed_daily_thr * time_factor
 
-        day_of_year = float(datetime_time_step.timetuple().tm_yday)
-        if isleap(datetime_time_step.timetuple().tm_year):
-            days_in_year = 366.0
-        else:
-            days_in_year = 365.0
-
         flow_threshold_for_erosion = {
             'ove': c_cst_flow_thr_mm_for_ero_ove,  # [mm]
             'dra': c_cst_flow_thr_mm_for_ero_dra  # [mm]
@@ -669,7 +668,7 @@ class INCAc(Model):
             s1 = 1.0
         elif s1 < 0.0:
             s1 = 0.0
-        s2 = 0.66 + 0.34 * sin(2.0 * pi * (day_of_year - c_cst_day_grow) / days_in_year)  # seasonal plant growth
+        s2 = 0.66 + 0.34 * c_seasonal_sine  # seasonal plant growth
         c3_no3 = c_cst_soil_c3n * (1.047 ** (c_in_temp - 20.0))
         pu_no3 = c3_no3 * s1 * s2  # plant uptake [-/day]
         c1 = c_cst_soil_c1n * (1.047 ** (c_in_temp - 20.0))
@@ -863,7 +862,7 @@ class INCAc(Model):
 
     @staticmethod
     def _get_in(waterbody, datetime_time_step, time_gap_min,
-                dict_data_frame, dict_desc, dict_param, dict_meteo, dict_loads, dict_const):
+                dict_data_frame, dict_desc, dict_param, dict_meteo, dict_loads, dict_const, calendar):
         """
         This function is the interface between the data models of the simulator and the model.
         It provides the inputs, parameters, processes, and states to the model.
@@ -1038,6 +1037,9 @@ class INCAc(Model):
         c_cst_flow_thr_mm_for_ero_ove = dict_const['c_cst_flow_thr_mm_for_ero_ove']
         c_cst_flow_thr_mm_for_ero_dra = dict_const['c_cst_flow_thr_mm_for_ero_dra']
 
+        # bring in seasonality (pre-computed once for all the links of the network for each time step)
+        c_seasonal_sine = calendar.get_seasonal_sine(calendar.index(datetime_time_step), c_cst_day_grow)
+
         # bring in hydrology parameters, states, and outputs necessary for water quality model
         c_p_z = dict_param['c_p_z']
 
@@ -1132,7 +1134,9 @@ class INCAc(Model):
             c_s_v_h2o_ove_old, c_s_v_h2o_dra_old, c_s_v_h2o_int_old, c_s_v_h2o_sgw_old, c_s_v_h2o_dgw_old, \
             c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw, \
             lvl_total_start, lvl_total_end, \
-            c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int, c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw
+            c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int, \
+            c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw, \
+            c_seasonal_sine
 
     @staticmethod
     def _get_out(waterbody, datetime_time_step, dict_data_frame,
@@ -23,6 +23,7 @@ from datetime import timedelta
 from math import exp, log
 import csv
 import os
+import numpy as np
 
 try:
     import smartcpp
@@ -48,6 +49,7 @@ class SMARTc(Model):
                                 'c_pr_eff_rain_to_sgw', 'c_pr_eff_rain_to_dgw']
         self.outputs_names = ['c_out_aeva', 'c_out_q_h2o_ove', 'c_out_q_h2o_dra', 'c_out_q_h2o_int',
                               'c_out_q_h2o_sgw', 'c_out_q_h2o_dgw', 'c_out_q_h2o']
+        self.ensemble_capable = True
 
     def set_constants(self, input_folder):
         self._set_constants_with_file(input_folder)
@@ -66,20 +68,22 @@ class SMARTc(Model):
         my_dict = dict(dict_for_file)
         dict_for_file['WaterBody'] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        # write the inferred parameters in the output folder, unless running without any output folder
+        if output_folder is not None:
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -103,13 +107,155 @@ class SMARTc(Model):
         smart_in = self._get_in(waterbody, datetime_time_step, time_gap,
                                 dict_data_frame, dict_desc, dict_param, dict_meteo)
 
-        if smart_in_cpp:
+        if self.ensemble_size:
+            smart_out = self._run_ensemble(waterbody, datetime_time_step, logger, *smart_in)
+        elif smart_in_cpp:
             smart_out = smartcpp.onestep_c(*smart_in)
         else:
             smart_out = self._run(waterbody, datetime_time_step, logger, *smart_in)
 
         self._get_out(waterbody, datetime_time_step, dict_data_frame, *smart_out)
 
+    @staticmethod
+    def _run_ensemble(waterbody, datetime_time_step, logger,
+                      area_m2, time_gap_sec,
+                      c_in_rain, c_in_peva,
+                      c_p_t, c_p_c, c_p_h, c_p_d, c_p_s, c_p_z, c_p_sk, c_p_fk, c_p_gk,
+                      c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw,
+                      c_s_v_h2o_ly1, c_s_v_h2o_ly2, c_s_v_h2o_ly3, c_s_v_h2o_ly4, c_s_v_h2o_ly5, c_s_v_h2o_ly6):
+        """
+        This function is the vectorised version of _run for an ensemble of parameter sets: the parameters and the
+        states are arrays with one value per member, and all the members are advanced by one time step at once. Both
+        branches of the soil moisture accounting (excess or deficit of rainfall) are computed for all the members, and
+        the relevant one is then selected member by member.
+        """
+        # # 1. Hydrology
+        # # 1.0. Define internal constants
+        nb_soil_layers = 6.0  # number of layers in soil column [-]
+
+        # # 1.1. Unit conversions
+        c_p_sk = c_p_sk * 3600.0  # convert hours in seconds
+        c_p_fk = c_p_fk * 3600.0  # convert hours in seconds
+        c_p_gk = c_p_gk * 3600.0  # convert hours in seconds
+
+        # # 1.2. Hydrological calculations
+
+        # /!\ all calculations in mm equivalent until further notice
+
+        # calculate capacity Z and level LVL of each layer (assumed equal) from effective soil depth
+        z_lyr = c_p_z / nb_soil_layers
+        # use positions to identify the six soil layers (from 0 for top layer to 5 for bottom layer)
+        list_lvl_lyr = [c_s_v_h2o_ly1 / area_m2 * 1e3, c_s_v_h2o_ly2 / area_m2 * 1e3, c_s_v_h2o_ly3 / area_m2 * 1e3,
+                        c_s_v_h2o_ly4 / area_m2 * 1e3, c_s_v_h2o_ly5 / area_m2 * 1e3, c_s_v_h2o_ly6 / area_m2 * 1e3]
+
+        # calculate cumulative level of water in all soil layers at beginning of time step (i.e. soil moisture)
+        lvl_total_start = 0.0
+        for i in range(6):
+            lvl_total_start = lvl_total_start + list_lvl_lyr[i]
+
+        # apply parameter T to rainfall data (aerial rainfall correction)
+        rain = c_in_rain * c_p_t
+        # calculate excess rainfall
+        excess_rain = rain - c_in_peva
+        # members with excess rainfall available for runoff and infiltration
+        is_excess = excess_rain >= 0.0
+
+        # branch 1: excess rainfall available for runoff and infiltration
+        lvl_lyr_excess = list(list_lvl_lyr)
+        # calculate surface runoff using quick runoff parameter H and relative soil moisture content
+        h_prime = c_p_h * (lvl_total_start / c_p_z)
+        c_pr_eff_rain_to_ove = h_prime * excess_rain
+        remainder = excess_rain - c_pr_eff_rain_to_ove
+        # calculate percolation through soil layers (from top layer to bottom layer)
+        for i in range(6):
+            space_in_lyr = z_lyr - lvl_lyr_excess[i]
+            fits = remainder <= space_in_lyr
+            lvl_lyr_excess[i] = np.where(fits, lvl_lyr_excess[i] + remainder, z_lyr)
+            remainder = np.where(fits, 0.0, remainder - space_in_lyr)
+        # calculate saturation excess from remaining excess rainfall after filling layers (if not 0)
+        c_pr_eff_rain_to_dra = c_p_d * remainder
+        c_pr_eff_rain_to_int = (1.0 - c_p_d) * remainder
+        # calculate leak from soil layers (i.e. piston flow becoming active during rainfall events)
+        s_prime = c_p_s * (lvl_total_start / c_p_z)
+        # leak to interflow (soil moisture outflow reducing exponentially downwards)
+        for i in range(6):
+            leak_interflow = lvl_lyr_excess[i] * (s_prime ** (i + 1))
+            leaks = leak_interflow < lvl_lyr_excess[i]
+            c_pr_eff_rain_to_int = np.where(leaks, c_pr_eff_rain_to_int + leak_interflow, c_pr_eff_rain_to_int)
+            lvl_lyr_excess[i] = np.where(leaks, lvl_lyr_excess[i] - leak_interflow, lvl_lyr_excess[i])
+        # leak to shallow groundwater flow (soil moisture outflow reducing linearly downwards)
+        c_pr_eff_rain_to_sgw = 0.0
+        for i in range(6):
+            leak_shallow_flow = lvl_lyr_excess[i] * (s_prime / (i + 1))
+            leaks = leak_shallow_flow < lvl_lyr_excess[i]
+            c_pr_eff_rain_to_sgw = np.where(leaks, c_pr_eff_rain_to_sgw + leak_shallow_flow, c_pr_eff_rain_to_sgw)
+            lvl_lyr_excess[i] = np.where(leaks, lvl_lyr_excess[i] - leak_shallow_flow, lvl_lyr_excess[i])
+        # leak to deep groundwater flow (soil moisture outflow reducing exponentially upwards)
+        c_pr_eff_rain_to_dgw = 0.0
+        for i in range(5, -1, -1):
+            leak_deep_flow = lvl_lyr_excess[i] * (s_prime ** (6 - i))
+            leaks = leak_deep_flow < lvl_lyr_excess[i]
+            c_pr_eff_rain_to_dgw = np.where(leaks, c_pr_eff_rain_to_dgw + leak_deep_flow, c_pr_eff_rain_to_dgw)
+            lvl_lyr_excess[i] = np.where(leaks, lvl_lyr_excess[i] - leak_deep_flow, lvl_lyr_excess[i])
+
+        # branch 2: no excess rainfall (i.e. potential evapotranspiration not satisfied by available rainfall)
+        lvl_lyr_deficit = list(list_lvl_lyr)
+        deficit_rain = excess_rain * (-1.0)  # excess is negative => excess is actually a deficit
+        aeva_deficit = 0.0 + rain
+        for i in range(6):  # try to satisfy PE from soil layers (from top layer to bottom layer)
+            available = lvl_lyr_deficit[i] >= deficit_rain
+            aeva_deficit = np.where(available, aeva_deficit + deficit_rain, aeva_deficit + lvl_lyr_deficit[i])
+            # the more you move down through the soil layers, the less AET can meet PET (exponentially)
+            next_deficit_rain = np.where(available, 0.0, c_p_c * (deficit_rain - lvl_lyr_deficit[i]))
+            lvl_lyr_deficit[i] = np.where(available, lvl_lyr_deficit[i] - deficit_rain, 0.0)
+            deficit_rain = next_deficit_rain
+
+        # select the relevant branch for each member
+        aeva = np.where(is_excess, 0.0 + c_in_peva, aeva_deficit)
+        c_pr_eff_rain_to_ove = np.where(is_excess, c_pr_eff_rain_to_ove, 0.0)
+        c_pr_eff_rain_to_dra = np.where(is_excess, c_pr_eff_rain_to_dra, 0.0)
+        c_pr_eff_rain_to_int = np.where(is_excess, c_pr_eff_rain_to_int, 0.0)
+        c_pr_eff_rain_to_sgw = np.where(is_excess, c_pr_eff_rain_to_sgw, 0.0)
+        c_pr_eff_rain_to_dgw = np.where(is_excess, c_pr_eff_rain_to_dgw, 0.0)
+        list_lvl_lyr = [np.where(is_excess, lvl_excess, lvl_deficit)
+                        for lvl_excess, lvl_deficit in zip(lvl_lyr_excess, lvl_lyr_deficit)]
+
+        # /!\ all calculations in S.I. units now (i.e. mm converted into cubic metres)
+
+        # calculate actual evapotranspiration as a flux
+        c_out_aeva = aeva / 1e3 * area_m2 / time_gap_sec  # [m3/s]
+
+        # route overland flow, drain flow, interflow, shallow and deep groundwater flows
+        c_out_q_h2o_ove = c_s_v_h2o_ove / c_p_sk  # [m3/s]
+        c_s_v_h2o_ove = c_s_v_h2o_ove + ((c_pr_eff_rain_to_ove / 1e3 * area_m2) - (c_out_q_h2o_ove * time_gap_sec))
+        c_out_q_h2o_dra = c_s_v_h2o_dra / c_p_sk  # [m3/s]
+        c_s_v_h2o_dra = c_s_v_h2o_dra + ((c_pr_eff_rain_to_dra / 1e3 * area_m2) - (c_out_q_h2o_dra * time_gap_sec))
+        c_out_q_h2o_int = c_s_v_h2o_int / c_p_fk  # [m3/s]
+        c_s_v_h2o_int = c_s_v_h2o_int + ((c_pr_eff_rain_to_int / 1e3 * area_m2) - (c_out_q_h2o_int * time_gap_sec))
+        c_out_q_h2o_sgw = c_s_v_h2o_sgw / c_p_gk  # [m3/s]
+        c_s_v_h2o_sgw = c_s_v_h2o_sgw + ((c_pr_eff_rain_to_sgw / 1e3 * area_m2) - (c_out_q_h2o_sgw * time_gap_sec))
+        c_out_q_h2o_dgw = c_s_v_h2o_dgw / c_p_gk  # [m3/s]
+        c_s_v_h2o_dgw = c_s_v_h2o_dgw + ((c_pr_eff_rain_to_dgw / 1e3 * area_m2) - (c_out_q_h2o_dgw * time_gap_sec))
+
+        my_stores = [c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw]
+        for position, store in enumerate(['OVE', 'DRA', 'INT', 'SGW', 'DGW']):
+            nb_negatives = int(np.count_nonzero(my_stores[position] < 0.0))
+            if nb_negatives:
+                logger.debug(''.join([
+                    'SMART # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
+                    ' - Volume in ', store, ' Store has gone negative for ', str(nb_negatives),
+                    ' member(s), volume reset to zero.']))
+                my_stores[position] = np.where(my_stores[position] < 0.0, 0.0, my_stores[position])
+        c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw = my_stores
+
+        # # 1.3. Returns outputs, updated states, and internal process variables
+        return \
+            c_out_aeva, c_out_q_h2o_ove, c_out_q_h2o_dra, c_out_q_h2o_int, c_out_q_h2o_sgw, c_out_q_h2o_dgw, \
+            c_s_v_h2o_ove, c_s_v_h2o_dra, c_s_v_h2o_int, c_s_v_h2o_sgw, c_s_v_h2o_dgw, \
+            list_lvl_lyr[0] / 1e3 * area_m2, list_lvl_lyr[1] / 1e3 * area_m2, list_lvl_lyr[2] / 1e3 * area_m2, \
+            list_lvl_lyr[3] / 1e3 * area_m2, list_lvl_lyr[4] / 1e3 * area_m2, list_lvl_lyr[5] / 1e3 * area_m2, \
+            c_pr_eff_rain_to_ove, c_pr_eff_rain_to_dra, c_pr_eff_rain_to_int, c_pr_eff_rain_to_sgw, c_pr_eff_rain_to_dgw
+
     @staticmethod
     def _run(waterbody, datetime_time_step, logger,
              area_m2, time_gap_sec,
@@ -19,9 +19,9 @@
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
 from logging import getLogger
-from csv import DictReader
+import numpy as np
 
-from ..inout import open_csv_rb
+from ..inout import read_csv_rows
 
 
 class Model(object):
@@ -48,6 +48,52 @@ class Model(object):
         self.constants = None
         # reference to the Link object it works on
         self.link = None
+        # whether the Model can simulate an ensemble of parameter sets at once (see set_ensemble_parameters)
+        self.ensemble_capable = False
+        # number of members of the ensemble of parameter sets (None if simulating one parameter set)
+        self.ensemble_size = None
+        # dict of values for the parameters of the Model before it was given an ensemble of parameter sets
+        self._single_parameters = None
+
+    def set_ensemble_parameters(self, link, values, size):
+        """
+        This method replaces the values of the parameters of the Model by arrays with one value per member of an
+        ensemble of parameter sets. The parameters that are not given keep the value of the single parameter set (i.e.
+        read from the parameters file or inferred from the descriptors) for all the members.
+
+        :param link: Link object the Model works on
+        :type link: Link
+        :param values: values of the parameters for each member { key = parameter_name: value = sequence of values }
+        :type values: dict()
+        :param size: number of members of the ensemble
+        :type size: int
+        """
+        if self._single_parameters is None:
+            self._single_parameters = dict(self.parameters)
+        my_dict = dict()
+        for name in self.parameters_names:
+            if name in values:
+                my_dict[name] = np.array(values[name], dtype=np.float64)
+            else:
+                my_dict[name] = np.full(size, self._single_parameters[name], dtype=np.float64)
+
+        self.parameters = my_dict
+        self.ensemble_size = size
+        link.models_parameters.update(my_dict)
+
+    def clear_ensemble_parameters(self, link):
+        """
+        This method gives the Model back the single parameter set it had before it was given an ensemble of parameter
+        sets (see set_ensemble_parameters).
+
+        :param link: Link object the Model works on
+        :type link: Link
+        """
+        if self._single_parameters is not None:
+            self.parameters = self._single_parameters
+            link.models_parameters.update(self.parameters)
+            self._single_parameters = None
+        self.ensemble_size = None
 
     def _set_constants_with_file(self, input_folder):
         """
@@ -63,25 +109,23 @@ class Model(object):
         if self.constants_names:
             try:
                 my_dict = dict()
-                with open_csv_rb('{}{}.constants'.format(input_folder, self.identifier)) as my_file:
-                    my_reader = DictReader(my_file)
-                    for row in my_reader:
-                        try:
-                            if row['ConstantName'] in self.constants_names:
-                                try:
-                                    my_dict[row['ConstantName']] = float(row['ConstantValue'])
-                                except KeyError:
-                                    logger.error(
-                                        "The column header 'ConstantValue' is not present in the constants file.")
-                                    raise Exception(
-                                        "The column header 'ConstantValue' is not present in the constants file.")
-                        except KeyError:
-                            logger.error("The column header 'ConstantName' is not present in the constants file.")
-                            raise Exception("The column header 'ConstantName' is not present in the constants file.")
-                    for name in self.constants_names:
-                        if name not in my_dict:
-                            logger.error("The constant {} is not available for {}.".format(name, self.identifier))
-                            raise Exception("The constant {} is not available for {}.".format(name, self.identifier))
+                for row in read_csv_rows('{}{}.constants'.format(input_folder, self.identifier))[1]:
+                    try:
+                        if row['ConstantName'] in self.constants_names:
+                            try:
+                                my_dict[row['ConstantName']] = float(row['ConstantValue'])
+                            except KeyError:
+                                logger.error(
+                                    "The column header 'ConstantValue' is not present in the constants file.")
+                                raise Exception(
+                                    "The column header 'ConstantValue' is not present in the constants file.")
+                    except KeyError:
+                        logger.error("The column header 'ConstantName' is not present in the constants file.")
+                        raise Exception("The column header 'ConstantName' is not present in the constants file.")
+                for name in self.constants_names:
+                    if name not in my_dict:
+                        logger.error("The constant {} is not available for {}.".format(name, self.identifier))
+                        raise Exception("The constant {} is not available for {}.".format(name, self.identifier))
 
                 self.constants = my_dict
 
@@ -105,27 +149,25 @@ class Model(object):
         if self.parameters_names:
             try:
                 my_dict = dict()
-                with open_csv_rb(
-                        '{}{}_{}.{}{}.parameters'.format(
-                            input_folder, catchment, outlet, self.identifier, self.category)) as my_file:
-                    my_reader = DictReader(my_file)
-                    found = False
-                    for row in my_reader:
-                        if row['WaterBody'] == link.name:
-                            found = True
-                            for name in self.parameters_names:
-                                try:
-                                    my_dict[name] = float(row[name])
-                                except KeyError:
-                                    logger.error("The {}{} parameter {} is not available for {}.".format(
-                                        self.identifier, self.category, name, link.name))
-                                    raise Exception("The {}{} parameter {} is not available for {}.".format(
-                                        self.identifier, self.category, name, link.name))
-                    if not found:
-                        logger.error(
-                            "The WaterBody {} is not available in the parameters file.".format(link.name))
-                        raise Exception(
-                            "The WaterBody {} is not available in the parameters file.".format(link.name))
+                my_rows = read_csv_rows('{}{}_{}.{}{}.parameters'.format(
+                    input_folder, catchment, outlet, self.identifier, self.category))[1]
+                found = False
+                for row in my_rows:
+                    if row['WaterBody'] == link.name:
+                        found = True
+                        for name in self.parameters_names:
+                            try:
+                                my_dict[name] = float(row[name])
+                            except KeyError:
+                                logger.error("The {}{} parameter {} is not available for {}.".format(
+                                    self.identifier, self.category, name, link.name))
+                                raise Exception("The {}{} parameter {} is not available for {}.".format(
+                                    self.identifier, self.category, name, link.name))
+                if not found:
+                    logger.error(
+                        "The WaterBody {} is not available in the parameters file.".format(link.name))
+                    raise Exception(
+                        "The WaterBody {} is not available in the parameters file.".format(link.name))
 
                 self.parameters = my_dict
                 link.models_parameters.update(my_dict)
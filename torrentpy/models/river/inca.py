@@ -54,20 +54,22 @@ class INCAr(Model):
         my_dict = dict(dict_for_file)
         dict_for_file['WaterBody'] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        # write the inferred parameters in the output folder, unless running without any output folder
+        if output_folder is not None:
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -22,6 +22,7 @@
 from datetime import timedelta
 import os
 import csv
+import numpy as np
 
 try:
     import smartcpp
@@ -42,6 +43,7 @@ class SMARTr(Model):
         self.parameters_names = ['r_p_rk']
         self.states_names = ['r_s_v_h2o']
         self.outputs_names = ['r_out_q_h2o']
+        self.ensemble_capable = True
 
     def set_constants(self, input_folder):
         self._set_constants_with_file(input_folder)
@@ -60,20 +62,22 @@ class SMARTr(Model):
         my_dict = dict(dict_for_file)
         dict_for_file['WaterBody'] = link.name
 
-        if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                           self.identifier, self.category)):
-            with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writerow(dict_for_file)
-        else:
-            with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
-                                                              self.identifier, self.category)) as my_file:
-                header = ['WaterBody'] + self.parameters_names
-                my_writer = csv.DictWriter(my_file, fieldnames=header)
-                my_writer.writeheader()
-                my_writer.writerow(dict_for_file)
+        # write the inferred parameters in the output folder, unless running without any output folder
+        if output_folder is not None:
+            if os.path.isfile('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                               self.identifier, self.category)):
+                with open_csv_ab('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writerow(dict_for_file)
+            else:
+                with open_csv_wb('{}{}_{}.{}{}.parameters'.format(output_folder, catchment, outlet,
+                                                                  self.identifier, self.category)) as my_file:
+                    header = ['WaterBody'] + self.parameters_names
+                    my_writer = csv.DictWriter(my_file, fieldnames=header)
+                    my_writer.writeheader()
+                    my_writer.writerow(dict_for_file)
 
         self.parameters = my_dict
         link.models_parameters.update(my_dict)
@@ -99,13 +103,48 @@ class SMARTr(Model):
         smart_in = self._get_in(connections, waterbody, datetime_time_step, time_gap,
                                 dict_data_frame, dict_param)
 
-        if smart_in_cpp:
+        if self.ensemble_size:
+            smart_out = self._run_ensemble(waterbody, datetime_time_step, logger, *smart_in)
+        elif smart_in_cpp:
             smart_out = smartcpp.onestep_r(*smart_in)
         else:
             smart_out = self._run(waterbody, datetime_time_step, logger, *smart_in)
 
         self._get_out(waterbody, datetime_time_step, dict_data_frame, *smart_out)
 
+    @staticmethod
+    def _run_ensemble(waterbody, datetime_time_step, logger,
+                      time_gap_sec,
+                      r_in_q_h2o, r_p_rk, r_s_v_h2o):
+        """
+        This function is the vectorised version of _run for an ensemble of parameter sets: the parameters and the
+        states are arrays with one value per member, and all the members are advanced by one time step at once.
+        """
+        # # 1. Hydrology
+
+        # # 1.1. Unit conversions
+        r_p_rk = r_p_rk * 3600.0  # convert hours into seconds
+
+        # # 1.2. Hydrological calculations
+
+        # calculate outflow, at current time step
+        r_out_q_h2o = r_s_v_h2o / r_p_rk
+        # calculate storage in temporary variable, for next time step
+        r_s_v_h2o_temp = r_s_v_h2o + (r_in_q_h2o - r_out_q_h2o) * time_gap_sec
+        # check if storage has gone negative, if so, constrain outflow to 95% of what was in store
+        is_negative = r_s_v_h2o_temp < 0.0
+        nb_negatives = int(np.count_nonzero(is_negative))
+        if nb_negatives:
+            logger.debug(''.join(['LINRES # ', waterbody, ': ', datetime_time_step.strftime('%d/%m/%Y %H:%M:%S'),
+                                  ' - Volume in River Store has gone negative for ', str(nb_negatives),
+                                  ' member(s), outflow constrained to 95% of what is in store.']))
+        r_out_q_h2o = np.where(is_negative, 0.95 * (r_in_q_h2o + r_s_v_h2o / time_gap_sec), r_out_q_h2o)
+        r_s_v_h2o = np.where(is_negative, r_s_v_h2o + (r_in_q_h2o - r_out_q_h2o) * time_gap_sec, r_s_v_h2o_temp)
+
+        # # 1.3. Return outputs and updated states
+        return \
+            r_out_q_h2o, r_s_v_h2o
+
     @staticmethod
     def _run(waterbody, datetime_time_step, logger,
              time_gap_sec,
@@ -20,13 +20,20 @@
 
 import logging
 from logging import getLogger
+try:
+    from logging.handlers import QueueHandler
+except ImportError:  # only available from Python 3.2
+    QueueHandler = None
 import os
-import csv
+import sys
 from glob import glob
-from datetime import timedelta
+from datetime import datetime, timedelta
 from builtins import zip
 
-from .inout import create_simulation_files, update_simulation_files, open_csv_rb
+from .inout import create_simulation_files, update_simulation_files, check_output_settings, read_csv_rows
+from .results import Results
+from .accumulators import group_accumulators, update_accumulators
+from .warmup import get_warm_up_key, load_warm_up_states, store_warm_up_states
 
 
 class Network(object):
@@ -34,6 +41,9 @@ class Network(object):
     This class defines all the constituting parts of a catchment models as a node-link network, as well as the
     different relationships between the nodes and the links, and the characteristics of the links.
     """
+    # handlers added to the logger by the latest Network (replaced when a new Network is created in the same process)
+    _log_handlers = list()
+
     def __init__(self, catchment, outlet, in_fld, out_fld,
                  variable_h, variables_q=None, verbose=True, water_quality=False):
         # identifier for the catchment
@@ -44,7 +54,10 @@ class Network(object):
         self.in_fld = in_fld
         self.out_fld = out_fld
         # clean it up the output folder if it already exists, otherwise create it
-        if os.path.exists(out_fld):
+        # (no output folder means that the results are only kept in memory, so there is nothing to clean up)
+        if out_fld is None:
+            pass
+        elif os.path.exists(out_fld):
             for ext in [".parameters", ".node*", ".inputs*", ".outputs*", ".states*"]:
                 my_files = glob("{}{}*{}".format(out_fld, catchment, ext))
                 for my_file in my_files:
@@ -77,25 +90,46 @@ class Network(object):
         self.variables = [self.variable_h] + self.variables_q
         # boolean to state whether Links were assigned Models
         self.links_have_models = False
+        # number of members of the ensemble of parameter sets simulated at once (None if one parameter set)
+        self.ensemble_size = None
 
     def _set_logger(self, verbose):
         """
         This function creates a logger in order to print in console as well as to save in .log file information
         about the simulation. The level of detail displayed is the console is customisable using the 'verbose'
         parameter. If it is True, more information will be displayed (logging.INFO) than if it is False
-        (logging.WARNING only).
+        (logging.WARNING only). If there is no output folder, no .log file is created. The handlers of any Network
+        previously created in the same process are removed and closed, so that a process running several simulations
+        in turn (e.g. a worker of a Batch session) does not accumulate open log files. If the logger already sends its
+        records through a queue (e.g. in a worker of a Batch session), no handler is added.
 
         :param verbose: boolean to define the level of information the logger should report
         """
         # Create Logger [ levels: debug < info < warning < error < critical ]
         logger = logging.getLogger('TORRENTpy')
         logger.setLevel(logging.INFO)
+        # Remove the handlers of the previous Network
+        for handler in Network._log_handlers:
+            logger.removeHandler(handler)
+            handler.close()
+        del Network._log_handlers[:]
+        # If the records are sent through a queue (e.g. in a Batch worker), the process at the other end of the queue
+        # writes them, so only start a new .log file
+        if QueueHandler is not None and any([isinstance(handler, QueueHandler) for handler in logger.handlers]):
+            if self.out_fld is not None:
+                log_file = '{}{}_{}.simu.log'.format(self.out_fld, self.catchment, self.outlet)
+                if os.path.isfile(log_file):  # del file if already exists
+                    os.remove(log_file)
+            return
         # Create FileHandler
-        log_file = '{}{}_{}.simu.log'.format(self.out_fld, self.catchment, self.outlet)
-        if os.path.isfile(log_file):  # del file if already exists
-            os.remove(log_file)
-        f_handler = logging.FileHandler(log_file)
-        f_handler.setLevel(logging.INFO)
+        if self.out_fld is not None:
+            log_file = '{}{}_{}.simu.log'.format(self.out_fld, self.catchment, self.outlet)
+            if os.path.isfile(log_file):  # del file if already exists
+                os.remove(log_file)
+            f_handler = logging.FileHandler(log_file)
+            f_handler.setLevel(logging.INFO)
+        else:
+            f_handler = None
         # Create StreamHandler
         s_handler = logging.StreamHandler()
         if verbose:  # specify level of information required by the user
@@ -106,10 +140,13 @@ class Network(object):
         formatter = logging.Formatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                                       datefmt='%d/%m/%Y - %H:%M:%S')
         # Apply Formatter and Handler
-        f_handler.setFormatter(formatter)
+        if f_handler:
+            f_handler.setFormatter(formatter)
+            logger.addHandler(f_handler)
+            Network._log_handlers.append(f_handler)
         s_handler.setFormatter(formatter)
-        logger.addHandler(f_handler)
         logger.addHandler(s_handler)
+        Network._log_handlers.append(s_handler)
 
     def _set_network_connectivity(self):
         """
@@ -119,34 +156,33 @@ class Network(object):
         """
         logger = getLogger('TORRENTpy.nw')
         try:
-            with open_csv_rb(self.network_file) as my_file:
-                my_reader = csv.DictReader(my_file)
-                my_nodes = list()  # list of all nodes
-                my_links = list()  # list of all links (i.e. waterbodies)
-                my_connections = dict()  # key: waterbody, value: 2-element list (node down, node up)
-                my_routing = dict()  # key: node, value: list of links whose reaches are pouring into the node
-                my_adding = dict()  # key: node, value: list of links whose catchments are pouring into the node
-                for row in my_reader:
-                    my_nodes.append(row['NodeDown'])
-                    my_nodes.append(row['NodeUp'])
-                    my_links.append(row['WaterBody'])
-                    my_connections[row['WaterBody']] = (row['NodeDown'], row['NodeUp'])
-                my_nodes = list(set(my_nodes))  # get rid of the duplicates
-                for node in my_nodes:
-                    my_routing[node] = list()
-                    my_adding[node] = list()
-                for link in my_connections:
-                    my_routing[my_connections[link][0]].append(link)
-                    my_adding[my_connections[link][1]].append(link)
-
-                links = [Link(link, my_connections[link]) for link in my_links]
-                links_mapping = {link.name: link for link in links}
-
-                nodes = [Node(node,
-                              [links_mapping[link] for link in my_routing[node]],
-                              [links_mapping[link] for link in my_adding[node]])
-                         for node in my_nodes]
-                nodes_mapping = {node.name: node for node in nodes}
+            my_rows = read_csv_rows(self.network_file)[1]
+            my_nodes = list()  # list of all nodes
+            my_links = list()  # list of all links (i.e. waterbodies)
+            my_connections = dict()  # key: waterbody, value: 2-element list (node down, node up)
+            my_routing = dict()  # key: node, value: list of links whose reaches are pouring into the node
+            my_adding = dict()  # key: node, value: list of links whose catchments are pouring into the node
+            for row in my_rows:
+                my_nodes.append(row['NodeDown'])
+                my_nodes.append(row['NodeUp'])
+                my_links.append(row['WaterBody'])
+                my_connections[row['WaterBody']] = (row['NodeDown'], row['NodeUp'])
+            my_nodes = list(set(my_nodes))  # get rid of the duplicates
+            for node in my_nodes:
+                my_routing[node] = list()
+                my_adding[node] = list()
+            for link in my_connections:
+                my_routing[my_connections[link][0]].append(link)
+                my_adding[my_connections[link][1]].append(link)
+
+            links = [Link(link, my_connections[link]) for link in my_links]
+            links_mapping = {link.name: link for link in links}
+
+            nodes = [Node(node,
+                          [links_mapping[link] for link in my_routing[node]],
+                          [links_mapping[link] for link in my_adding[node]])
+                     for node in my_nodes]
+            nodes_mapping = {node.name: node for node in nodes}
 
             return (
                 nodes, nodes_mapping,
@@ -168,18 +204,16 @@ class Network(object):
         found = list()
         categories = list()
         try:
-            with open_csv_rb(self.waterbodies_file) as my_file:
-                my_reader = csv.DictReader(my_file)
-                for row in my_reader:
-                    if row['WaterBody'] in self.links_mapping:
-                        self.links_mapping[row['WaterBody']].category = int(row['WaterBodyTypeCode'])
-                        categories.append(int(row['WaterBodyTypeCode']))
-                    else:
-                        logger.error("{} is in the .waterbodies file but it is not "
-                                     "in the .connectivity file.".format(row['WaterBody']))
-                        raise Exception("{} is in the .waterbodies file but it is not "
-                                        "in the .connectivity file.".format(row['WaterBody']))
-                    found.append(row['WaterBody'])
+            for row in read_csv_rows(self.waterbodies_file)[1]:
+                if row['WaterBody'] in self.links_mapping:
+                    self.links_mapping[row['WaterBody']].category = int(row['WaterBodyTypeCode'])
+                    categories.append(int(row['WaterBodyTypeCode']))
+                else:
+                    logger.error("{} is in the .waterbodies file but it is not "
+                                 "in the .connectivity file.".format(row['WaterBody']))
+                    raise Exception("{} is in the .waterbodies file but it is not "
+                                    "in the .connectivity file.".format(row['WaterBody']))
+                found.append(row['WaterBody'])
 
             missing = [wb for wb in self.links_mapping if wb not in found]
             if missing:
@@ -199,21 +233,19 @@ class Network(object):
         """
         logger = getLogger('TORRENTpy.nw')
         try:
-            with open_csv_rb(self.descriptors_file) as my_file:
-                my_reader = csv.DictReader(my_file)
-                fields = my_reader.fieldnames[:]
-                fields.remove('WaterBody')
-                found = list()
-                for row in my_reader:
-                    my_dict = dict()
-                    for field in fields:
-                        my_dict[field] = float(row[field])
-                    if row['WaterBody'] in self.links_mapping:
-                        self.links_mapping[row['WaterBody']].descriptors = my_dict
-                    else:
-                        logger.exception("{} is in the .descriptors file but it is not "
-                                         "in the .connectivity file.".format(row['WaterBody']))
-                    found.append(row['WaterBody'])
+            fields, my_rows = read_csv_rows(self.descriptors_file)
+            fields.remove('WaterBody')
+            found = list()
+            for row in my_rows:
+                my_dict = dict()
+                for field in fields:
+                    my_dict[field] = float(row[field])
+                if row['WaterBody'] in self.links_mapping:
+                    self.links_mapping[row['WaterBody']].descriptors = my_dict
+                else:
+                    logger.exception("{} is in the .descriptors file but it is not "
+                                     "in the .connectivity file.".format(row['WaterBody']))
+                found.append(row['WaterBody'])
 
             missing = [wb for wb in self.links_mapping if wb not in found]
             if missing:
@@ -305,7 +337,8 @@ class Network(object):
             # change Network attributes to state that assignment of Models for all Links is now complete
             self.links_have_models = True
         else:  # assignment already done, ignore reassignment
-            logger.warning("Assignment of Models to Links was already done, reassignment was ignored.")
+            logger.warning("Assignment of Models to Links was already done, reassignment was ignored "
+                           "(use unset_links_models first to assign other Models).")
 
     def set_links_models_from_dict(self, kb,
                                    the_dict):
@@ -449,18 +482,220 @@ class Network(object):
             # change Network attributes to state that assignment of Models for all Links is now complete
             self.links_have_models = True
         else:  # assignment already done, ignore reassignment
-            logger.warning("Assignment of Models to Links was already done, reassignment was ignored.")
+            logger.warning("Assignment of Models to Links was already done, reassignment was ignored "
+                           "(use unset_links_models first to assign other Models).")
+
+    def unset_links_models(self):
+        """
+        This method removes the Models assigned to the Links (and their parameters), so that other Models can be
+        assigned with set_links_models or set_links_models_from_dict. The DataBase of the Network can be kept, the
+        inputs it holds do not depend on the Models.
+        """
+        for link in self.links:
+            link.c_models = []
+            link.r_models = []
+            link.l_models = []
+            link.all_models = None
+            link.models_parameters = dict()
+        # remove the parameters files written for the previous Models (they would otherwise be appended to)
+        if self.out_fld is not None:
+            for my_file in glob("{}{}*.parameters".format(self.out_fld, self.catchment)):
+                os.remove(my_file)
 
-    def simulate(self, db, tf, out_format):
+        self.links_have_models = False
+        self.ensemble_size = None
+
+    def set_ensemble_parameters(self, parameters):
+        """
+        This method gives an ensemble of parameter sets to the Models of the Links, so that one simulation advances
+        all the members of the ensemble together instead of running one simulation per parameter set. The parameters
+        that are not given keep the value of the single parameter set of the Link for all the members. All the Models
+        of the Links must support ensembles (e.g. SMARTc and SMARTr), and the results are only available with the
+        'memory' or 'netcdf' output formats (with one value per member for each variable).
+
+        :param parameters: values of the parameters for each member, for each Link
+            { key = link: value = dict(key = parameter_name: value = sequence of values) }
+        :type parameters: dict()
+        :return: number of members of the ensemble
+        :rtype: int
+        """
+        logger = getLogger('TORRENTpy.nw')
+
+        if not self.links_have_models:
+            logger.error("Models must be assigned to the Links before setting an ensemble of parameters.")
+            raise Exception("Models must be assigned to the Links before setting an ensemble of parameters.")
+
+        my_sizes = set(len(values) for link_name in parameters for values in parameters[link_name].values())
+        if len(my_sizes) != 1:
+            logger.error("The ensemble of parameters must give the same number of values (at least one) "
+                         "for all the parameters.")
+            raise Exception("The ensemble of parameters must give the same number of values (at least one) "
+                            "for all the parameters.")
+        size = my_sizes.pop()
+
+        for link_name in parameters:
+            if link_name not in self.links_mapping:
+                logger.error("Link {} is not part of the Network.".format(link_name))
+                raise Exception("Link {} is not part of the Network.".format(link_name))
+            my_names = [name for model in self.links_mapping[link_name].all_models for name in model.parameters_names]
+            for name in parameters[link_name]:
+                if name not in my_names:
+                    logger.error("The parameter {} is not used by the Models of {}.".format(name, link_name))
+                    raise Exception("The parameter {} is not used by the Models of {}.".format(name, link_name))
+        for link in self.links:
+            for model in link.all_models:
+                if not model.ensemble_capable:
+                    logger.error("The Model {}{} of {} cannot simulate an ensemble of parameters.".format(
+                        model.identifier, model.category, link.name))
+                    raise Exception("The Model {}{} of {} cannot simulate an ensemble of parameters.".format(
+                        model.identifier, model.category, link.name))
+
+        for link in self.links:
+            for model in link.all_models:
+                model.set_ensemble_parameters(link, parameters.get(link.name, dict()), size)
+        self.ensemble_size = size
+
+        return size
+
+    def set_parameters(self, parameters):
+        """
+        This method replaces the values of some parameters of the Models of the Links, so that the Network (and its
+        DataBase) can be simulated again with other parameters without being set up again. The parameters that are
+        not given keep their current value. If the Models were given an ensemble of parameter sets, they are given
+        back their single parameter set before the new values are set.
+
+        :param parameters: values of the parameters for each Link
+            { key = link: value = dict(key = parameter_name: value = float) }
+        :type parameters: dict()
+        """
+        logger = getLogger('TORRENTpy.nw')
+
+        if not self.links_have_models:
+            logger.error("Models must be assigned to the Links before setting their parameters.")
+            raise Exception("Models must be assigned to the Links before setting their parameters.")
+
+        for link_name in parameters:
+            if link_name not in self.links_mapping:
+                logger.error("Link {} is not part of the Network.".format(link_name))
+                raise Exception("Link {} is not part of the Network.".format(link_name))
+            my_names = [name for model in self.links_mapping[link_name].all_models for name in model.parameters_names]
+            for name in parameters[link_name]:
+                if name not in my_names:
+                    logger.error("The parameter {} is not used by the Models of {}.".format(name, link_name))
+                    raise Exception("The parameter {} is not used by the Models of {}.".format(name, link_name))
+
+        self.clear_ensemble_parameters()
+        for link_name in parameters:
+            link = self.links_mapping[link_name]
+            for model in link.all_models:
+                for name in model.parameters_names:
+                    if name in parameters[link_name]:
+                        model.parameters[name] = float(parameters[link_name][name])
+                        link.models_parameters[name] = model.parameters[name]
+
+    def clear_ensemble_parameters(self):
+        """
+        This method gives the Models of the Links back the single parameter set they had before they were given an
+        ensemble of parameter sets (see set_ensemble_parameters).
+        """
+        if self.links_have_models:
+            for link in self.links:
+                for model in link.all_models:
+                    model.clear_ensemble_parameters(link)
+        self.ensemble_size = None
 
+    def simulate(self, db, tf, out_format,
+                 out_dtype='float64', out_complevel=1, out_shuffle=True, out_chunksize=None, out_digits=7,
+                 out_entities=None, out_variables=None, accumulators=None, memory_budget=None, on_slice=None,
+                 warm_up_cache=None):
+        """
+        This method runs the simulation for the whole simulation period (after a warm-up run if required), slice by
+        slice, and writes the results in the output files. With the 'memory' output format, no file is written and the
+        results are returned as a Results object instead. With no output format, no result is kept at all, only the
+        accumulators are updated. The states of the Models are initialised again at each call, so the Network and its
+        DataBase can be simulated several times in turn (e.g. after set_parameters), the inputs being only read once.
+
+        :param db: DataBase object containing the inputs for the links
+        :type db: DataBase
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param out_format: format of the output files ('csv', 'netcdf', or 'binary'), 'memory' for no files, or None
+        :type out_format: str
+        :param out_dtype: data type used to store the results in 'netcdf', 'binary', and 'memory' (float32/float64)
+        :type out_dtype: str
+        :param out_complevel: level of the zlib compression for 'netcdf' files (from 0 for none to 9 for maximum)
+        :type out_complevel: int
+        :param out_shuffle: whether to apply the HDF5 shuffle filter before compression for 'netcdf' files
+        :type out_shuffle: bool
+        :param out_chunksize: number of time steps in each chunk for 'netcdf' files (left to the library if None)
+        :type out_chunksize: int
+        :param out_digits: number of significant digits used to write the results in 'csv' files
+        :type out_digits: int
+        :param out_entities: names of the links and/or nodes whose results are kept in 'memory' (all if None)
+        :type out_entities: list()
+        :param out_variables: names of the variables whose results are kept in 'memory' (all if None)
+        :type out_variables: list()
+        :param accumulators: Accumulator objects to update slice by slice (e.g. Peak, Mean, Percentiles), reset first
+        :type accumulators: list()
+        :param memory_budget: memory in MB for the data structures of one slice, used to set the slice length of the
+            TimeFrame (the slice length of the TimeFrame is kept as it is if None)
+        :type memory_budget: float
+        :param on_slice: function called at the end of each slice of the simulation period as
+            on_slice(db, tf, save_slice, results) (results being None if the output format is not 'memory'), the
+            simulation stops there if it returns True (e.g. EarlyStop), leaving the results of the following slices
+            empty (and Results.stopped True)
+        :type on_slice: callable
+        :param warm_up_cache: path of the folder where to store the initial conditions given by the warm-up run, and
+            from where to reuse them in the next simulations with the same Models, parameters, inputs, and warm-up
+            period (see get_warm_up_key), instead of running the warm-up again (no cache if None)
+        :type warm_up_cache: str
+        :return: Results object with the 'memory' output format, None otherwise
+        :rtype: Results
+        """
         logger = getLogger('TORRENTpy.nw')
 
-        # create empty output files
-        create_simulation_files(self, out_format)
+        # check the output settings before starting anything
+        check_output_settings(out_dtype, out_complevel, out_chunksize, out_digits)
+        if self.ensemble_size and ((out_format not in [None, 'memory', 'netcdf']) or accumulators):
+            logger.error("An ensemble of parameters can only be simulated with the 'memory' or 'netcdf' output "
+                         "formats, and without accumulators.")
+            raise Exception("An ensemble of parameters can only be simulated with the 'memory' or 'netcdf' output "
+                            "formats, and without accumulators.")
+        my_accumulators = group_accumulators(self, accumulators) if accumulators else None
+
+        # set the slice length to fit in the memory budget if required
+        if memory_budget:
+            tf.set_slice_length_from_memory_budget(memory_budget, self.get_simu_step_size())
+
+        my_results = None
+        if out_format is None:
+            pass
+        elif out_format == 'memory':
+            # create empty arrays of results
+            my_results = Results(self, tf, entities=out_entities, variables=out_variables, dtype=out_dtype)
+        elif self.out_fld is None:
+            logger.error("No output folder provided to the Network, output format {} "
+                         "cannot be used.".format(out_format))
+            raise Exception("No output folder provided to the Network, output format {} "
+                            "cannot be used.".format(out_format))
+        else:
+            # create empty output files
+            create_simulation_files(self, tf, out_format, dtype=out_dtype,
+                                    complevel=out_complevel, shuffle=out_shuffle, chunksize=out_chunksize)
+
+        # Get the initial conditions from the warm-up cache if they were already determined
+        my_warm_up_key = None
+        my_cached_lines = None
+        if tf.warm_up and warm_up_cache is not None:
+            my_warm_up_key = get_warm_up_key(self, db, tf)
+            my_cached_lines = load_warm_up_states(warm_up_cache, my_warm_up_key)
 
         # Set the initial conditions ('blank' warm up run slice by slice) if required
         my_last_lines = dict()
-        if tf.warm_up:  # Warm-up run required
+        if my_cached_lines is not None:  # Warm-up run already done
+            logger.info("Using initial conditions from the warm-up cache.")
+            my_last_lines = my_cached_lines
+        elif tf.warm_up:  # Warm-up run required
             logger.info("Determining initial conditions.")
             # Initialise dicts needed to link time slices together (use last time step of one as first for the other)
             for link in self.links:
@@ -472,7 +707,7 @@ class Network(object):
                 # For nodes, no states so no initial conditions, but instantiation of dict required
                 my_last_lines[node.name] = dict()
 
-            for my_simu_slice, my_save_slice in zip(tf.warm_up.simu_slices, tf.warm_up.save_slices):
+            for my_simu_slice, my_save_slice in zip(tf.warm_up.simu_slice_ranges, tf.warm_up.save_slice_ranges):
                 logger.info("Running Warm-Up Period {} - {}.".format(my_simu_slice[1].strftime('%d/%m/%Y %H:%M:%S'),
                                                                      my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
                 # Initialise data models
@@ -496,6 +731,10 @@ class Network(object):
             # "Garbage collection"
             db.simulation = None
 
+            # Keep the initial conditions for the next simulations with the same key
+            if my_warm_up_key is not None:
+                store_warm_up_states(warm_up_cache, my_warm_up_key, my_last_lines)
+
         else:  # Warm-up run not required
             # Initialise dicts needed to link time slices together (use last time step of one as first for the other)
             for link in self.links:
@@ -510,7 +749,7 @@ class Network(object):
         # Simulate (run slice by slice)
         logger.info("Starting the simulation.")
         # Get meteo input data
-        for my_simu_slice, my_save_slice in zip(tf.simu_slices, tf.save_slices):
+        for my_simu_slice, my_save_slice in zip(tf.simu_slice_ranges, tf.save_slice_ranges):
 
             logger.info("Running Period {} - {}.".format(my_simu_slice[1].strftime('%d/%m/%Y %H:%M:%S'),
                                                          my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
@@ -526,8 +765,25 @@ class Network(object):
             # Simulate
             self._run(db, tf, my_simu_slice)
 
-            # Write results in files
-            update_simulation_files(self, tf, my_save_slice, db, out_format, method='summary')
+            # Write results in files (or keep them in memory)
+            if my_results is not None:
+                my_results.update(tf, my_save_slice, db, method='summary')
+            elif out_format is not None:
+                update_simulation_files(self, tf, my_save_slice, db, out_format, method='summary',
+                                        dtype=out_dtype, digits=out_digits)
+
+            # Update statistics
+            if my_accumulators:
+                update_accumulators(tf, my_save_slice, db, my_accumulators)
+
+            # Stop the simulation if requested by the callback (e.g. the run can no longer reach a given score)
+            if on_slice is not None and on_slice(db, tf, my_save_slice, my_results):
+                logger.warning("Stopping the simulation after {} at the request of the callback.".format(
+                    my_simu_slice[-1].strftime('%d/%m/%Y %H:%M:%S')))
+                if my_results is not None:
+                    my_results.stopped = True
+                db.simulation = None
+                break
 
             # Save history (last time step) for next slice
             for link in self.links:
@@ -540,6 +796,30 @@ class Network(object):
 
         logger.warning("Ending TORRENTpy session for {} at {}.".format(self.catchment, self.outlet))
 
+        return my_results
+
+    def get_simu_step_size(self):
+        """
+        This method estimates the memory (in bytes) taken by one simulation step in the data structures of a slice,
+        i.e. one dictionary of variables for each node and each link (see DataBase.set_db_for_links_and_nodes).
+
+        :return: estimated number of bytes for one simulation step
+        :rtype: int
+        """
+        # DateTime key (shared by all the nodes and links)
+        my_size = sys.getsizeof(datetime(2000, 1, 1))
+        # nested dictionaries for the nodes
+        for node in self.nodes:
+            my_size += get_nested_dict_entry_size(self.variables)
+        # nested dictionaries for the links
+        for link in self.links:
+            my_headers = list()
+            for model in link.all_models:
+                my_headers += model.inputs_names + model.states_names + model.processes_names + model.outputs_names
+            my_size += get_nested_dict_entry_size(my_headers)
+
+        return int(my_size)
+
     def _run(self, db, tf, timeslice):
         """
         This function runs the simulations for a given catchment (defined by a Network object) and given time period
@@ -675,3 +955,13 @@ class Node(object):
         self.routing = routing
         self.adding = adding
         self.extra = dict()
+
+
+def get_nested_dict_entry_size(variables):
+    # entry in the dictionary indexed by DateTime (estimated from the average size of a slot in a large dictionary)
+    my_size = float(sys.getsizeof(dict.fromkeys(range(4096)))) / 4096
+    # dictionary of variables (copied from a template, as in the DataBase) and the float for each variable
+    my_size += sys.getsizeof(dict({variable: 0.0 for variable in variables}))
+    my_size += len(set(variables)) * sys.getsizeof(0.0)
+
+    return my_size
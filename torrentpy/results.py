@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+import numpy as np
+
+from .inout import get_simulation_array
+
+
+class Results(object):
+    """
+    This class holds the results of a simulation in memory (i.e. with the 'memory' output format) as NumPy arrays,
+    with one row per reporting step of the simulation period and one column per variable, for each of the nodes and
+    the links requested. The values are the same as the ones that would be written in the output files. If the Network
+    simulates an ensemble of parameter sets, the arrays have a third dimension with one value per member.
+    """
+    def __init__(self, network, timeframe, entities=None, variables=None, dtype='float64'):
+        """
+        :param network: Network object for the simulated catchment
+        :type network: Network
+        :param timeframe: TimeFrame object for the simulation period
+        :type timeframe: TimeFrame
+        :param entities: list of the names of the links and/or nodes to keep (all of them if None)
+        :type entities: list()
+        :param variables: list of the names of the variables to keep (all of them if None)
+        :type variables: list()
+        :param dtype: data type used to store the results ('float32' or 'float64')
+        :type dtype: str
+        """
+        logger = getLogger('TORRENTpy.rs')
+
+        # datetimes of the reporting steps (the first step of the save series is the initial conditions)
+        self.datetimes = timeframe.save_range[1:]
+        # names of the links and nodes whose results are kept
+        self.entities = list()
+        # list of variables kept for each link and node { key = link/node: value = list(variable) }
+        self.variables = dict()
+        # arrays of results for each link and node { key = link/node: value = numpy.ndarray(datetime, variable) }
+        self.values = dict()
+        # variables to sum up (cumulative inputs) and to summarise otherwise { key = link/node: value = list() }
+        self._sums = dict()
+        self._others = dict()
+        # position of the next reporting step to fill in
+        self._position = 0
+        # whether the simulation was stopped before the end of the simulation period (see Network.simulate)
+        self.stopped = False
+        # number of members of the ensemble of parameter sets (None if simulating one parameter set)
+        self.members = network.ensemble_size
+
+        if entities is None:
+            entities = [link.name for link in network.links] + [node.name for node in network.nodes]
+        else:
+            missing = [entity for entity in entities
+                       if entity not in network.links_mapping and entity not in network.nodes_mapping]
+            if missing:
+                logger.error("The following links/nodes are not part of the Network: {}.".format(missing))
+                raise Exception("The following links/nodes are not part of the Network: {}.".format(missing))
+
+        for entity in entities:
+            if entity in network.links_mapping:
+                my_inputs = list()
+                my_others = list()
+                for model in network.links_mapping[entity].all_models:
+                    my_inputs += model.inputs_names
+                    my_others += model.states_names + model.outputs_names
+            else:
+                my_inputs = list()
+                my_others = list(network.variables)
+            if variables is not None:
+                my_inputs = [variable for variable in my_inputs if variable in variables]
+                my_others = [variable for variable in my_others if variable in variables]
+            if my_inputs or my_others:
+                self.entities.append(entity)
+                self.variables[entity] = my_inputs + my_others
+                my_shape = (len(self.datetimes), len(my_inputs) + len(my_others))
+                self.values[entity] = np.zeros(my_shape + ((self.members,) if self.members else ()), dtype=dtype)
+                self._sums[entity] = my_inputs
+                self._others[entity] = my_others
+
+        if variables is not None:
+            missing = [variable for variable in variables
+                       if not any(variable in self.variables[entity] for entity in self.entities)]
+            if missing:
+                logger.error("The following variables are not simulated "
+                             "for any of the links/nodes requested: {}.".format(missing))
+                raise Exception("The following variables are not simulated "
+                                "for any of the links/nodes requested: {}.".format(missing))
+
+    def update(self, tf, timeslice, db, method='raw'):
+        """
+        This method fills in the arrays of results for the reporting steps of the time slice, in the same way as the
+        output files are updated.
+
+        :param tf: TimeFrame object for the simulation period
+        :type tf: TimeFrame
+        :param timeslice: list of datetime that need to be reported on
+        :type timeslice: list()
+        :param db: DataBase object containing the nested dictionaries for the nodes and the links for variables
+        :type db: DataBase
+        :param method: choice on the technique to process simulation variables when reporting time gap > simu time gap :
+         'summary' = sums for inputs and averages for the rest / 'raw' = last values only for all
+        :type method: str()
+        :return: NOTHING, only updates the arrays of results
+        """
+        logger = getLogger('TORRENTpy.rs')
+
+        if method == 'summary':
+            operation = 'mean'
+        elif method == 'raw':
+            operation = 'last'
+        else:
+            logger.error("Unknown method for updating simulations results.")
+            raise Exception("Unknown method for updating simulations results.")
+
+        start = self._position
+        end = start + len(timeslice) - 1
+
+        for entity in self.entities:
+            nb_sums = len(self._sums[entity])
+            # for inputs, 'raw' and 'summary report the same values because they are cumulative values
+            if self._sums[entity]:
+                self.values[entity][start:end, :nb_sums] = \
+                    get_simulation_array(db.simulation[entity], tf, timeslice, self._sums[entity], 'sum', self.members)
+            if self._others[entity]:
+                self.values[entity][start:end, nb_sums:] = \
+                    get_simulation_array(db.simulation[entity], tf, timeslice, self._others[entity], operation,
+                                         self.members)
+
+        self._position = end
+
+    @property
+    def filled(self):
+        """
+        Number of reporting steps filled in so far (from the start of the simulation period).
+        """
+        return self._position
+
+    def get(self, entity, variable):
+        """
+        This method returns the series of one variable for one link or node.
+
+        :param entity: name of the link or node
+        :type entity: str
+        :param variable: name of the variable
+        :type variable: str
+        :return: view on the column of the array of results (one value per reporting step, and per member for an
+        ensemble of parameter sets)
+        :rtype: numpy.ndarray
+        """
+        logger = getLogger('TORRENTpy.rs')
+
+        try:
+            return self.values[entity][:, self.variables[entity].index(variable)]
+        except KeyError:
+            logger.error("No results kept for link/node {}.".format(entity))
+            raise Exception("No results kept for link/node {}.".format(entity))
+        except ValueError:
+            logger.error("No results kept for variable {} for link/node {}.".format(variable, entity))
+            raise Exception("No results kept for variable {} for link/node {}.".format(variable, entity))
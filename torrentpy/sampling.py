@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+from glob import glob
+import csv
+import json
+import numpy as np
+
+from .inout import read_csv_flows, open_csv_wb, open_csv_ab
+from .batch import check_job_args, set_up_job
+
+# objects kept by a process for all the parameter sets it evaluates (set by _get_context)
+_context = dict()
+
+# direction numbers of the Sobol sequence (Joe and Kuo, 2008) for the dimensions 2 to 21 [ (degree, coefficient, m) ]
+_SOBOL_DIRECTIONS = [
+    (1, 0, [1]), (2, 1, [1, 3]), (3, 1, [1, 3, 1]), (3, 2, [1, 1, 1]), (4, 1, [1, 1, 3, 3]), (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]), (5, 4, [1, 1, 5, 5, 5]), (5, 7, [1, 1, 7, 11, 19]), (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]), (5, 14, [1, 3, 5, 5, 31]), (6, 1, [1, 3, 3, 9, 7, 49]), (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]), (6, 19, [1, 1, 1, 15, 7, 5]), (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]), (7, 1, [1, 3, 7, 11, 23, 15, 103]), (7, 4, [1, 3, 7, 13, 13, 15, 69])
+]
+
+
+class Sampling(object):
+    """
+    This class draws parameter sets within bounds for the parameters of the Models of a catchment, simulates them,
+    and scores the flows simulated at a gauge against the flows observed there (e.g. in the .flow file of the
+    catchment). The Network, the TimeFrame, and the DataBase are only set up once in each process evaluating the
+    parameter sets, and then reused for all of them.
+    """
+    def __init__(self, kb, catchment, outlet, in_fld, bounds, flow_file=None, gauge=None, objective='nse', **kwargs):
+        """
+        :param kb: KnowledgeBase containing the Models used
+        :type kb: KnowledgeBase
+        :param catchment: name of the catchment
+        :type catchment: str
+        :param outlet: name of the outlet of the catchment
+        :type outlet: str
+        :param in_fld: path of the input folder of the catchment
+        :type in_fld: str
+        :param bounds: lower and upper bounds of the parameters to sample, the value of a parameter is used for all the
+        Links whose Models use it { key = parameter_name: value = (lower bound, upper bound) }
+        :type bounds: dict()
+        :param flow_file: path of the CSV file of the observed flows (the .flow file in the input folder if None)
+        :type flow_file: str
+        :param gauge: name of the node where the flows are observed (the node downstream of the outlet if None)
+        :type gauge: str
+        :param objective: name of the objective function scoring the simulated flows ('nse', 'kge', or 'rmse')
+        :type objective: str
+        :param kwargs: other arguments of the simulations, as for a job of a Batch session (e.g. dt_data_start,
+        variable_h, catchment_h, meteo_cumulative, etc.)
+        """
+        logger = getLogger('TORRENTpy.sp')
+
+        if objective not in objectives:
+            logger.error("The objective {} is not available, choose from: {}.".format(objective, sorted(objectives)))
+            raise Exception("The objective {} is not available, choose from: {}.".format(
+                objective, sorted(objectives)))
+        for name in bounds:
+            if not bounds[name][0] <= bounds[name][1]:
+                logger.error("The lower bound of the parameter {} is greater than its upper bound.".format(name))
+                raise Exception("The lower bound of the parameter {} is greater than its upper bound.".format(name))
+
+        if flow_file is None:
+            my_files = glob('{}{}_{}*.flow'.format(in_fld, catchment, outlet))
+            if len(my_files) != 1:
+                logger.error("There is not exactly one .flow file for {} at {}.".format(catchment, outlet))
+                raise Exception("There is not exactly one .flow file for {} at {}.".format(catchment, outlet))
+            flow_file = my_files[0]
+
+        # arguments to set up the simulations (without any output folder, the results are only kept in memory)
+        self.args = dict(kwargs)
+        self.args.update({'catchment': catchment, 'outlet': outlet, 'in_fld': in_fld, 'out_fld': None})
+        check_job_args(self.args)
+        self.kb = kb
+        # names of the parameters sampled (in the order of the columns of the samples)
+        self.names = sorted(bounds)
+        self.bounds = np.array([bounds[name] for name in self.names], dtype=np.float64).reshape((-1, 2))
+        self.flow_file = flow_file
+        self.gauge = gauge
+        self.objective = objective
+
+    def draw(self, size, method='lhs', seed=None):
+        """
+        This method draws parameter sets within the bounds of the parameters.
+
+        :param size: number of parameter sets
+        :type size: int
+        :param method: sampling method, 'uniform' (Monte Carlo), 'lhs' (Latin hypercube), or 'sobol' (Sobol sequence)
+        :type method: str
+        :param seed: seed of the random number generator (not used by 'sobol')
+        :type seed: int
+        :return: array of the parameter sets, with one row per set and one column per parameter (in self.names order)
+        :rtype: numpy.ndarray
+        """
+        my_points = draw_unit_samples(size, len(self.names), method, seed)
+        return self.bounds[:, 0] + my_points * (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def evaluate(self, samples, workers=1, ensemble_size=None, table_file=None, stop_threshold=None):
+        """
+        This method simulates the parameter sets and scores them with the objective function. The parameter sets are
+        shared between several worker processes if required, and each process can simulate them as ensembles of
+        parameter sets (see Network.set_ensemble_parameters) rather than one by one, if all the Models support it.
+        If a stop threshold is given, the simulations that cannot beat it are stopped early (see EarlyStop), and
+        their score is the best score they could still reach when stopped (i.e. not beating the threshold).
+
+        :param samples: array of the parameter sets, with one row per set and one column per parameter
+        :type samples: numpy.ndarray
+        :param workers: number of worker processes (the parameter sets are evaluated in this process if 1)
+        :type workers: int
+        :param ensemble_size: number of parameter sets simulated together in one ensemble (one by one if None)
+        :type ensemble_size: int
+        :param table_file: path of the CSV file where to write the parameter sets and their scores (none if None)
+        :type table_file: str
+        :param stop_threshold: score to beat for a simulation to be run to the end, with the 'nse' or 'rmse'
+        objectives (all run to the end if None)
+        :type stop_threshold: float
+        :return: array of the scores of the parameter sets
+        :rtype: numpy.ndarray
+        """
+        logger = getLogger('TORRENTpy.sp')
+
+        samples = np.asarray(samples, dtype=np.float64).reshape((-1, len(self.names)))
+        # split the parameter sets into chunks to give to the workers
+        if ensemble_size:
+            my_chunk = ensemble_size
+        else:
+            my_chunk = max(1, -(-len(samples) // (workers * 4)))
+        my_starts = list(range(0, len(samples), my_chunk))
+        my_args = (self.kb, self.args, self.flow_file, self.gauge, self.objective, self.names)
+
+        logger.warning("Evaluating {} parameter set(s) with {} worker(s).".format(len(samples), workers))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                my_futures = [executor.submit(evaluate_samples, *(my_args + (samples[start:start + my_chunk],
+                                                                             ensemble_size, stop_threshold)))
+                              for start in my_starts]
+                my_scores = [future.result() for future in my_futures]
+        else:
+            my_scores = [evaluate_samples(*(my_args + (samples[start:start + my_chunk], ensemble_size,
+                                                       stop_threshold)))
+                         for start in my_starts]
+        my_scores = np.concatenate(my_scores) if my_scores else np.zeros((0,))
+
+        if table_file is not None:
+            write_sampling_table(table_file, self.names, samples, self.objective, my_scores)
+
+        return my_scores
+
+    def run(self, size, method='lhs', seed=None, workers=1, ensemble_size=None, table_file=None,
+            stop_threshold=None):
+        """
+        This method draws parameter sets (see draw) and evaluates them (see evaluate).
+
+        :return: array of the parameter sets, and array of their scores
+        :rtype: tuple(numpy.ndarray, numpy.ndarray)
+        """
+        my_samples = self.draw(size, method, seed)
+        return my_samples, self.evaluate(my_samples, workers, ensemble_size, table_file, stop_threshold)
+
+
+def draw_unit_samples(size, dimensions, method='lhs', seed=None):
+    """
+    This function draws points in the unit hypercube.
+
+    :param size: number of points
+    :type size: int
+    :param dimensions: number of dimensions
+    :type dimensions: int
+    :param method: sampling method, 'uniform' (Monte Carlo), 'lhs' (Latin hypercube), or 'sobol' (Sobol sequence)
+    :type method: str
+    :param seed: seed of the random number generator (not used by 'sobol')
+    :type seed: int
+    :return: array of shape (size, dimensions)
+    :rtype: numpy.ndarray
+    """
+    logger = getLogger('TORRENTpy.sp')
+
+    my_random = np.random.RandomState(seed)
+    if method == 'uniform':
+        return my_random.uniform(size=(size, dimensions))
+    elif method == 'lhs':
+        # one point in each of the size strata of each dimension, the strata being paired at random
+        my_points = np.empty((size, dimensions))
+        for dimension in range(dimensions):
+            my_points[:, dimension] = (my_random.permutation(size) + my_random.uniform(size=size)) / size
+        return my_points
+    elif method == 'sobol':
+        return get_sobol_points(size, dimensions)
+    else:
+        logger.error("The sampling method {} is not available, choose from: "
+                     "'uniform', 'lhs', 'sobol'.".format(method))
+        raise Exception("The sampling method {} is not available, choose from: "
+                        "'uniform', 'lhs', 'sobol'.".format(method))
+
+
+def get_sobol_points(size, dimensions, skip=1):
+    """
+    This function returns the points of the Sobol sequence (using the direction numbers of Joe and Kuo, 2008), the
+    first point (the origin) being skipped by default.
+
+    :param size: number of points
+    :type size: int
+    :param dimensions: number of dimensions (up to 21)
+    :type dimensions: int
+    :param skip: number of points to skip at the start of the sequence
+    :type skip: int
+    :return: array of shape (size, dimensions)
+    :rtype: numpy.ndarray
+    """
+    logger = getLogger('TORRENTpy.sp')
+
+    if dimensions > get_sobol_max_dimensions():
+        logger.error("The Sobol sequence is only available for up to {} dimensions.".format(
+            get_sobol_max_dimensions()))
+        raise Exception("The Sobol sequence is only available for up to {} dimensions.".format(
+            get_sobol_max_dimensions()))
+
+    nb_bits = 32
+    # direction numbers of each dimension (as integers on nb_bits bits, indexed from 1)
+    my_directions = list()
+    for dimension in range(dimensions):
+        my_v = [0] * (nb_bits + 1)
+        if dimension == 0:
+            for i in range(1, nb_bits + 1):
+                my_v[i] = 1 << (nb_bits - i)
+        else:
+            s, a, m = _SOBOL_DIRECTIONS[dimension - 1]
+            for i in range(1, s + 1):
+                my_v[i] = m[i - 1] << (nb_bits - i)
+            for i in range(s + 1, nb_bits + 1):
+                my_v[i] = my_v[i - s] ^ (my_v[i - s] >> s)
+                for k in range(1, s):
+                    my_v[i] ^= ((a >> (s - 1 - k)) & 1) * my_v[i - k]
+        my_directions.append(my_v)
+
+    my_points = np.empty((size, dimensions))
+    my_x = [0] * dimensions
+    for index in range(size + skip):
+        if index >= skip:
+            my_points[index - skip] = [x / float(1 << nb_bits) for x in my_x]
+        # position of the rightmost zero bit of the index (from 1)
+        c = 1
+        value = index
+        while value & 1:
+            value >>= 1
+            c += 1
+        my_x = [x ^ my_v[c] for x, my_v in zip(my_x, my_directions)]
+
+    return my_points
+
+
+def get_sobol_max_dimensions():
+    """
+    This function returns the maximum number of dimensions of the Sobol sequence available.
+    """
+    return len(_SOBOL_DIRECTIONS) + 1
+
+
+def get_nse(simulated, observed):
+    """
+    This function returns the Nash-Sutcliffe efficiency of simulated series (1 for a perfect fit), ignoring the steps
+    without observation.
+
+    :param simulated: array of the simulated series (one value per step, and one column per series if several)
+    :type simulated: numpy.ndarray
+    :param observed: array of the observed series (NaN for missing observations)
+    :type observed: numpy.ndarray
+    :return: efficiency (one value per column if several series)
+    """
+    my_sim, my_obs = _get_paired_values(simulated, observed)
+    return 1.0 - ((my_sim - my_obs) ** 2).sum(axis=0) / ((my_obs - my_obs.mean()) ** 2).sum()
+
+
+def get_kge(simulated, observed):
+    """
+    This function returns the Kling-Gupta efficiency of simulated series (1 for a perfect fit), ignoring the steps
+    without observation.
+
+    :param simulated: array of the simulated series (one value per step, and one column per series if several)
+    :type simulated: numpy.ndarray
+    :param observed: array of the observed series (NaN for missing observations)
+    :type observed: numpy.ndarray
+    :return: efficiency (one value per column if several series)
+    """
+    my_sim, my_obs = _get_paired_values(simulated, observed)
+    my_sim_anomalies = my_sim - my_sim.mean(axis=0)
+    my_obs_anomalies = my_obs - my_obs.mean()
+    r = (my_sim_anomalies * my_obs_anomalies).sum(axis=0) / np.sqrt(
+        (my_sim_anomalies ** 2).sum(axis=0) * (my_obs_anomalies ** 2).sum())
+    alpha = my_sim.std(axis=0) / my_obs.std()
+    beta = my_sim.mean(axis=0) / my_obs.mean()
+    return 1.0 - np.sqrt((r - 1.0) ** 2 + (alpha - 1.0) ** 2 + (beta - 1.0) ** 2)
+
+
+def get_rmse(simulated, observed):
+    """
+    This function returns the root mean square error of simulated series (0 for a perfect fit), ignoring the steps
+    without observation.
+
+    :param simulated: array of the simulated series (one value per step, and one column per series if several)
+    :type simulated: numpy.ndarray
+    :param observed: array of the observed series (NaN for missing observations)
+    :type observed: numpy.ndarray
+    :return: error (one value per column if several series)
+    """
+    my_sim, my_obs = _get_paired_values(simulated, observed)
+    return np.sqrt(((my_sim - my_obs) ** 2).mean(axis=0))
+
+
+def _get_paired_values(simulated, observed):
+    my_mask = ~np.isnan(observed)
+    my_sim = np.asarray(simulated)[my_mask]
+    my_obs = observed[my_mask].reshape((-1,) + (1,) * (my_sim.ndim - 1))
+    return my_sim, my_obs
+
+
+# objective functions available { key = name: value = (function, whether the best score is the highest) }
+objectives = {
+    'nse': (get_nse, True),
+    'kge': (get_kge, True),
+    'rmse': (get_rmse, False)
+}
+
+
+def get_observed_flows(flow_file, datetimes, gap):
+    """
+    This function returns the observed flows for the reporting steps of a simulation. If the reporting gap is a whole
+    number of days, the observations are matched to the reporting steps by date (the times of the day of the gauge
+    and of the simulation may differ), otherwise they are matched by datetime.
+
+    :param flow_file: path of the CSV file of the observed flows
+    :type flow_file: str
+    :param datetimes: list of the datetime of the reporting steps
+    :type datetimes: list()
+    :param gap: reporting gap (in minutes)
+    :type gap: int
+    :return: array of the observed flows (NaN for missing observations)
+    :rtype: numpy.ndarray
+    """
+    my_list_dt, my_flows = read_csv_flows(flow_file)
+    if gap % 1440 == 0:
+        my_observed = dict(zip([dt.date() for dt in my_list_dt], my_flows))
+        return np.array([my_observed.get(dt.date(), np.nan) for dt in datetimes], dtype=np.float64)
+    else:
+        my_observed = dict(zip(my_list_dt, my_flows))
+        return np.array([my_observed.get(dt, np.nan) for dt in datetimes], dtype=np.float64)
+
+
+def evaluate_samples(kb, args, flow_file, gauge, objective, names, samples, ensemble_size=None, stop_threshold=None):
+    """
+    This function simulates parameter sets and scores them against the observed flows, setting up the Network, the
+    TimeFrame, and the DataBase only for the first parameter sets evaluated by the process. If a stop threshold is
+    given, the simulations are stopped as soon as they cannot beat it (see EarlyStop).
+
+    :return: array of the scores of the parameter sets
+    :rtype: numpy.ndarray
+    """
+    my_context = _get_context(kb, args, flow_file, gauge)
+    nw = my_context['nw']
+
+    my_used = set(name for link_name in my_context['parameters'] for name in my_context['parameters'][link_name])
+    for name in names:
+        if name not in my_used:
+            logger = getLogger('TORRENTpy.sp')
+            logger.error("The parameter {} is not used by the Models of the Network.".format(name))
+            raise Exception("The parameter {} is not used by the Models of the Network.".format(name))
+
+    my_scores = list()
+    if ensemble_size:
+        for start in range(0, len(samples), ensemble_size):
+            my_samples = samples[start:start + ensemble_size]
+            nw.set_ensemble_parameters({
+                link.name: {name: my_samples[:, column] for column, name in enumerate(names)
+                            if name in my_context['parameters'][link.name]}
+                for link in nw.links
+            })
+            my_scores.extend(_simulate_and_score(my_context, objective, stop_threshold))
+    else:
+        for sample in samples:
+            nw.set_parameters({
+                link.name: {name: sample[column] for column, name in enumerate(names)
+                            if name in my_context['parameters'][link.name]}
+                for link in nw.links
+            })
+            my_scores.append(_simulate_and_score(my_context, objective, stop_threshold))
+
+    return np.array(my_scores, dtype=np.float64)
+
+
+def _simulate_and_score(context, objective, stop_threshold):
+    nw, tf, db = context['nw'], context['tf'], context['db']
+    my_stop = EarlyStop(context['gauge'], nw.variable_h, context['observed'], objective, stop_threshold) \
+        if stop_threshold is not None else None
+    my_results = nw.simulate(db, tf, out_format='memory', out_entities=[context['gauge']],
+                             out_variables=[nw.variable_h], on_slice=my_stop, warm_up_cache=context['warm_up_cache'])
+    if my_results.stopped:
+        return my_stop.bounds
+    return objectives[objective][0](my_results.get(context['gauge'], nw.variable_h), context['observed'])
+
+
+class EarlyStop(object):
+    """
+    This class is a callback for Network.simulate (see on_slice) stopping a simulation kept in memory as soon as the
+    flows simulated so far at a gauge show that the score of the whole simulation period cannot beat a threshold. The
+    errors of the steps simulated so far bound the final score: the NSE can only decrease and the RMSE can only
+    increase with the errors of the steps to come. For an ensemble of parameter sets, the simulation is stopped once
+    none of the members can beat the threshold.
+    """
+    def __init__(self, gauge, variable, observed, objective, threshold):
+        """
+        :param gauge: name of the node (or link) where the flows are observed
+        :type gauge: str
+        :param variable: name of the variable of the flows
+        :type variable: str
+        :param observed: array of the observed flows for the reporting steps of the simulation period (NaN if missing)
+        :type observed: numpy.ndarray
+        :param objective: name of the objective function ('nse' or 'rmse')
+        :type objective: str
+        :param threshold: score to beat
+        :type threshold: float
+        """
+        logger = getLogger('TORRENTpy.sp')
+
+        if objective not in ['nse', 'rmse']:
+            logger.error("The objective {} cannot be bounded during a simulation, "
+                         "choose from: 'nse', 'rmse'.".format(objective))
+            raise Exception("The objective {} cannot be bounded during a simulation, "
+                            "choose from: 'nse', 'rmse'.".format(objective))
+
+        self.gauge = gauge
+        self.variable = variable
+        self.observed = observed
+        self.objective = objective
+        self.threshold = threshold
+        # best scores the simulation can still reach (updated at the end of each slice)
+        self.bounds = None
+
+        my_observed = observed[~np.isnan(observed)]
+        self._count = len(my_observed)
+        self._variance = ((my_observed - my_observed.mean()) ** 2).sum()
+
+    def __call__(self, db, tf, save_slice, results):
+        logger = getLogger('TORRENTpy.sp')
+
+        if results is None:
+            logger.error("The early stop of a simulation requires the 'memory' output format.")
+            raise Exception("The early stop of a simulation requires the 'memory' output format.")
+
+        filled = results.filled
+        my_sim, my_obs = _get_paired_values(results.get(self.gauge, self.variable)[:filled], self.observed[:filled])
+        my_errors = ((my_sim - my_obs) ** 2).sum(axis=0)
+        if self.objective == 'nse':
+            self.bounds = 1.0 - my_errors / self._variance
+            return bool(np.all(self.bounds < self.threshold))
+        else:
+            self.bounds = np.sqrt(my_errors / self._count)
+            return bool(np.all(self.bounds > self.threshold))
+
+
+def write_sampling_table(table_file, names, samples, objective, scores, start=0):
+    """
+    This function writes the parameter sets and their scores in a CSV file, with one row per parameter set. If start
+    is not zero, the rows are appended to the file (e.g. a checkpoint of a long study), numbered from start.
+    """
+    with (open_csv_ab(table_file) if start else open_csv_wb(table_file)) as my_file:
+        my_writer = csv.writer(my_file, delimiter=',')
+        if not start:
+            my_writer.writerow(['Sample'] + list(names) + [objective])
+        for index, (sample, score) in enumerate(zip(samples, scores)):
+            my_writer.writerow([start + index] + ['{:.10g}'.format(value) for value in sample] +
+                               ['{:.10g}'.format(score)])
+
+
+def _get_context(kb, args, flow_file, gauge):
+    # set up the simulations only if the process has not already done it for the same arguments
+    my_key = json.dumps([args, flow_file, gauge], sort_keys=True, default=str)
+    if _context.get('key') != my_key:
+        logger = getLogger('TORRENTpy.sp')
+
+        _context.clear()
+        nw, tf, db = set_up_job(kb, dict(args))
+        if gauge is None:
+            gauge = nw.links_mapping[nw.outlet].connections[0]
+        elif gauge not in nw.nodes_mapping:
+            logger.error("The gauge {} is not a node of the Network.".format(gauge))
+            raise Exception("The gauge {} is not a node of the Network.".format(gauge))
+        _context.update({
+            'key': my_key, 'nw': nw, 'tf': tf, 'db': db, 'gauge': gauge, 'warm_up_cache': args['warm_up_cache'],
+            'observed': get_observed_flows(flow_file, tf.save_range[1:], tf.save_gap),
+            'parameters': {link.name: [name for model in link.all_models for name in model.parameters_names]
+                           for link in nw.links}
+        })
+    return _context
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+import os
+import numpy as np
+
+from .inout import read_csv_rows
+from .sampling import Sampling, draw_unit_samples, write_sampling_table, get_sobol_max_dimensions
+
+
+class Sensitivity(Sampling):
+    """
+    This class runs global sensitivity analyses of the score of the simulated flows (see Sampling) to the parameters
+    of the Models: variance-based indices (Sobol indices estimated on a Saltelli design) and elementary effects
+    (Morris trajectories). The design is evaluated block by block through Sampling.evaluate (i.e. reusing the
+    Network and its DataBase, and using ensembles and worker processes if required), the indices are updated after
+    each block, and the scores can be written to a checkpoint file after each block so that an interrupted analysis
+    can be resumed. The arguments to create a Sensitivity object are the same as for Sampling.
+    """
+    def get_saltelli_design(self, size, method=None, seed=None):
+        """
+        This method returns a Saltelli design in the unit hypercube, made of size groups of (number of parameters + 2)
+        points: a point of a matrix A, a point of a matrix B, and the point of A with each parameter taken from B.
+
+        :param size: number of points of the matrices A and B
+        :type size: int
+        :param method: sampling method of the matrices A and B (see draw_unit_samples), the Sobol sequence is used
+        if None and if it is available for twice the number of parameters, a Latin hypercube otherwise
+        :type method: str
+        :param seed: seed of the random number generator (not used by 'sobol')
+        :type seed: int
+        :return: array of shape (size * (number of parameters + 2), number of parameters)
+        :rtype: numpy.ndarray
+        """
+        nb_params = len(self.names)
+        if method is None:
+            method = 'sobol' if 2 * nb_params <= get_sobol_max_dimensions() else 'lhs'
+        my_points = draw_unit_samples(size, 2 * nb_params, method, seed)
+        my_a, my_b = my_points[:, :nb_params], my_points[:, nb_params:]
+
+        my_design = np.empty((size, nb_params + 2, nb_params))
+        my_design[:, 0] = my_a
+        my_design[:, 1] = my_b
+        for i in range(nb_params):
+            my_design[:, i + 2] = my_a
+            my_design[:, i + 2, i] = my_b[:, i]
+
+        return my_design.reshape((-1, nb_params))
+
+    def get_morris_design(self, trajectories, levels=4, seed=None):
+        """
+        This method returns Morris trajectories in the unit hypercube, made of (number of parameters + 1) points on a
+        grid of levels values per parameter, each point moving one parameter (in random order) from the previous
+        point by levels / (2 * (levels - 1)).
+
+        :param trajectories: number of trajectories
+        :type trajectories: int
+        :param levels: number of levels of the grid (an even number)
+        :type levels: int
+        :param seed: seed of the random number generator
+        :type seed: int
+        :return: array of shape (trajectories * (number of parameters + 1), number of parameters)
+        :rtype: numpy.ndarray
+        """
+        logger = getLogger('TORRENTpy.ss')
+
+        if levels < 2 or levels % 2:
+            logger.error("The number of levels of the Morris design must be an even number.")
+            raise Exception("The number of levels of the Morris design must be an even number.")
+
+        nb_params = len(self.names)
+        delta = levels / (2.0 * (levels - 1))
+        my_random = np.random.RandomState(seed)
+
+        my_design = np.empty((trajectories, nb_params + 1, nb_params))
+        for trajectory in range(trajectories):
+            my_point = my_random.randint(levels, size=nb_params) / float(levels - 1)
+            my_design[trajectory, 0] = my_point
+            for step, i in enumerate(my_random.permutation(nb_params)):
+                # move up if it stays on the grid, down otherwise
+                my_point[i] = my_point[i] + delta if my_point[i] + delta <= 1.0 + 1e-12 else my_point[i] - delta
+                my_design[trajectory, step + 1] = my_point
+
+        return my_design.reshape((-1, nb_params))
+
+    def run_sobol(self, size, method=None, seed=None, block_size=100, workers=1, ensemble_size=None,
+                  checkpoint_file=None):
+        """
+        This method estimates the first-order and total Sobol indices of the parameters (with the estimators of
+        Saltelli et al., 2010 and Jansen, 1999), requiring size * (number of parameters + 2) simulations.
+
+        :param size: number of points of the matrices A and B of the Saltelli design
+        :type size: int
+        :param method: sampling method of the matrices A and B (see get_saltelli_design)
+        :type method: str
+        :param seed: seed of the random number generator (must be the same to resume an analysis)
+        :type seed: int
+        :param block_size: number of points of the matrices A and B evaluated before updating the indices
+        :type block_size: int
+        :param workers: number of worker processes (see Sampling.evaluate)
+        :type workers: int
+        :param ensemble_size: number of parameter sets simulated together in one ensemble (see Sampling.evaluate)
+        :type ensemble_size: int
+        :param checkpoint_file: path of the CSV file where to write the scores after each block, and from where to
+        resume the analysis if it already exists (no checkpoint if None)
+        :type checkpoint_file: str
+        :return: indices of the parameters { key = parameter_name: value = dict(key = 'S1'/'ST': value = float) }
+        :rtype: dict()
+        """
+        my_unit_design = self.get_saltelli_design(size, method, seed)
+        return self._run_design(my_unit_design, len(self.names) + 2, block_size, workers, ensemble_size,
+                                checkpoint_file, get_sobol_indices)
+
+    def run_morris(self, trajectories, levels=4, seed=None, block_size=10, workers=1, ensemble_size=None,
+                   checkpoint_file=None):
+        """
+        This method estimates the statistics of the elementary effects of the parameters (mean, mean of the absolute
+        values, and standard deviation), requiring trajectories * (number of parameters + 1) simulations. The
+        elementary effects are the changes of the score for a move of the parameter by a fraction of its range.
+
+        :param trajectories: number of Morris trajectories
+        :type trajectories: int
+        :param levels: number of levels of the grid (see get_morris_design)
+        :type levels: int
+        :param seed: seed of the random number generator (must be the same to resume an analysis)
+        :type seed: int
+        :param block_size: number of trajectories evaluated before updating the statistics
+        :type block_size: int
+        :param workers: number of worker processes (see Sampling.evaluate)
+        :type workers: int
+        :param ensemble_size: number of parameter sets simulated together in one ensemble (see Sampling.evaluate)
+        :type ensemble_size: int
+        :param checkpoint_file: path of the CSV file where to write the scores after each block, and from where to
+        resume the analysis if it already exists (no checkpoint if None)
+        :type checkpoint_file: str
+        :return: statistics of the parameters
+            { key = parameter_name: value = dict(key = 'mu'/'mu_star'/'sigma': value = float) }
+        :rtype: dict()
+        """
+        my_unit_design = self.get_morris_design(trajectories, levels, seed)
+        return self._run_design(my_unit_design, len(self.names) + 1, block_size, workers, ensemble_size,
+                                checkpoint_file, get_morris_indices)
+
+    def _run_design(self, unit_design, group, block_size, workers, ensemble_size, checkpoint_file, get_indices):
+        logger = getLogger('TORRENTpy.ss')
+
+        my_design = self.bounds[:, 0] + unit_design * (self.bounds[:, 1] - self.bounds[:, 0])
+        my_scores = np.full(len(my_design), np.nan)
+
+        # resume from the scores of the checkpoint file if it exists
+        done = 0
+        if checkpoint_file is not None and os.path.isfile(checkpoint_file):
+            my_fields, my_rows = read_csv_rows(checkpoint_file)
+            if (my_fields != ['Sample'] + self.names + [self.objective]) or (len(my_rows) > len(my_design)) or \
+                    not np.allclose([[float(row[name]) for name in self.names] for row in my_rows],
+                                    my_design[:len(my_rows)], rtol=1e-8, atol=0.0):
+                logger.error("The checkpoint file {} does not match the design of the analysis "
+                             "(the same arguments and seed must be used to resume it).".format(checkpoint_file))
+                raise Exception("The checkpoint file {} does not match the design of the analysis "
+                                "(the same arguments and seed must be used to resume it).".format(checkpoint_file))
+            done = len(my_rows)
+            my_scores[:done] = [float(row[self.objective]) for row in my_rows]
+            logger.warning("Resuming the analysis after {} simulation(s).".format(done))
+
+        my_indices = None
+        for start in range(0, len(my_design), block_size * group):
+            end = min(start + block_size * group, len(my_design))
+            if end > done:
+                my_scores[max(start, done):end] = self.evaluate(my_design[max(start, done):end], workers, ensemble_size)
+                if checkpoint_file is not None:
+                    write_sampling_table(checkpoint_file, self.names, my_design[max(start, done):end],
+                                         self.objective, my_scores[max(start, done):end], start=max(start, done))
+            # update the indices with all the groups of points evaluated so far
+            my_indices = get_indices(unit_design[:end], my_scores[:end], len(self.names))
+            logger.info("Indices after {} simulation(s): {}.".format(end, dict(zip(self.names, my_indices))))
+
+        return {name: my_indices[i] for i, name in enumerate(self.names)} if my_indices else dict()
+
+
+def get_sobol_indices(unit_design, scores, nb_params):
+    """
+    This function estimates the first-order (S1) and total (ST) Sobol indices from the scores of a Saltelli design
+    (see Sensitivity.get_saltelli_design), ignoring the groups of points with a missing score.
+
+    :return: list of the indices of each parameter [ dict(key = 'S1'/'ST': value = float) ]
+    :rtype: list()
+    """
+    my_scores = scores.reshape((-1, nb_params + 2))
+    my_scores = my_scores[~np.isnan(my_scores).any(axis=1)]
+    f_a, f_b, f_ab = my_scores[:, 0], my_scores[:, 1], my_scores[:, 2:]
+    variance = np.concatenate([f_a, f_b]).var()
+
+    my_indices = list()
+    for i in range(nb_params):
+        my_indices.append({
+            'S1': float(np.mean(f_b * (f_ab[:, i] - f_a)) / variance),
+            'ST': float(0.5 * np.mean((f_a - f_ab[:, i]) ** 2) / variance)
+        })
+    return my_indices
+
+
+def get_morris_indices(unit_design, scores, nb_params):
+    """
+    This function estimates the statistics of the elementary effects (mu, mu_star, and sigma) from the scores of
+    Morris trajectories (see Sensitivity.get_morris_design), ignoring the effects with a missing score.
+
+    :return: list of the statistics of each parameter [ dict(key = 'mu'/'mu_star'/'sigma': value = float) ]
+    :rtype: list()
+    """
+    my_points = unit_design.reshape((-1, nb_params + 1, nb_params))
+    my_scores = scores.reshape((-1, nb_params + 1))
+    my_steps = np.diff(my_points, axis=1)
+    # parameter moved at each step of each trajectory, and its move
+    my_moved = np.abs(my_steps).argmax(axis=2)
+    my_moves = my_steps.max(axis=2) + my_steps.min(axis=2)
+    my_effects = np.diff(my_scores, axis=1) / my_moves
+
+    my_indices = list()
+    for i in range(nb_params):
+        my_effects_i = my_effects[my_moved == i]
+        my_effects_i = my_effects_i[~np.isnan(my_effects_i)]
+        my_indices.append({
+            'mu': float(my_effects_i.mean()),
+            'mu_star': float(np.abs(my_effects_i).mean()),
+            'sigma': float(my_effects_i.std(ddof=1)) if len(my_effects_i) > 1 else 0.0
+        })
+    return my_indices
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from logging import getLogger
+import os
+import numpy as np
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # only available from Python 3.8
+    shared_memory = None
+
+from . import inout
+from .timeframe import get_microseconds, EPOCH
+
+
+def share_input_files(input_files):
+    """
+    This function parses CSV input files and copies their time series into blocks of shared memory, so that the
+    processes running simulations using these files do not need to parse them again. For each file, the block
+    contains the datetimes (as int64 microseconds) followed by the values of the fields (as float64), row by row.
+    The files that cannot be parsed are not shared (the simulations will report the problem when reading them).
+
+    :param input_files: list of the paths of the CSV input files
+    :type input_files: list()
+    :return: list of the SharedMemory objects created (to release once the simulations are completed), and
+    descriptors to give to attach_input_files { key = absolute path: value = (block name, number of rows, fields) }
+    :rtype: tuple(list(), dict())
+    """
+    logger = getLogger('TORRENTpy.si')
+
+    my_blocks = list()
+    my_descriptors = dict()
+    if shared_memory is None:
+        return my_blocks, my_descriptors
+
+    for input_file in input_files:
+        try:
+            my_nd_variables = inout.read_csv_timeseries_with_data_checks(input_file, None, data_check=False)
+        except Exception as e:
+            logger.warning("Input file {} could not be shared: {}".format(input_file, e))
+            continue
+        my_fields = sorted(my_nd_variables)
+        my_list_dt = list(my_nd_variables[my_fields[0]]) if my_fields else list()
+        nb_rows = len(my_list_dt)
+        if nb_rows == 0:
+            continue
+
+        my_block = shared_memory.SharedMemory(create=True, size=nb_rows * (1 + len(my_fields)) * 8)
+        my_datetimes, my_values = _get_arrays(my_block, nb_rows, len(my_fields))
+        my_datetimes[:] = [get_microseconds(dt - EPOCH) for dt in my_list_dt]
+        for column, field in enumerate(my_fields):
+            my_values[:, column] = [my_nd_variables[field][dt] for dt in my_list_dt]
+
+        my_blocks.append(my_block)
+        my_descriptors[os.path.abspath(input_file)] = (my_block.name, nb_rows, my_fields)
+
+    return my_blocks, my_descriptors
+
+
+def attach_input_files(descriptors):
+    """
+    This function attaches the blocks of shared memory created by share_input_files (in another process) and
+    registers their time series as read-only arrays so that they are indexed instead of parsing the files again.
+
+    :param descriptors: descriptors returned by share_input_files
+    :type descriptors: dict()
+    :return: list of the SharedMemory objects attached (to give to detach_input_files)
+    :rtype: list()
+    """
+    my_blocks = list()
+    if shared_memory is None:
+        return my_blocks
+
+    for input_file, (name, nb_rows, fields) in descriptors.items():
+        my_block = shared_memory.SharedMemory(name=name)
+        my_datetimes, my_values = _get_arrays(my_block, nb_rows, len(fields))
+        my_datetimes.flags.writeable = False
+        my_values.flags.writeable = False
+        inout.shared_timeseries[input_file] = (
+            my_datetimes, {field: my_values[:, column] for column, field in enumerate(fields)}
+        )
+        my_blocks.append(my_block)
+
+    return my_blocks
+
+
+def detach_input_files(blocks):
+    """
+    This function stops using the time series attached by attach_input_files.
+
+    :param blocks: list of SharedMemory objects returned by attach_input_files
+    :type blocks: list()
+    """
+    inout.shared_timeseries.clear()
+    for my_block in blocks:
+        my_block.close()
+
+
+def release_input_files(blocks):
+    """
+    This function destroys the blocks of shared memory created by share_input_files.
+
+    :param blocks: list of SharedMemory objects returned by share_input_files
+    :type blocks: list()
+    """
+    for my_block in blocks:
+        my_block.close()
+        my_block.unlink()
+
+
+def _get_arrays(block, nb_rows, nb_fields):
+    my_datetimes = np.ndarray((nb_rows,), dtype=np.int64, buffer=block.buf)
+    my_values = np.ndarray((nb_rows, nb_fields), dtype=np.float64, buffer=block.buf, offset=nb_rows * 8)
+    return my_datetimes, my_values
@@ -19,10 +19,22 @@
 # along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
 
 from builtins import range
-from datetime import timedelta
-from fractions import gcd
-from math import ceil
+from datetime import datetime, timedelta
+from calendar import isleap
+from math import sin, pi
+try:
+    from math import gcd
+except ImportError:  # Python 2
+    from fractions import gcd
 from logging import getLogger
+try:
+    from collections.abc import Sequence
+except ImportError:  # Python 2
+    from collections import Sequence
+import numpy as np
+
+# origin of the datetimes stored as integer numbers of microseconds (e.g. in shared memory)
+EPOCH = datetime(1970, 1, 1)
 
 
 class TimeFrame(object):
@@ -54,6 +66,15 @@ class TimeFrame(object):
     interpolate on the simulation results, the simulator can only extract or summarise from simulation steps.
     Instead, the user is expected to adapt their simulation gap to match the required reporting gap.
     """
+    # names of the lists of DateTime kept for compatibility, and of the DateTimeSeries (or slices) they are built from
+    _legacy_lists = {
+        'needed_data_series': 'needed_data_range',
+        'save_series': 'save_range',
+        'simu_series': 'simu_range',
+        'save_slices': 'save_slice_ranges',
+        'simu_slices': 'simu_slice_ranges'
+    }
+
     def __init__(self, dt_data_start, dt_data_end, dt_save_start, dt_save_end,
                  data_increment_in_minutes, save_increment_in_minutes, simu_increment_in_minutes,
                  expected_simu_slice_length=0, warm_up_in_days=0):
@@ -79,13 +100,13 @@ class TimeFrame(object):
         self.data_needed_start, self.data_needed_end = \
             TimeFrame._get_data_start_end_given_simu_start_end(self)
 
-        # DateTime Series for Data, Save, and Simulation
-        self.needed_data_series = TimeFrame._get_list_data_needed_dt_without_initial_conditions(self)
-        self.save_series = TimeFrame._get_list_save_dt_with_initial_conditions(self)
-        self.simu_series = TimeFrame._get_list_simu_dt_with_initial_conditions(self)
+        # DateTime Series for Data, Save, and Simulation (the lists of DateTime are only built if requested)
+        self.needed_data_range = TimeFrame._get_list_data_needed_dt_without_initial_conditions(self)
+        self.save_range = TimeFrame._get_list_save_dt_with_initial_conditions(self)
+        self.simu_range = TimeFrame._get_list_simu_dt_with_initial_conditions(self)
 
-        # Slices of DateTime Series for Save and Simulation
-        self.save_slices, self.simu_slices = \
+        # Slices of DateTime Series for Save and Simulation (the lists of DateTime are only built if requested)
+        self.save_slice_ranges, self.simu_slice_ranges = \
             TimeFrame._slice_datetime_series(self, expected_simu_slice_length)
 
         # Another instance of a TimeFrame if warm-up is required
@@ -96,6 +117,65 @@ class TimeFrame(object):
                                      data_increment_in_minutes, save_increment_in_minutes, simu_increment_in_minutes,
                                      expected_simu_slice_length)
 
+    def __getattr__(self, name):
+        """
+        This method builds the lists of DateTime that used to be the only representation of the series and of
+        their slices (i.e. needed_data_series, save_series, simu_series, save_slices, and simu_slices) the first
+        time they are requested, and keeps them as plain attributes. The simulator itself only uses the
+        DateTimeSeries (i.e. needed_data_range, save_range, simu_range, save_slice_ranges, and simu_slice_ranges).
+
+        :param name: name of the attribute not found in the instance
+        :type name: str
+        :return: list of DateTime (or list of lists of DateTime for the slices)
+        :rtype: list
+        """
+        if name in TimeFrame._legacy_lists:
+            my_range = getattr(self, TimeFrame._legacy_lists[name])
+            if isinstance(my_range, DateTimeSlices):
+                my_list = [list(my_slice) for my_slice in my_range]
+            else:
+                my_list = list(my_range)
+            setattr(self, name, my_list)
+            return my_list
+        raise AttributeError("'TimeFrame' object has no attribute '{}'".format(name))
+
+    def set_slice_length(self, expected_simu_slice_length):
+        """
+        This method slices up the 'save' and 'simu' series again (and the ones of the warm-up if any) for a new
+        expected slice length (adjusted to slice exactly between two saving/reporting steps).
+
+        :param expected_simu_slice_length: expected number of simulation steps in each slice (0 for no slicing)
+        :type expected_simu_slice_length: int
+        """
+        self.save_slice_ranges, self.simu_slice_ranges = \
+            TimeFrame._slice_datetime_series(self, expected_simu_slice_length)
+        # the lists of the former slices (if ever requested) are out of date
+        for my_name in ['save_slices', 'simu_slices']:
+            self.__dict__.pop(my_name, None)
+        if self.warm_up:
+            self.warm_up.set_slice_length(expected_simu_slice_length)
+
+    def set_slice_length_from_memory_budget(self, memory_budget, simu_step_size):
+        """
+        This method slices up the series with the longest slices whose data structures fit in the memory budget.
+
+        :param memory_budget: memory available for the data structures of one slice in MB
+        :type memory_budget: float
+        :param simu_step_size: memory needed for one simulation step in bytes (see Network.get_simu_step_size)
+        :type simu_step_size: int
+        """
+        logger = getLogger('TORRENTpy.tf')
+
+        # one extra step is needed in each slice for the initial conditions
+        expected_length = int(memory_budget * 1024 * 1024) // simu_step_size - 1
+        if not (expected_length * self.simu_gap) >= self.save_gap:
+            logger.error("Memory Budget is too small to fit the simulation steps of one Saving Time Gap.")
+            raise Exception("Memory Budget is too small to fit the simulation steps of one Saving Time Gap.")
+
+        self.set_slice_length(expected_length)
+        logger.info("Slicing up simulation in slices of {} steps to fit in {} MB.".format(
+            len(self.simu_slice_ranges[0]) - 1, memory_budget))
+
     def _get_most_possible_extreme_simu_start_end(self):
         logger = getLogger('TORRENTpy.tf')
 
@@ -137,64 +217,45 @@ class TimeFrame(object):
     def _get_data_start_end_given_simu_start_end(self):
         logger = getLogger('TORRENTpy.tf')
 
+        data_gap = self.data_gap * 60000000  # [microseconds]
+
         # check if Data Period is a multiple of Data Time Gap
-        if not (self.data_end - self.data_start).total_seconds() % \
-                timedelta(minutes=self.data_gap).total_seconds() == 0:
+        if not get_microseconds(self.data_end - self.data_start) % data_gap == 0:
             logger.error("Data Period does not contain a whole number of Data Time Gaps.")
             raise Exception("Data Period does not contain a whole number of Data Time Gaps.")
 
-        # increment from data_start until simu_start is just covered
-        data_start_for_simu = self.data_start
-        while data_start_for_simu < self.simu_start:
-            data_start_for_simu += timedelta(minutes=self.data_gap)
+        # first data step from data_start that is not before simu_start (i.e. simu_start is just covered)
+        offset = get_microseconds(self.simu_start - self.data_start)
+        nb_gaps = -(-offset // data_gap) if offset > 0 else 0
+        data_start_for_simu = self.data_start + timedelta(microseconds=nb_gaps * data_gap)
 
-        # decrement from data_end until end_start is just covered
-        data_end_for_simu = self.data_end
-        while data_end_for_simu >= self.simu_end:
-            data_end_for_simu -= timedelta(minutes=self.data_gap)
-        data_end_for_simu += timedelta(minutes=self.data_gap)
+        # first data step from data_end that is not before simu_end (i.e. simu_end is just covered)
+        offset = get_microseconds(self.data_end - self.simu_end)
+        nb_gaps = offset // data_gap if offset >= 0 else -1
+        data_end_for_simu = self.data_end - timedelta(microseconds=nb_gaps * data_gap)
 
         return data_start_for_simu, data_end_for_simu
 
     def _get_list_data_needed_dt_without_initial_conditions(self):
 
-        # generate a list of DateTime for Data Period without initial conditions (not required)
-        my_list_datetime = list()
-        my_dt = self.data_needed_start
-        while my_dt <= self.data_needed_end:
-            my_list_datetime.append(my_dt)
-            my_dt += timedelta(minutes=self.data_gap)
-
-        return my_list_datetime
+        # generate a series of DateTime for Data Period without initial conditions (not required)
+        return DateTimeSeries.from_bounds(self.data_needed_start, self.data_needed_end, self.data_gap)
 
     def _get_list_save_dt_with_initial_conditions(self):
 
-        # generate a list of DateTime for Saving/Reporting Period with one extra prior step for initial conditions
-        my_list_datetime = list()
-        my_dt = self.save_start - timedelta(minutes=self.save_gap)
-        while my_dt <= self.save_end:
-            my_list_datetime.append(my_dt)
-            my_dt += timedelta(minutes=self.save_gap)
-
-        return my_list_datetime
+        # generate a series of DateTime for Saving/Reporting Period with one extra prior step for initial conditions
+        return DateTimeSeries.from_bounds(self.save_start - timedelta(minutes=self.save_gap), self.save_end,
+                                          self.save_gap)
 
     def _get_list_simu_dt_with_initial_conditions(self):
 
-        # generate a list of DateTime for Simulation Period with one extra prior step for initial conditions
-        my_list_datetime = list()
-        my_dt = self.simu_start - timedelta(minutes=self.simu_gap)
-        while my_dt <= self.simu_end:
-            my_list_datetime.append(my_dt)
-            my_dt += timedelta(minutes=self.simu_gap)
-
-        return my_list_datetime
+        # generate a series of DateTime for Simulation Period with one extra prior step for initial conditions
+        return DateTimeSeries.from_bounds(self.simu_start - timedelta(minutes=self.simu_gap), self.simu_end,
+                                          self.simu_gap)
 
     def _slice_datetime_series(self, expected_length):
         logger = getLogger('TORRENTpy.tf')
 
-        my_save_slices = list()
-        my_simu_slices = list()
-
         if expected_length > 0:  # i.e. a slice length has been specified and is greater than 0
             if not (expected_length * self.simu_gap) >= self.save_gap:
                 logger.error("Expected Length for Slicing Up is smaller than the Saving Time Gap.")
@@ -205,35 +266,243 @@ class TimeFrame(object):
             save_slice_length = simu_slice_length * self.simu_gap // self.save_gap
 
             if simu_slice_length > 0:  # the expected length is longer than one saving/reporting time gap
-                stop_index = int(ceil(float(len(self.save_series)) / float(save_slice_length)))
-                for i in range(0, stop_index, 1):
-                    start_index = i * save_slice_length
-                    end_index = ((i + 1) * save_slice_length) + 1
-                    if len(self.save_series[start_index:end_index]) > 1:  # it would only be the initial conditions
-                        my_save_slices.append(self.save_series[start_index:end_index])
-                stop_index = int(ceil(float(len(self.simu_series)) / float(simu_slice_length)))
-                for i in range(0, stop_index, 1):
-                    start_index = i * simu_slice_length
-                    end_index = ((i + 1) * simu_slice_length) + 1
-                    if len(self.simu_series[start_index:end_index]) > 1:  # it would only be the initial conditions
-                        my_simu_slices.append(self.simu_series[start_index:end_index])
-            else:  # no need to slice, return the complete original lists (i.e. one slice for each)
-                my_save_slices.append(self.save_series[:])
-                my_simu_slices.append(self.simu_series[:])
+                my_save_slices = DateTimeSlices(self.save_range, save_slice_length)
+                my_simu_slices = DateTimeSlices(self.simu_range, simu_slice_length)
+            else:  # no need to slice, use the complete original series (i.e. one slice for each)
+                my_save_slices = DateTimeSlices(self.save_range)
+                my_simu_slices = DateTimeSlices(self.simu_range)
         else:  # i.e. a slice length has not been specified or is equal to 0
-            my_save_slices.append(self.save_series[:])
-            my_simu_slices.append(self.simu_series[:])
+            my_save_slices = DateTimeSlices(self.save_range)
+            my_simu_slices = DateTimeSlices(self.simu_range)
 
         return my_save_slices, my_simu_slices
 
 
+class DateTimeSeries(Sequence):
+    """
+    This class defines a regular series of DateTime using only its first DateTime, its time gap, and its length. It
+    behaves like the list of DateTime it stands for (i.e. it can be indexed, sliced, and iterated over), but the
+    DateTime are only generated when they are used, and the position of a DateTime in the series is found by
+    arithmetic instead of by a search. Slicing a series returns another series (i.e. a view) instead of a copy.
+    """
+    def __init__(self, start, gap, length):
+        # first DateTime of the series
+        self.start = start  # DateTime
+        # time gap between two consecutive DateTime of the series
+        self.gap = gap  # Int [minutes]
+        # number of DateTime in the series
+        self.length = length  # Int
+
+    @classmethod
+    def from_bounds(cls, first, last, gap):
+        """
+        This method creates the series of DateTime starting at first and going up to last (included if it falls
+        exactly on the series) with the given time gap.
+
+        :param first: first DateTime of the series
+        :type first: datetime.datetime
+        :param last: DateTime not to go past
+        :type last: datetime.datetime
+        :param gap: time gap in minutes
+        :type gap: int
+        :return: DateTimeSeries
+        """
+        if last < first:
+            return cls(first, gap, 0)
+        return cls(first, gap, get_seconds(last - first) // (gap * 60) + 1)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            my_start, my_stop, my_step = item.indices(self.length)
+            return DateTimeSeries(self.start + timedelta(minutes=my_start * self.gap),
+                                  self.gap * my_step, len(range(my_start, my_stop, my_step)))
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("DateTimeSeries index out of range")
+        return self.start + timedelta(minutes=item * self.gap)
+
+    def __iter__(self):
+        my_dt = self.start
+        my_gap = timedelta(minutes=self.gap)
+        for _ in range(self.length):
+            yield my_dt
+            my_dt += my_gap
+
+    def __contains__(self, value):
+        try:
+            self.index(value)
+            return True
+        except (ValueError, TypeError):
+            return False
+
+    def __eq__(self, other):
+        if isinstance(other, DateTimeSeries):
+            return (self.length == other.length) and (
+                (self.length == 0) or ((self.start == other.start) and ((self.length == 1) or (self.gap == other.gap))))
+        elif isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "DateTimeSeries(start={}, gap={}, length={})".format(repr(self.start), self.gap, self.length)
+
+    def index(self, value, start=0, stop=None):
+        """
+        This method returns the position of the DateTime in the series (in constant time).
+
+        :param value: DateTime to find in the series
+        :type value: datetime.datetime
+        :param start: position from which to look for the DateTime
+        :type start: int
+        :param stop: position up to which to look for the DateTime (excluded)
+        :type stop: int
+        :return: position of the DateTime in the series
+        :rtype: int
+        """
+        position, remainder = divmod(get_seconds(value - self.start), self.gap * 60)
+        if (remainder != 0) or (value - self.start).microseconds or \
+                (position not in range(self.length)[start:stop]):
+            raise ValueError("{} is not in DateTimeSeries".format(value))
+        return position
+
+    def count(self, value):
+        return 1 if value in self else 0
+
+    @property
+    def datetime64(self):
+        """
+        Array of the DateTime of the series (with a resolution of one minute), generated each time it is requested.
+        """
+        return np.datetime64(self.start, 'm') + np.arange(self.length) * np.timedelta64(self.gap, 'm')
+
+
+class DateTimeSlices(Sequence):
+    """
+    This class defines the slices of a DateTimeSeries, each slice starting on the last DateTime of the previous slice
+    (i.e. the initial conditions for the slice). The slices are only created when they are used, as views on the
+    series, so that the memory needed does not depend on the length of the series.
+    """
+    def __init__(self, series, length=None):
+        # series of DateTime to slice up
+        self.series = series  # DateTimeSeries
+        # number of DateTime in each slice, without the initial conditions (None for only one slice with everything)
+        self.length = length  # Int
+
+    def __len__(self):
+        if self.length is None:
+            return 1
+        # only the slices containing more than the initial conditions
+        return max(0, (len(self.series) - 1 + self.length - 1) // self.length)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("DateTimeSlices index out of range")
+        start_index, stop_index = self.get_indices(item)
+        return self.series[start_index:stop_index]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return "DateTimeSlices(series={}, length={})".format(repr(self.series), self.length)
+
+    def get_indices(self, item):
+        """
+        This method returns the positions in the series of the first DateTime of the slice (included) and of the last
+        DateTime of the slice (excluded).
+
+        :param item: position of the slice
+        :type item: int
+        :return: start index and stop index of the slice
+        :rtype: tuple
+        """
+        if self.length is None:
+            return 0, len(self.series)
+        return item * self.length, min((item + 1) * self.length + 1, len(self.series))
+
+
+class CalendarTable(object):
+    """
+    This class gathers the calendar information for each DateTime of a simulation slice, so that it is computed once
+    for the whole network instead of once for each link. The models access the information using the position of the
+    DateTime in the slice (see the index method).
+    """
+    def __init__(self, timeslice):
+        # position of each DateTime in the slice
+        self._positions = {my_dt: i for i, my_dt in enumerate(timeslice)}
+        # day of the year (from 1 to 366)
+        self.day_of_year = [float(my_dt.timetuple().tm_yday) for my_dt in timeslice]
+        # number of days in the year (365 or 366)
+        self.days_in_year = [366.0 if isleap(my_dt.year) else 365.0 for my_dt in timeslice]
+        # hour of the day (from 0 to 23)
+        self.hour = [my_dt.hour for my_dt in timeslice]
+        # seasonal sine for each day offset requested { key = offset: value = list(sine) }
+        self._seasonal_sines = dict()
+
+    def __len__(self):
+        return len(self.day_of_year)
+
+    def index(self, value):
+        """
+        :param value: DateTime of the slice
+        :type value: datetime.datetime
+        :return: position of the DateTime in the slice
+        :rtype: int
+        """
+        return self._positions[value]
+
+    def get_seasonal_sine(self, position, offset):
+        """
+        This method returns sin(2 * pi * (day_of_year - offset) / days_in_year) for the DateTime at the given position
+        in the slice, computed for the whole slice the first time an offset is requested.
+
+        :param position: position of the DateTime in the slice
+        :type position: int
+        :param offset: day of the year where the sine starts increasing from zero
+        :type offset: float
+        :return: seasonal sine
+        :rtype: float
+        """
+        try:
+            return self._seasonal_sines[offset][position]
+        except KeyError:
+            self._seasonal_sines[offset] = [sin(2.0 * pi * (day_of_year - offset) / days_in_year)
+                                            for day_of_year, days_in_year in zip(self.day_of_year, self.days_in_year)]
+            return self._seasonal_sines[offset][position]
+
+
+def get_seconds(time_delta):
+    # number of whole seconds in a timedelta, using integer arithmetic only
+    return time_delta.days * 86400 + time_delta.seconds
+
+
+def get_microseconds(time_delta):
+    # number of microseconds in a timedelta, using integer arithmetic only
+    return (time_delta.days * 86400 + time_delta.seconds) * 1000000 + time_delta.microseconds
+
+
 def get_required_resolution(start_data, start_simu, delta_data, delta_simu):
     # GCD(delta_data, delta_simu) gives the maximum time resolution possible to match data and simu
     # shift = start_data - start_simu gives the data shift (e.g. data starting at 8am, simu starting at 9am)
     # GCD(shift, GCD(delta_data, delta_simu)) gives the maximum time resolution to match both the difference in
     # start dates and the difference in data/simu time deltas.
-    return timedelta(seconds=gcd((start_data - start_simu).total_seconds(),
-                                 gcd(delta_data.total_seconds(), delta_simu.total_seconds())))
+    return timedelta(seconds=abs(gcd(get_seconds(start_data - start_simu),
+                                     gcd(get_seconds(delta_data), get_seconds(delta_simu)))))
 
 
 def check_interval_in_list(list_of_dt, data_file):
@@ -254,6 +523,20 @@ def check_interval_in_list(list_of_dt, data_file):
         raise Exception("Inconsistent Interval: {} does not feature a single time interval.".format(data_file))
 
 
+def check_interval_in_array(array_of_us, data_file):
+    # same checks as check_interval_in_list for an array of datetimes given in microseconds since EPOCH
+    logger = getLogger('TORRENTpy.tf')
+
+    interval = np.unique(np.diff(array_of_us))
+    if len(interval) == 1:
+        return (EPOCH + timedelta(microseconds=int(array_of_us[0])),
+                EPOCH + timedelta(microseconds=int(array_of_us[-1])),
+                timedelta(microseconds=int(interval[0])))
+    else:
+        logger.error("Inconsistent Interval: {} does not feature a single time interval.".format(data_file))
+        raise Exception("Inconsistent Interval: {} does not feature a single time interval.".format(data_file))
+
+
 def rescale_time_resolution_of_regular_cumulative_data(dict_data,
                                                        start_data, end_data, time_delta_data,
                                                        time_delta_res,
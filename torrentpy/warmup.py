@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of TORRENTpy - An open-source tool for TranspORt thRough the catchmEnt NeTwork
+# Copyright (C) 2018  Thibault Hallouin (1)
+#
+# (1) Dooge Centre for Water Resources Research, University College Dublin, Ireland
+#
+# TORRENTpy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# TORRENTpy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with TORRENTpy. If not, see <http://www.gnu.org/licenses/>.
+
+from hashlib import sha256
+from logging import getLogger
+import os
+import json
+import pickle
+try:
+    from os import replace
+except ImportError:  # Python 2 (atomic on POSIX only)
+    from os import rename as replace
+
+from . import __version__
+
+# hashes of the input files already read { key = (absolute path, modification time, size): value = hex digest }
+_file_hashes = dict()
+
+
+def get_warm_up_key(network, db, tf):
+    """
+    This function returns the key of the initial conditions given by the warm-up run of a simulation, i.e. a hash of
+    everything they depend on: the Models of the Links (with their parameters and constants), the descriptors and
+    extras of the Links, the contents of the files of the catchment in the input folder and of the constants files,
+    the inputs read by the DataBase, the warm-up period and time gaps, and the version of TORRENTpy.
+
+    :param network: Network object for the simulated catchment (with its Models assigned)
+    :type network: Network
+    :param db: DataBase object containing the inputs for the links
+    :type db: DataBase
+    :param tf: TimeFrame object for the simulation period (with a warm-up)
+    :type tf: TimeFrame
+    :return: hex digest of the key
+    :rtype: str
+    """
+    my_links = list()
+    for link in sorted(network.links, key=lambda link: link.name):
+        my_links.append([
+            link.name,
+            [[model.category, model.identifier, '{}.{}'.format(type(model).__module__, type(model).__name__),
+              model.parameters, model.constants] for model in link.all_models],
+            link.descriptors,
+            link.extra
+        ])
+    my_inputs = [db.meteo_cumulative, db.meteo_average, db.contamination_cumulative, db.contamination_average]
+    my_period = [tf.warm_up.simu_start, tf.warm_up.simu_end, tf.warm_up.simu_gap, tf.data_gap]
+
+    my_hash = sha256()
+    my_hash.update(__version__.encode('utf-8'))
+    my_hash.update(json.dumps([network.catchment, network.outlet, network.variables, my_links, my_inputs, my_period],
+                              sort_keys=True, default=_get_json_value).encode('utf-8'))
+    if os.path.isdir(network.in_fld):
+        for name in sorted(os.listdir(network.in_fld)):
+            if name.startswith('{}_'.format(network.catchment)) or name.endswith('.constants'):
+                my_hash.update(name.encode('utf-8'))
+                my_hash.update(get_file_hash(os.path.join(network.in_fld, name)).encode('utf-8'))
+    return my_hash.hexdigest()
+
+
+def get_file_hash(file_path):
+    """
+    This function returns the hash of the contents of a file, or returns it from the memory of the process if the
+    file has already been hashed and has not been modified since.
+    """
+    my_stat = os.stat(file_path)
+    my_key = (os.path.abspath(file_path), my_stat.st_mtime, my_stat.st_size)
+    if my_key not in _file_hashes:
+        my_hash = sha256()
+        with open(file_path, 'rb') as my_file:
+            for chunk in iter(lambda: my_file.read(1 << 20), b''):
+                my_hash.update(chunk)
+        _file_hashes[my_key] = my_hash.hexdigest()
+    return _file_hashes[my_key]
+
+
+def load_warm_up_states(cache_dir, key):
+    """
+    This function returns the initial conditions stored in the cache for the key, or None if there are none.
+
+    :return: values of the last step of the warm-up run { key = link/node: value = dict(key = variable: value) }
+    :rtype: dict()
+    """
+    logger = getLogger('TORRENTpy.wu')
+
+    my_file_path = os.path.join(cache_dir, '{}.states'.format(key))
+    if not os.path.isfile(my_file_path):
+        return None
+    try:
+        with open(my_file_path, 'rb') as my_file:
+            return pickle.load(my_file)
+    except Exception as e:  # e.g. a file written by an incompatible version of Python
+        logger.warning("Initial conditions could not be read from the warm-up cache: {}".format(e))
+        return None
+
+
+def store_warm_up_states(cache_dir, key, last_lines):
+    """
+    This function stores the initial conditions in the cache for the key. The file is written under a temporary name
+    and then renamed, so that the cache never contains incomplete files (e.g. with several processes using it).
+    """
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:  # created by another process in the meantime
+            pass
+    my_file_path = os.path.join(cache_dir, '{}.states'.format(key))
+    my_tmp_path = '{}.{}.tmp'.format(my_file_path, os.getpid())
+    with open(my_tmp_path, 'wb') as my_file:
+        pickle.dump(last_lines, my_file, protocol=2)
+    replace(my_tmp_path, my_file_path)
+
+
+def _get_json_value(value):
+    # numpy arrays (e.g. the parameters of an ensemble) are hashed with all their values, anything else as a string
+    return value.tolist() if hasattr(value, 'tolist') else str(value)